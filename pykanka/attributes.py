@@ -0,0 +1,217 @@
+"""
+Attributes of many entities as one NumPy matrix.
+
+Attribute values are stored as strings, one listing per entity. AttributeMatrix fetches the attribute listings of a
+set of entities concurrently and pivots them into a dense float64 matrix with a row per entity and a column per
+attribute name. Values that aren't numbers, and attributes an entity doesn't have, are NaN and marked in the missing
+mask, so statistics, filters and rankings work on whole columns at once. Needs NumPy (pip install "pykanka[numpy]").
+
+    stats = AttributeMatrix.from_client(client, type_name="character", names=["STR", "DEX", "HP"])
+    stats.rank("HP", limit=10)
+    stats.entities(stats.column("STR") >= 15)
+    stats.summary()["DEX"]["mean"]
+"""
+
+import re
+import warnings
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Sequence
+
+import pykanka.bulk
+import pykanka.child_types
+import pykanka.optional
+from pykanka.exceptions import *
+
+_number = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Numeric value of an attribute, e.g. "14", "+2", "-0.5" or "1e3". None for anything else, such as "1d6"."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not _number.fullmatch(value):
+        return None
+    return float(value)
+
+
+class AttributeMatrix:
+    """
+    :ivar entity_ids: int64 array, the entity id of every row
+    :ivar names: Attribute name of every column
+    :ivar values: float64 array of shape (entities, names), NaN where missing
+    :ivar missing: bool array of the same shape, True where an entity has no numeric value for an attribute
+    """
+
+    def __init__(self, entity_ids: Sequence[int], names: Sequence[str], values, missing, text: Dict[Tuple[int, str], str] = None):
+        np = pykanka.optional.require("numpy", "numpy")
+        self.entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        self.names: List[str] = list(names)
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.entity_ids), len(self.names))
+        self.missing = np.asarray(missing, dtype=bool).reshape(self.values.shape)
+
+        self._rows: Dict[int, int] = {int(entity_id): row for row, entity_id in enumerate(self.entity_ids)}
+        self._columns: Dict[str, int] = {name: column for column, name in enumerate(self.names)}
+        self._text: Dict[Tuple[int, str], str] = text or dict()     # (entity id, name) -> raw value, non-numeric only
+
+    # --- loading ---
+
+    @classmethod
+    def from_attributes(cls, attributes: Iterable[Tuple[int, Iterable[Dict[str, Any]]]], names: Iterable[str] = None) -> "AttributeMatrix":
+        """
+        Pivots attribute payloads into a matrix. Sections, which have no value, are skipped. If an entity has the same
+        attribute twice, the first one in default_order is used.
+
+        :param attributes: (entity id, attribute payloads) pairs, e.g. from pykanka.bulk.fetch_subentries
+        :param names: Columns, in order. Every attribute name found if None, in order of appearance.
+        """
+        np = pykanka.optional.require("numpy", "numpy")
+        columns: Dict[str, int] = {name: column for column, name in enumerate(names)} if names is not None else dict()
+        fixed = names is not None
+
+        entity_ids, cells, text = list(), list(), dict()          # cells: (row, column, value)
+        for entity_id, entity_attributes in attributes:
+            row = len(entity_ids)
+            entity_ids.append(entity_id)
+            seen = set()
+            for attribute in sorted(entity_attributes, key=lambda a: a.get("default_order") or 0):
+                name = attribute.get("name")
+                if name is None or attribute.get("type") == "section" or name in seen:
+                    continue
+                if name not in columns:
+                    if fixed:
+                        continue
+                    columns[name] = len(columns)
+                seen.add(name)
+
+                number = parse_number(attribute.get("value"))
+                if number is None:
+                    if attribute.get("value") not in (None, ""):
+                        text[(entity_id, name)] = attribute["value"]
+                else:
+                    cells.append((row, columns[name], number))
+
+        values = np.full((len(entity_ids), len(columns)), np.nan)
+        if cells:
+            rows, cols, numbers = zip(*cells)
+            values[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = numbers
+        return cls(entity_ids, list(columns), values, np.isnan(values), text=text)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], names: Iterable[str] = None) -> "AttributeMatrix":
+        """Builds the matrix from export records with subentries=["attributes"]. Records without them are skipped."""
+        return cls.from_attributes(((record["id"], record["subentries"]["attributes"]) for record in records
+                                    if "attributes" in (record.get("subentries") or dict())), names=names)
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", entity_ids: Iterable[int] = None, type_name: str = None,
+                    names: Iterable[str] = None, max_workers: int = 8) -> "AttributeMatrix":
+        """
+        Fetches the attributes of many entities concurrently.
+
+        :param client: KankaClient
+        :param entity_ids: Entities to load, in row order
+        :param type_name: Load every entity of this type instead, e.g. "character"
+        :param names: Attribute names to keep, see from_attributes()
+        :param max_workers: Maximum number of requests in flight at once
+        """
+        if (entity_ids is None) == (type_name is None):
+            raise WrongParametersPassedToEntity("pass either entity_ids or type_name")
+        if type_name is not None:
+            url = f"{client.campaign_base_url}{pykanka.child_types.child_type_dictionary[type_name].endpoint}"
+            entity_ids = [child["entity_id"] for child in pykanka.bulk.iter_listing(client, url, max_workers=max_workers)]
+
+        fetched = pykanka.bulk.fetch_subentries(client, entity_ids, ["attributes"], max_workers=max_workers)
+        return cls.from_attributes(((entity_id, found["attributes"]) for entity_id, found in fetched), names=names)
+
+    def __len__(self) -> int:
+        return len(self.entity_ids)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    # --- queries ---
+
+    def column(self, name: str):
+        """float64 values of one attribute for every entity, NaN where missing"""
+        return self.values[:, self._column(name)]
+
+    def present(self, name: str):
+        """bool array, True for entities with a numeric value for an attribute"""
+        return ~self.missing[:, self._column(name)]
+
+    def row(self, entity_id: int) -> Dict[str, float]:
+        """Numeric attributes of one entity by name, leaving out missing ones"""
+        row = self._row(entity_id)
+        return {name: float(self.values[row, column]) for column, name in enumerate(self.names) if not self.missing[row, column]}
+
+    def get(self, entity_id: int, name: str, default: float = None) -> Optional[float]:
+        row, column = self._row(entity_id), self._column(name)
+        return default if self.missing[row, column] else float(self.values[row, column])
+
+    def text(self, entity_id: int, name: str) -> Optional[str]:
+        """Raw value of an attribute that isn't a number, e.g. "1d6+2". None for numeric or missing ones."""
+        return self._text.get((entity_id, name))
+
+    def masked(self):
+        """The values as a numpy.ma.MaskedArray, for aggregations that skip missing values, e.g. masked().mean(axis=0)"""
+        np = pykanka.optional.require("numpy", "numpy")
+        return np.ma.MaskedArray(self.values, mask=self.missing)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, mean, std, min, median and max of every attribute, ignoring missing values"""
+        np = pykanka.optional.require("numpy", "numpy")
+        stats = dict(count=(~self.missing).sum(axis=0).astype(np.float64))
+        functions = dict(mean=np.nanmean, std=np.nanstd, min=np.nanmin, median=np.nanmedian, max=np.nanmax)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)     # columns without any value give NaN
+            for stat, function in functions.items():
+                stats[stat] = function(self.values, axis=0) if len(self) else np.full(len(self.names), np.nan)
+
+        return {name: {stat: float(values[column]) for stat, values in stats.items()} for column, name in enumerate(self.names)}
+
+    def entities(self, selection) -> List[int]:
+        """
+        Entity ids of the rows selected by a bool array or row indices, e.g. entities(m.column("HP") > 20).
+        Comparisons with NaN are False, so missing values never match.
+        """
+        return self.entity_ids[selection].tolist()
+
+    def subset(self, selection=None, names: Iterable[str] = None) -> "AttributeMatrix":
+        """A matrix with only the selected rows (bool array or row indices) and columns"""
+        np = pykanka.optional.require("numpy", "numpy")
+        rows = np.arange(len(self)) if selection is None else np.arange(len(self))[selection]
+        names = self.names if names is None else list(names)
+        columns = [self._column(name) for name in names]
+        entity_ids = self.entity_ids[rows]
+        kept = set(entity_ids.tolist())
+        text = {key: value for key, value in self._text.items() if key[0] in kept and key[1] in names}
+        return AttributeMatrix(entity_ids, names, self.values[np.ix_(rows, columns)], self.missing[np.ix_(rows, columns)], text=text)
+
+    def rank(self, name: str, descending: bool = True, limit: int = None) -> List[Tuple[int, float]]:
+        """
+        (entity id, value) pairs ordered by one attribute, highest first unless descending=False.
+        Entities without a value are left out, ties keep row order.
+        """
+        np = pykanka.optional.require("numpy", "numpy")
+        column = self._column(name)
+        rows = np.flatnonzero(~self.missing[:, column])
+        values = self.values[rows, column]
+        order = np.argsort(-values if descending else values, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return list(zip(self.entity_ids[rows[order]].tolist(), values[order].tolist()))
+
+    def _row(self, entity_id: int) -> int:
+        if entity_id not in self._rows:
+            raise WrongParametersPassedToEntity(f"entity {entity_id} is not in the matrix")
+        return self._rows[entity_id]
+
+    def _column(self, name: str) -> int:
+        if name not in self._columns:
+            raise WrongParametersPassedToEntity(f"no attribute named '{name}' in the matrix")
+        return self._columns[name]
@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any
+
+import requests
+
+from pykanka.exceptions import *
+
+
+@dataclass
+class BatchOperation:
+    """A single write queued in a Batch. response and error are filled in once the batch has been flushed."""
+
+    method:     str
+    url:        str
+    kwargs:     Dict[str, Any]
+    index:      int
+
+    response:   Optional[requests.Response] = None
+    error:      Optional[Exception] = None
+
+    key:            Optional[str] = None                        # journal key, if the batch is journaled
+    journal_entry:  Optional["pykanka.journal.JournalEntry"] = None  # set if the journal shows this write already landed
+
+    _primary:   Optional["BatchOperation"] = None   # set if this operation was coalesced into an earlier patch
+    _merged:    List["BatchOperation"] = field(default_factory=list)
+
+    @property
+    def coalesced(self) -> bool:
+        return self._primary is not None
+
+    @property
+    def skipped(self) -> bool:
+        """True if this write wasn't sent because the journal shows it completed in an earlier run"""
+        return self.journal_entry is not None
+
+    @property
+    def ok(self) -> bool:
+        if self.skipped:
+            return True
+        return self.error is None and self.response is not None and self.response.ok
+
+    @property
+    def data(self) -> Optional[Dict[str, Any]]:
+        """The 'data' part of the server's response, taken from the journal for skipped writes"""
+        if self.skipped:
+            return self.journal_entry.data
+        if self.response is None or not self.response.content:
+            return None
+        return self.response.json().get("data")
+
+    def json(self):
+        """Shortcut for response.json(), so batched calls can be handled like direct ones after the flush"""
+        if self.skipped:
+            return {"data": self.journal_entry.data}
+        if self.response is None:
+            raise BatchError(f"{self.method} {self.url} has not been sent yet")
+        return self.response.json()
+
+
+class Batch:
+    """
+    Queues writes issued through a KankaClient and sends them concurrently once the batch is flushed.
+    Usually created through KankaClient.batch():
+
+        with client.batch() as batch:
+            for entity in entities:
+                entity.get_tag().post(entity_id=entity.data.id, tag_id=12)
+        failed = batch.errors
+
+    While the batch is active, post(), patch(), put() and delete() on child types, subentries and map markers
+    return a BatchOperation instead of a response. Patches to the same url are merged into a single request.
+    On flush, all posts are sent first, then patches and puts, then deletes, so that objects are created
+    before anything that depends on them is updated. Each phase is sent concurrently.
+    """
+
+    _phases = (("post",), ("patch", "put"), ("delete",))
+
+    def __init__(self, client: "pykanka.KankaClient", max_workers: int = 8, raise_on_error: bool = False,
+                 journal: "pykanka.journal.WriteJournal" = None):
+        """
+        :param client: KankaClient the writes are sent through
+        :param max_workers: Maximum number of requests in flight at once
+        :param raise_on_error: Raise a BatchError after the flush if any operation failed
+        :param journal: WriteJournal recording every write. Writes it already shows as done are skipped.
+        """
+        self.client = client
+        self.max_workers = max(max_workers, 1)
+        self.raise_on_error = raise_on_error
+        self.journal = journal
+
+        self.operations: List[BatchOperation] = list()
+        self._pending_patches: Dict[str, BatchOperation] = dict()
+        self._flushed = False
+
+    def __enter__(self) -> "Batch":
+        self.client._begin_batch(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client._end_batch(self)
+        if exc_type is None:
+            self.flush()
+
+    @property
+    def results(self) -> List[BatchOperation]:
+        """All queued operations in the order they were issued"""
+        return list(self.operations)
+
+    @property
+    def errors(self) -> List[BatchOperation]:
+        return [op for op in self.operations if op.error is not None]
+
+    def queue(self, method: str, url: str, _journal_key: str = None, **kwargs) -> BatchOperation:
+        """Adds a write to the batch. usually shouldn't be accessed directly, the client's request_* methods call this."""
+        if self._flushed:
+            raise BatchError("this batch has already been flushed")
+
+        op = BatchOperation(method=method, url=url, kwargs=kwargs, index=len(self.operations))
+        self.operations.append(op)
+
+        if self.journal:
+            op.key = _journal_key or self.journal.key_for(method, url, self._journal_payload(kwargs))
+            entry = self.journal.lookup(op.key)
+            if entry and entry.done:
+                op.journal_entry = entry
+                return op
+
+        if method == "patch":
+            primary = self._pending_patches.get(url)
+            if primary and self._merge(primary, op):
+                op._primary = primary
+                primary._merged.append(op)
+            else:
+                self._pending_patches[url] = op
+        elif method == "delete":
+            self._pending_patches.pop(url, None)        # don't merge patches across a delete
+
+        return op
+
+    @staticmethod
+    def _merge(primary: BatchOperation, op: BatchOperation) -> bool:
+        """Merges the payload of op into primary. Returns False if the two can't be combined."""
+        if primary.kwargs.keys() != op.kwargs.keys() or op.kwargs.get("files"):
+            return False
+
+        for key in ("data", "json"):
+            if key in op.kwargs:
+                if not isinstance(op.kwargs[key], dict) or not isinstance(primary.kwargs[key], dict):
+                    return False
+
+        for key in ("data", "json"):
+            if key in op.kwargs:
+                primary.kwargs[key] = {**primary.kwargs[key], **op.kwargs[key]}
+
+        return True
+
+    def flush(self) -> List[BatchOperation]:
+        """
+        Sends all queued operations. Called automatically when leaving the with block.
+
+        :return: list of all operations, in the order they were queued
+        """
+        if self._flushed:
+            return self.results
+        self._flushed = True
+
+        if self.journal:
+            self.journal.record_many([(op.key, op.method, op.url, self._journal_payload(op.kwargs))
+                                      for op in self.operations if not op.skipped])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for methods in self._phases:
+                phase = [op for op in self.operations if op.method in methods and not op.coalesced and not op.skipped]
+                list(executor.map(self._send, phase))
+
+        for op in self.operations:
+            if op.coalesced:
+                op.response = op._primary.response
+                op.error = op._primary.error
+
+        if self.raise_on_error and self.errors:
+            raise BatchError(f"{len(self.errors)} of {len(self.operations)} batched operations failed")
+
+        return self.results
+
+    def _send(self, op: BatchOperation):
+        try:
+            op.response = self.client._request(op.method, op.url, **op.kwargs)
+            if not op.response.ok:
+                op.error = ResponseNotOkError(f"Response from {op.url} not OK, code {op.response.status_code}: {op.response.text}")
+        except Exception as e:
+            op.error = e
+
+        if self.journal:
+            for journaled in [op] + op._merged:
+                if op.error is None:
+                    self.journal.complete(journaled.key, op.response)
+                else:
+                    self.journal.fail(journaled.key, op.error)
+
+    @staticmethod
+    def _journal_payload(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """The part of a request's keyword arguments that gets journaled. File uploads can't be replayed and are left out."""
+        return {key: value for key, value in kwargs.items() if key != "files"}
@@ -0,0 +1,99 @@
+"""Helpers for reading large parts of a campaign with concurrent requests. These bypass the client's response cache."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, Dict, Any, Iterable, List, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from pykanka.exceptions import *
+
+
+def with_params(url: str, **params) -> str:
+    """Returns url with the given query parameters added or replaced. Parameters that are None are left out."""
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query_params = dict(parse_qsl(query))
+    query_params.update({key: value for key, value in params.items() if value is not None})
+    return urlunsplit((scheme, netloc, path, urlencode(query_params, doseq=True), fragment))
+
+
+def get_json(client: "pykanka.KankaClient", url: str) -> Dict[str, Any]:
+    response = client._request("get", url)
+    if not response.ok:
+        raise ResponseNotOkError(f"Response from {url} not OK, code {response.status_code}: {response.reason}")
+    return response.json()
+
+
+def iter_pages(client: "pykanka.KankaClient", url: str, max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+    """
+    Yields every page of a paginated listing, in order. After the first page, up to max_workers pages are
+    requested at once, but never more than that are held in memory.
+
+    :param client: KankaClient
+    :param url: Url of the listing's first page
+    :param max_workers: Maximum number of pages in flight at once
+    :return: generator of page payloads
+    """
+    first = get_json(client, url)
+    yield first
+
+    last_page = first.get("meta", {}).get("last_page")
+
+    if not last_page:                           # not every listing reports its length, walk the links instead
+        next_url = first.get("links", {}).get("next")
+        while next_url:
+            page = get_json(client, next_url)
+            next_url = page["links"]["next"]
+            yield page
+        return
+
+    page_numbers = iter(range(2, last_page + 1))
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        pending = deque(executor.submit(get_json, client, with_params(url, page=n))
+                        for n in islice(page_numbers, max_workers))
+
+        while pending:
+            page = pending.popleft().result()
+            for n in islice(page_numbers, 1):
+                pending.append(executor.submit(get_json, client, with_params(url, page=n)))
+            yield page
+
+
+def iter_listing(client: "pykanka.KankaClient", url: str, max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+    """Yields every entry of a paginated listing. See iter_pages()."""
+    for page in iter_pages(client, url, max_workers=max_workers):
+        yield from page["data"]
+
+
+def fetch_subentries(client: "pykanka.KankaClient", entity_ids: Iterable[int], endpoints: Iterable[str],
+                     max_workers: int = 8) -> Iterator[Tuple[int, Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Fetches subentry listings (e.g. "attributes", "relations") for many entities at once.
+    Results are yielded in the order of entity_ids, with at most max_workers entities in flight.
+
+    :param client: KankaClient
+    :param entity_ids: Entity ids to fetch subentries for
+    :param endpoints: Subentry endpoints as in subentry_type_dictionary
+    :param max_workers: Maximum number of entities fetched at once
+    :return: generator of (entity id, {endpoint: list of subentry payloads}) tuples
+    """
+    endpoints = list(endpoints)
+    entity_ids = iter(entity_ids)
+
+    def fetch(entity_id):
+        base = f"{client.campaign_base_url}entities/{entity_id}/"
+        return entity_id, {endpoint: list(iter_listing(client, f"{base}{endpoint}", max_workers=1)) for endpoint in endpoints}
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        pending = deque(executor.submit(fetch, entity_id) for entity_id in islice(entity_ids, max_workers))
+
+        while pending:
+            result = pending.popleft().result()
+            for entity_id in islice(entity_ids, 1):
+                pending.append(executor.submit(fetch, entity_id))
+            yield result
+
+
+def fetch_map_markers(client: "pykanka.KankaClient", map_id: int) -> List[Dict[str, Any]]:
+    return list(iter_listing(client, f"{client.campaign_base_url}maps/{map_id}/map_markers", max_workers=1))
@@ -22,6 +22,7 @@ class GenericChildType:
     _possible_keys = list()  # Overridden by inheritors
     _key_replacer = list()  # Overridden by inheritors
     _file_keys = list()  # Overridden by inheritors
+    _parent_key = None  # Overridden by inheritors that can be nested, names the field pointing at the parent of the same type
 
     def __post_init__(self):
         self.base_url = f"{self.client.campaign_base_url}{self.endpoint}/"
@@ -166,6 +167,8 @@ class Location(GenericChildType):
     _key_replacer = [("image_full", "image_url"), ("map", "map_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image", "map"]
+    # field pointing at the parent location
+    _parent_key = "parent_location_id"
 
     child_id: Optional[int] = None
     data: pykanka.childdata_types.LocationData = pykanka.childdata_types.LocationData()
@@ -204,6 +207,8 @@ class Organisation(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent organisation
+    _parent_key = "organisation_id"
 
     data: pykanka.childdata_types.OrganisationData = pykanka.childdata_types.OrganisationData()
     endpoint: str = "organisations"
@@ -220,6 +225,8 @@ class Timeline(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent timeline
+    _parent_key = "timeline_id"
 
     data: pykanka.childdata_types.TimelineData = pykanka.childdata_types.TimelineData()
     endpoint: str = "timelines"
@@ -236,6 +243,8 @@ class Race(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent race
+    _parent_key = "race_id"
 
     data: pykanka.childdata_types.RaceData = pykanka.childdata_types.RaceData()
     endpoint: str = "races"
@@ -253,6 +262,8 @@ class Family(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent family
+    _parent_key = "family_id"
 
     data: pykanka.childdata_types.FamilyData = pykanka.childdata_types.FamilyData()
     endpoint: str = "families"
@@ -269,6 +280,8 @@ class Note(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent note
+    _parent_key = "note_id"
 
     data: pykanka.childdata_types.NoteData = pykanka.childdata_types.NoteData()
     endpoint: str = "notes"
@@ -286,6 +299,8 @@ class Map(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent map
+    _parent_key = "map_id"
 
     data: pykanka.childdata_types.MapData = pykanka.childdata_types.MapData()
     endpoint: str = "maps"
@@ -342,6 +357,8 @@ class Tag(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent tag
+    _parent_key = "tag_id"
 
     data: pykanka.childdata_types.TagData = pykanka.childdata_types.TagData()
     endpoint: str = "tags"
@@ -358,6 +375,8 @@ class Quest(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent quest
+    _parent_key = "quest_id"
 
     data: pykanka.childdata_types.QuestData = pykanka.childdata_types.QuestData()
     endpoint: str = "quests"
@@ -374,6 +393,8 @@ class Journal(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent journal
+    _parent_key = "journal_id"
 
     data: pykanka.childdata_types.JournalData = pykanka.childdata_types.JournalData()
     endpoint: str = "journals"
@@ -407,6 +428,8 @@ class Event(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent event
+    _parent_key = "event_id"
 
     data: pykanka.childdata_types.EventData = pykanka.childdata_types.EventData()
     endpoint: str = "events"
@@ -424,6 +447,8 @@ class Ability(GenericChildType):
     _key_replacer = [("image_full", "image_url")]
     # fields that accept stream object, not yet supported in API 1.0
     _file_keys = ["image"]
+    # field pointing at the parent ability
+    _parent_key = "ability_id"
 
     data: pykanka.childdata_types.AbilityData = pykanka.childdata_types.AbilityData()
     endpoint: str = "abilities"
@@ -0,0 +1,228 @@
+"""
+Columnar export of a campaign to Parquet or Arrow files.
+
+Every entity type becomes one table, with a column per field of its child data class (GenericChildData plus the
+type's own fields), and every subentry endpoint becomes one table with a column per field of its subentry class plus
+the owning entity_id. Columns are typed from the dataclass annotations: ints, floats, bools, strings, UTC timestamps
+and lists of ints or strings. Nested structures that have no flat type, such as a calendar's months, are stored as
+JSON strings. Map markers are not exported.
+
+Rows are collected into Arrow record batches of batch_size rows and written as they fill up, so memory use depends on
+the batch size rather than the campaign. Needs pyarrow (pip install "pykanka[arrow]").
+
+    client.export("campaign/", format="parquet", subentries=["attributes", "relations"])
+    write_tables(records_from_an_ndjson_export, "campaign/")
+"""
+
+import json
+import os
+import typing
+from dataclasses import fields
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Tuple, Callable, Optional
+
+import pykanka.child_types
+import pykanka.entity_subentries
+import pykanka.optional
+import pykanka.sync
+from pykanka.exceptions import *
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _column_kind(annotation) -> str:
+    """Column kind of a dataclass field annotation: int, float, bool, str, timestamp, int_list, str_list or json"""
+    if annotation is None or annotation is type(None):
+        return "json"
+    arguments = [argument for argument in typing.get_args(annotation) if argument is not type(None)]
+    origin = typing.get_origin(annotation)
+
+    if origin is typing.Union:
+        if datetime in arguments:
+            return "timestamp"
+        return _column_kind(arguments[0]) if len(arguments) == 1 else "json"
+    if origin is list:
+        if arguments and arguments[0] in (int, str):
+            return f"{arguments[0].__name__}_list"
+        return "json"
+    if annotation in (int, float, bool, str):
+        return annotation.__name__
+    if annotation is datetime:
+        return "timestamp"
+    return "json"
+
+
+def _data_fields(cls) -> List[Tuple[str, str]]:
+    return [(f.name, _column_kind(f.type)) for f in fields(cls) if not f.name.startswith("_")]
+
+
+def child_columns(type_name: str) -> List[Tuple[str, str]]:
+    """(column, kind) of the table of an entity type, from its child data class"""
+    cls = pykanka.child_types.child_type_dictionary[type_name]
+    return _data_fields(type(cls.data))
+
+
+def subentry_columns(endpoint: str) -> List[Tuple[str, str]]:
+    """(column, kind) of the table of a subentry endpoint. entity_id always comes first."""
+    columns = _data_fields(pykanka.entity_subentries.subentry_type_dictionary[endpoint])
+    return [("entity_id", "int")] + [column for column in columns if column[0] != "entity_id"]
+
+
+def arrow_schema(columns: List[Tuple[str, str]]):
+    pa = pykanka.optional.require("pyarrow", "arrow")
+    types = dict(int=pa.int64(), float=pa.float64(), bool=pa.bool_(), str=pa.string(), json=pa.string(),
+                 timestamp=pa.timestamp("us", tz="UTC"), int_list=pa.list_(pa.int64()), str_list=pa.list_(pa.string()))
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _to_int(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def _to_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _to_json(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _to_int_list(value):
+    if not isinstance(value, list):
+        return None
+    converted = [_to_int(item.get("id") if isinstance(item, dict) else item) for item in value]
+    return [item for item in converted if item is not None]
+
+
+def _to_str_list(value):
+    if not isinstance(value, list):
+        return None
+    return [_to_str(item) for item in value]
+
+
+_converters: Dict[str, Callable[[Any], Any]] = dict(int=_to_int, float=_to_float, bool=_to_bool, str=_to_str,
+                                                    json=_to_json, timestamp=pykanka.sync.parse_timestamp,
+                                                    int_list=_to_int_list, str_list=_to_str_list)
+
+
+class _TableWriter:
+    """Buffers the rows of one table column by column and writes them a record batch at a time"""
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]], format: str, batch_size: int):
+        self.pa = pykanka.optional.require("pyarrow", "arrow")
+        self.path = path
+        self.columns = columns
+        self.schema = arrow_schema(columns)
+        self.batch_size = batch_size
+        self.rows = 0
+
+        self._converters = [_converters[kind] for _, kind in columns]
+        self._buffer: List[list] = [list() for _ in columns]
+        self._buffered = 0
+
+        if format == "parquet":
+            parquet = pykanka.optional.require("pyarrow.parquet", "arrow")
+            self._writer = parquet.ParquetWriter(path, self.schema)
+        else:
+            self._writer = self.pa.ipc.new_file(path, self.schema)
+
+    def append(self, row: Dict[str, Any]):
+        for (name, _), convert, column in zip(self.columns, self._converters, self._buffer):
+            column.append(convert(row.get(name)))
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        arrays = [self.pa.array(column, type=field.type) for column, field in zip(self._buffer, self.schema)]
+        self._writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.rows += self._buffered
+        self._buffer = [list() for _ in self.columns]
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+def write_tables(records: Iterable[Dict[str, Any]], directory: str, format: str = "parquet",
+                 batch_size: int = 10000) -> Dict[str, int]:
+    """
+    Writes export records into one file per entity type and subentry endpoint, e.g. character.parquet and
+    attributes.parquet. Tables are only created for types and endpoints that occur in the records.
+
+    :param records: Export records, see pykanka.exporter
+    :param directory: Output directory, created if needed
+    :param format: "parquet" or "arrow" (Arrow IPC file)
+    :param batch_size: Rows per record batch, the most rows held in memory per table
+    :return: number of rows written per table
+    """
+    if format not in FORMATS:
+        raise WrongParametersPassedToEntity(f"unknown columnar format '{format}', use one of {', '.join(FORMATS)}")
+    pykanka.optional.require("pyarrow", "arrow")
+    os.makedirs(directory, exist_ok=True)
+
+    writers: Dict[str, _TableWriter] = dict()
+
+    def writer(table: str, columns: Callable[[], List[Tuple[str, str]]]) -> Optional[_TableWriter]:
+        if table not in writers:
+            writers[table] = _TableWriter(os.path.join(directory, f"{table}{FORMATS[format]}"), columns(), format, batch_size)
+        return writers[table]
+
+    try:
+        for record in records:
+            type_name = record.get("type")
+            if type_name in pykanka.child_types.child_type_dictionary:
+                child = dict(record.get("child") or dict())
+                child.setdefault("entity_id", record.get("id"))
+                writer(type_name, lambda: child_columns(type_name)).append(child)
+
+            for endpoint, entries in (record.get("subentries") or dict()).items():
+                if endpoint not in pykanka.entity_subentries.subentry_type_dictionary:
+                    continue
+                table = writer(endpoint, lambda: subentry_columns(endpoint))
+                for entry in entries:
+                    table.append(dict(entry, entity_id=record.get("id")))
+    finally:
+        for table in writers.values():
+            table.close()
+
+    return {name: table.rows for name, table in writers.items()}
+
+
+def read_table(path: str):
+    """Reads a table written by write_tables() back as a pyarrow.Table, e.g. for .to_pandas()"""
+    if path.endswith(FORMATS["arrow"]):
+        pa = pykanka.optional.require("pyarrow", "arrow")
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+    parquet = pykanka.optional.require("pyarrow.parquet", "arrow")
+    return parquet.read_table(path)
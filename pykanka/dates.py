@@ -0,0 +1,397 @@
+"""
+Date arithmetic for Kanka calendars.
+
+CalendarEngine reads the months, weekdays, moons, seasons and leap year settings of a calendar and converts dates to
+and from day ordinals: the number of days since the first day of year 0, negative before it. Differences, sorting and
+offsets are then plain integer arithmetic. Intercalary months count as days but, like in Kanka, don't advance the
+weekdays.
+
+The *_ordinals methods convert whole arrays of dates at once and need NumPy (pip install "pykanka[numpy]").
+
+    engine = CalendarEngine.from_calendar(client.get_calendar(3))
+    engine.days_between("1200-1-1", "1201-3-14")
+    engine.weekday("1200-1-1")
+    ordinals = engine.to_ordinals(years, months, days)
+"""
+
+import math
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Union, Tuple
+
+import pykanka.optional
+from pykanka.exceptions import *
+
+_date = re.compile(r"(-?\d+)-(\d+)-(\d+)")
+
+
+@dataclass(frozen=True, order=True)
+class CalendarDate:
+    year:       int
+    month:      int             # 1-based, as in Kanka
+    day:        int             # 1-based
+
+    @classmethod
+    def parse(cls, text: str) -> "CalendarDate":
+        """Parses a Kanka date such as "1234-5-6" or "-12-3-4" """
+        match = _date.fullmatch(text.strip())
+        if not match:
+            raise CalendarError(f"{text!r} is not a date of the form year-month-day")
+        return cls(*map(int, match.groups()))
+
+    def __str__(self) -> str:
+        return f"{self.year}-{self.month}-{self.day}"
+
+
+AnyDate = Union[CalendarDate, str, Tuple[int, int, int]]
+
+
+def as_date(value: AnyDate) -> CalendarDate:
+    if isinstance(value, CalendarDate):
+        return value
+    if isinstance(value, str):
+        return CalendarDate.parse(value)
+    return CalendarDate(*value)
+
+
+@dataclass
+class Month:
+    name:           str
+    length:         int
+    intercalary:    bool = False    # days of intercalary months have no weekday
+
+
+@dataclass
+class Moon:
+    name:           str
+    cycle:          float           # days from one full moon to the next
+    offset:         float = 0.      # ordinal of a full moon
+
+
+@dataclass
+class Season:
+    name:           str
+    month:          int
+    day:            int = 1
+
+
+@dataclass
+class MoonPhase:
+    moon:           str
+    phase:          float           # 0 at full moon, .5 at new moon
+    label:          str             # "full", "waning", "new" or "waxing"
+
+
+class CalendarEngine:
+    def __init__(self, months: List[Month], weekdays: List[str] = (), moons: List[Moon] = (), seasons: List[Season] = (),
+                 leap_every: int = 0, leap_start: int = 0, leap_month: int = 1, leap_days: int = 1, start_offset: int = 0,
+                 year_names: Dict[int, str] = None):
+        """
+        :param months: Months of a year, in order
+        :param weekdays: Names of the weekdays, in order
+        :param moons: Moons, for moon_phases()
+        :param seasons: Seasons, by the day they start on
+        :param leap_every: A leap year every this many years, 0 for none
+        :param leap_start: First leap year
+        :param leap_month: 1-based month that gets the extra days in leap years
+        :param leap_days: Number of extra days in leap years
+        :param start_offset: Weekday of the first day of year 0, as an index into weekdays
+        :param year_names: Names of individual years
+        """
+        if not months or not sum(month.length for month in months):
+            raise CalendarError("A calendar needs at least one month with at least one day")
+        if not 1 <= leap_month <= len(months):
+            raise CalendarError(f"Leap month {leap_month} doesn't exist, the calendar has {len(months)} months")
+
+        self.months = list(months)
+        self.weekdays = list(weekdays)
+        self.moons = list(moons)
+        self.seasons = sorted(seasons, key=lambda season: (season.month, season.day))
+        self.leap_every = leap_every if leap_every and leap_every > 0 else 0
+        self.leap_start = leap_start or 0
+        self.leap_month = leap_month
+        self.leap_days = leap_days if self.leap_every else 0
+        self.start_offset = start_offset or 0
+        self.year_names = dict(year_names or dict())
+
+        # offsets of the months into a year, for normal and leap years, once counting all days and once only weekday days
+        lengths = [month.length for month in self.months]
+        leap_lengths = [length + (self.leap_days if i == leap_month - 1 else 0) for i, length in enumerate(lengths)]
+        standard = [not month.intercalary for month in self.months]
+        self._cumulative = _cumulative(lengths)
+        self._cumulative_leap = _cumulative(leap_lengths)
+        self._standard_cumulative = _cumulative(length * counts for length, counts in zip(lengths, standard))
+        self._standard_cumulative_leap = _cumulative(length * counts for length, counts in zip(leap_lengths, standard))
+
+        self._year_length = self._cumulative[-1]
+        self._standard_year_length = self._standard_cumulative[-1]
+        self._standard_leap_days = self._standard_cumulative_leap[-1] - self._standard_year_length
+        self._average_year_length = self._year_length + (self.leap_days / self.leap_every if self.leap_every else 0)
+        self._leaps_before_zero = self._leap_count(0)
+
+    @classmethod
+    def from_data(cls, data: Union["pykanka.childdata_types.CalendarData", Dict[str, Any]]) -> "CalendarEngine":
+        """
+        Reads a calendar's settings from its CalendarData, or from the calendar's payload. The expanded fields returned
+        by GET (months, weekdays, moons, seasons, years) are used where present, the flat POST fields otherwise.
+        """
+        data = data if isinstance(data, dict) else data.__dict__
+        get = data.get
+
+        if get("months"):
+            months = [Month(name=month.get("name") or "", length=int(month.get("length") or 0),
+                            intercalary=month.get("type") == "intercalary") for month in get("months")]
+        else:
+            types = get("month_type") or []
+            months = [Month(name=name, length=int(length or 0), intercalary=i < len(types) and types[i] == "intercalary")
+                      for i, (name, length) in enumerate(zip(get("month_name") or [], get("month_length") or []))]
+
+        if get("moons"):
+            moons = [Moon(name=moon.get("name") or "", cycle=float(moon.get("fullmoon") or 0), offset=float(moon.get("offset") or 0))
+                     for moon in get("moons")]
+        else:
+            moons = [Moon(name=name, cycle=float(cycle or 0)) for name, cycle in zip(get("moon_name") or [], get("moon_fullmoon") or [])]
+
+        if get("seasons"):
+            seasons = [Season(name=season.get("name") or "", month=int(season.get("month") or 1), day=int(season.get("day") or 1))
+                       for season in get("seasons")]
+        else:
+            seasons = [Season(name=name, month=int(month or 1), day=int(day or 1))
+                       for name, month, day in zip(get("season_name") or [], get("season_month") or [], get("season_day") or [])]
+
+        years = get("years") or dict()
+        if isinstance(years, list):
+            years = {year.get("year"): year.get("name") for year in years if isinstance(year, dict)}
+
+        return cls(
+            months=months,
+            weekdays=list(get("weekdays") or get("weekday") or []),
+            moons=[moon for moon in moons if moon.cycle > 0],
+            seasons=seasons,
+            leap_every=int(get("leap_year_offset") or 0) if get("has_leap_year") else 0,
+            leap_start=int(get("leap_year_start") or 0),
+            leap_month=int(get("leap_year_month") or 1),
+            leap_days=int(get("leap_year_amount") or 1),
+            start_offset=int(get("start_offset") or 0),
+            year_names={int(year): name for year, name in years.items() if name},
+        )
+
+    @classmethod
+    def from_calendar(cls, calendar: "pykanka.child_types.Calendar") -> "CalendarEngine":
+        return cls.from_data(calendar.data)
+
+    # --- years and months ---
+
+    def is_leap(self, year: int) -> bool:
+        return bool(self.leap_every) and year >= self.leap_start and (year - self.leap_start) % self.leap_every == 0
+
+    def year_length(self, year: int) -> int:
+        return self._year_length + (self.leap_days if self.is_leap(year) else 0)
+
+    def month_length(self, year: int, month: int) -> int:
+        table = self._cumulative_leap if self.is_leap(year) else self._cumulative
+        return table[month] - table[month - 1]
+
+    def year_name(self, year: int) -> Optional[str]:
+        return self.year_names.get(year)
+
+    def _leap_count(self, year: int) -> int:
+        """Leap years from leap_start up to, but excluding, year"""
+        if not self.leap_every:
+            return 0
+        return max(0, (year - self.leap_start + self.leap_every - 1) // self.leap_every)
+
+    def _estimate_year(self, ordinal, floor):
+        """Year of a day ordinal, give or take one. Years before leap_start never have leap days."""
+        leap_start = self._days_before_year(self.leap_start)
+        before = floor(ordinal / self._year_length)
+        after = self.leap_start + floor((ordinal - leap_start) / self._average_year_length)
+        if isinstance(ordinal, int):
+            return before if ordinal < leap_start else after
+        return (ordinal < leap_start) * before + (ordinal >= leap_start) * after
+
+    def _days_before_year(self, year: int) -> int:
+        return year * self._year_length + self.leap_days * (self._leap_count(year) - self._leaps_before_zero)
+
+    # --- conversions ---
+
+    def validate(self, date: AnyDate) -> CalendarDate:
+        date = as_date(date)
+        if not 1 <= date.month <= len(self.months):
+            raise CalendarError(f"{date}: month {date.month} doesn't exist, the calendar has {len(self.months)} months")
+        if not 1 <= date.day <= self.month_length(date.year, date.month):
+            raise CalendarError(f"{date}: day {date.day} doesn't exist, {self.months[date.month - 1].name} has "
+                                f"{self.month_length(date.year, date.month)} days")
+        return date
+
+    def to_ordinal(self, date: AnyDate) -> int:
+        """Days since the first day of year 0"""
+        date = self.validate(date)
+        table = self._cumulative_leap if self.is_leap(date.year) else self._cumulative
+        return self._days_before_year(date.year) + table[date.month - 1] + date.day - 1
+
+    def from_ordinal(self, ordinal: int) -> CalendarDate:
+        year = self._estimate_year(ordinal, math.floor)
+        while ordinal < self._days_before_year(year):
+            year -= 1
+        while ordinal >= self._days_before_year(year + 1):
+            year += 1
+
+        remainder = ordinal - self._days_before_year(year)
+        table = self._cumulative_leap if self.is_leap(year) else self._cumulative
+        month = bisect_right(table, remainder) - 1
+        return CalendarDate(year, month + 1, remainder - table[month] + 1)
+
+    def month_start(self, year: int, month: int) -> int:
+        """Day ordinal of the first day of a month, without validating it"""
+        table = self._cumulative_leap if self.is_leap(year) else self._cumulative
+        return self._days_before_year(year) + table[month - 1]
+
+    def add_days(self, date: AnyDate, days: int) -> CalendarDate:
+        return self.from_ordinal(self.to_ordinal(date) + days)
+
+    def days_between(self, start: AnyDate, end: AnyDate) -> int:
+        """Days from start to end, negative if end comes first"""
+        return self.to_ordinal(end) - self.to_ordinal(start)
+
+    # --- weekdays, moons and seasons ---
+
+    def weekday_index(self, date: AnyDate) -> Optional[int]:
+        """Index into weekdays, None for days of intercalary months or calendars without weekdays"""
+        date = self.validate(date)
+        if not self.weekdays or self.months[date.month - 1].intercalary:
+            return None
+        leap = self.is_leap(date.year)
+        table = self._standard_cumulative_leap if leap else self._standard_cumulative
+        standard_days = (date.year * self._standard_year_length + table[date.month - 1] + date.day - 1
+                         + self._standard_leap_days * (self._leap_count(date.year) - self._leaps_before_zero))
+        return (standard_days + self.start_offset) % len(self.weekdays)
+
+    def weekday(self, date: AnyDate) -> Optional[str]:
+        index = self.weekday_index(date)
+        return self.weekdays[index] if index is not None else None
+
+    def moon_phases(self, date: Union[AnyDate, int]) -> List[MoonPhase]:
+        """Phase of every moon on a date, or on a day ordinal"""
+        ordinal = date if isinstance(date, int) else self.to_ordinal(date)
+        phases = list()
+        for moon in self.moons:
+            position = (ordinal - moon.offset) % moon.cycle
+            half = moon.cycle / 2
+            if position < 1:
+                label = "full"
+            elif half <= position < half + 1:
+                label = "new"
+            else:
+                label = "waning" if position < half else "waxing"
+            phases.append(MoonPhase(moon=moon.name, phase=position / moon.cycle, label=label))
+        return phases
+
+    def season(self, date: AnyDate) -> Optional[Season]:
+        """Season a date falls into. Days before the first season of a year belong to the last season of the year before."""
+        if not self.seasons:
+            return None
+        date = self.validate(date)
+        position = bisect_right([(season.month, season.day) for season in self.seasons], (date.month, date.day))
+        return self.seasons[position - 1]
+
+    def format(self, date: AnyDate) -> str:
+        """e.g. "3 Hammer 1372", with the year's name if it has one"""
+        date = self.validate(date)
+        year = self.year_name(date.year) or str(date.year)
+        return f"{date.day} {self.months[date.month - 1].name} {year}"
+
+    # --- arrays, with NumPy ---
+
+    def to_ordinals(self, years, months, days):
+        """
+        Vectorised to_ordinal().
+
+        :param years: Array-like of years
+        :param months: Array-like of 1-based months
+        :param days: Array-like of 1-based days
+        :return: int64 numpy array of day ordinals
+        """
+        np = pykanka.optional.require("numpy", "numpy")
+        years, months, days = (np.asarray(values, dtype=np.int64) for values in (years, months, days))
+
+        if ((months < 1) | (months > len(self.months))).any():
+            raise CalendarError(f"Month out of range, the calendar has {len(self.months)} months")
+        leap = self._is_leap_array(np, years)
+        table = np.where(leap[..., None], np.asarray(self._cumulative_leap), np.asarray(self._cumulative))
+        starts = np.take_along_axis(table, (months - 1)[..., None], -1)[..., 0]
+        lengths = np.take_along_axis(table, months[..., None], -1)[..., 0] - starts
+        if ((days < 1) | (days > lengths)).any():
+            raise CalendarError("Day out of range for its month")
+
+        return self._days_before_year_array(np, years) + starts + days - 1
+
+    def from_ordinals(self, ordinals):
+        """
+        Vectorised from_ordinal().
+
+        :param ordinals: Array-like of day ordinals
+        :return: (years, months, days) int64 numpy arrays
+        """
+        np = pykanka.optional.require("numpy", "numpy")
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+
+        years = self._estimate_year(ordinals, lambda value: np.floor(value).astype(np.int64))
+        while True:                                 # the estimate is off by at most a year or two, fix it up
+            before = ordinals < self._days_before_year_array(np, years)
+            after = ordinals >= self._days_before_year_array(np, years + 1)
+            if not (before.any() or after.any()):
+                break
+            years = years - before + after
+
+        remainders = ordinals - self._days_before_year_array(np, years)
+        leap = self._is_leap_array(np, years)
+        months = np.where(leap, np.searchsorted(self._cumulative_leap, remainders, side="right"),
+                          np.searchsorted(self._cumulative, remainders, side="right"))
+        starts = np.where(leap, np.asarray(self._cumulative_leap)[months - 1], np.asarray(self._cumulative)[months - 1])
+        return years, months, remainders - starts + 1
+
+    def ordinals_of(self, dates: Iterable[AnyDate]):
+        """Day ordinals of CalendarDates, "year-month-day" strings or tuples, as an int64 numpy array"""
+        dates = [as_date(date) for date in dates]
+        return self.to_ordinals([date.year for date in dates], [date.month for date in dates], [date.day for date in dates])
+
+    def weekday_indices(self, ordinals_or_dates):
+        """
+        Vectorised weekday_index(), from day ordinals or (years, months, days) arrays. -1 marks days without a weekday.
+        """
+        np = pykanka.optional.require("numpy", "numpy")
+        if isinstance(ordinals_or_dates, tuple) and len(ordinals_or_dates) == 3:
+            years, months, days = (np.asarray(values, dtype=np.int64) for values in ordinals_or_dates)
+        else:
+            years, months, days = self.from_ordinals(ordinals_or_dates)
+        if not self.weekdays:
+            return np.full(years.shape, -1, dtype=np.int64)
+
+        leap = self._is_leap_array(np, years)
+        starts = np.where(leap, np.asarray(self._standard_cumulative_leap)[months - 1], np.asarray(self._standard_cumulative)[months - 1])
+        standard_days = (years * self._standard_year_length + starts + days - 1
+                         + self._standard_leap_days * (self._leap_count_array(np, years) - self._leaps_before_zero))
+        intercalary = np.asarray([month.intercalary for month in self.months])[months - 1]
+        return np.where(intercalary, -1, (standard_days + self.start_offset) % len(self.weekdays))
+
+    def _is_leap_array(self, np, years):
+        if not self.leap_every:
+            return np.zeros(years.shape, dtype=bool)
+        return (years >= self.leap_start) & ((years - self.leap_start) % self.leap_every == 0)
+
+    def _leap_count_array(self, np, years):
+        if not self.leap_every:
+            return np.zeros(years.shape, dtype=np.int64)
+        return np.maximum(0, (years - self.leap_start + self.leap_every - 1) // self.leap_every)
+
+    def _days_before_year_array(self, np, years):
+        return years * self._year_length + self.leap_days * (self._leap_count_array(np, years) - self._leaps_before_zero)
+
+
+def _cumulative(lengths: Iterable[int]) -> List[int]:
+    offsets = [0]
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    return offsets
@@ -0,0 +1,309 @@
+"""
+Changesets between two campaign states.
+
+Both sides can be snapshots, NDJSON exports or live campaigns (which are exported to a temporary snapshot first).
+Records whose content digest is unchanged are skipped without decoding them, so only changed entities are compared
+field by field. A Changeset can be applied to the old side's campaign to make it match the new side.
+"""
+
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Union, Dict, Any, List, Optional, Tuple, Iterator, Iterable, Callable
+
+import pykanka.child_types
+import pykanka.entity_subentries
+import pykanka.exporter
+import pykanka.snapshot
+from pykanka.exceptions import *
+
+# fields that identify the same subentry in two campaigns when entities are matched by name
+_subentry_keys = dict(
+    attributes=("name",),
+    entity_events=("calendar_id", "year", "month", "day", "name"),
+    entity_files=("name",),
+    entity_notes=("name",),
+    entity_tags=("tag_id",),
+    relations=("target_id", "relation"),
+    inventory=("item_id", "name"),
+    entity_abilities=("ability_id",),
+    entity_links=("url",),
+    map_markers=("name", "latitude", "longitude"),
+)
+
+
+@dataclass
+class SubentryChanges:
+    added:      List[Dict[str, Any]] = field(default_factory=list)
+    removed:    List[Dict[str, Any]] = field(default_factory=list)
+    changed:    List[Tuple[Dict[str, Any], Dict[str, Any]]] = field(default_factory=list)   # (old, new)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+@dataclass
+class EntityChange:
+    kind:       str                             # "created", "deleted" or "modified"
+    type:       str
+    old:        Optional[Dict[str, Any]] = None  # export record on the old side
+    new:        Optional[Dict[str, Any]] = None  # export record on the new side
+    fields:     Dict[str, Tuple[Any, Any]] = field(default_factory=dict)       # child field -> (old, new)
+    subentries: Dict[str, SubentryChanges] = field(default_factory=dict)
+
+    @property
+    def name(self) -> Optional[str]:
+        return (self.new or self.old).get("name")
+
+
+@dataclass
+class Changeset:
+    created:    List[EntityChange] = field(default_factory=list)
+    deleted:    List[EntityChange] = field(default_factory=list)
+    modified:   List[EntityChange] = field(default_factory=list)
+    unchanged:  int = 0
+
+    def __bool__(self):
+        return bool(self.created or self.deleted or self.modified)
+
+    def __iter__(self) -> Iterator[EntityChange]:
+        yield from self.created
+        yield from self.modified
+        yield from self.deleted
+
+    def summary(self) -> Dict[str, int]:
+        return dict(created=len(self.created), modified=len(self.modified), deleted=len(self.deleted), unchanged=self.unchanged)
+
+    def apply(self, client: "pykanka.KankaClient", delete: bool = True, max_workers: int = 8) -> List["pykanka.batch.BatchOperation"]:
+        """
+        Makes the old side's campaign match the new side, by posting created entities, patching changed fields and
+        subentries, and deleting removed entities. Ids referenced inside created or changed data are sent as they are,
+        so this is meant for states of the same campaign; use KankaClient.copy_to() to move content between campaigns.
+
+        :param client: KankaClient of the campaign the old side was taken from
+        :param delete: Also delete entities and subentries that don't exist on the new side
+        :param max_workers: Maximum number of requests in flight at once
+        :return: all batched operations, check their error attribute for failures
+        """
+        operations = list()
+        created = list()
+
+        with client.batch(max_workers=max_workers) as batch:
+            for change in self.created:
+                child = pykanka.child_types.child_type_dictionary[change.type].from_json(client, change.new["child"])
+                created.append((change, child.post()))
+
+            for change in self.modified:
+                if change.fields:
+                    child = pykanka.child_types.child_type_dictionary[change.type].from_json(client, change.old["child"])
+                    child.patch(**{key: new for key, (old, new) in change.fields.items() if key in child._possible_keys})
+                for endpoint, changes in change.subentries.items():
+                    _queue_subentries(client, change.old["id"], endpoint, changes, delete)
+
+            if delete:
+                for change in self.deleted:
+                    child = pykanka.child_types.child_type_dictionary[change.type].from_json(client, change.old["child"])
+                    child.delete()
+        operations.extend(batch.results)
+
+        with client.batch(max_workers=max_workers) as batch:         # subentries of created entities need their new ids
+            for change, op in created:
+                if op.ok and op.data:
+                    for endpoint, entries in (change.new.get("subentries") or dict()).items():
+                        _queue_subentries(client, op.data["entity_id"], endpoint, SubentryChanges(added=entries), delete)
+        operations.extend(batch.results)
+
+        return operations
+
+
+def diff(old: Union["pykanka.snapshot.Snapshot", str, "pykanka.KankaClient"], new: Union["pykanka.snapshot.Snapshot", str, "pykanka.KankaClient"],
+         key: str = "id", subentries: Union[bool, Iterable[str]] = False) -> Changeset:
+    """
+    Computes the changes that turn old into new.
+
+    :param old: Snapshot, path of a snapshot or NDJSON export, or KankaClient for the live campaign
+    :param new: Same as old
+    :param key: "id" to match entities by entity id, "name" to match them by type and name, e.g. across campaigns
+    :param subentries: For live campaigns, which subentries to fetch. Ignored for snapshots and exports.
+    :return: Changeset
+    """
+    with _opened(old, subentries) as old_snapshot, _opened(new, subentries) as new_snapshot:
+        if key == "id":
+            return _diff_by_id(old_snapshot, new_snapshot, match_subentries_by_id=True)
+        if key == "name":
+            return _diff_by_name(old_snapshot, new_snapshot)
+        raise WrongParametersPassedToEntity(f"key must be 'id' or 'name', not '{key}'")
+
+
+def diff_records(old: Dict[str, Any], new: Dict[str, Any], match_subentries_by_id: bool = True) -> EntityChange:
+    """Compares two export records of the same entity field by field"""
+    change = EntityChange(kind="modified", type=new["type"], old=old, new=new)
+
+    old_child, new_child = old.get("child") or dict(), new.get("child") or dict()
+    for name in old_child.keys() | new_child.keys():
+        if name in pykanka.snapshot.VOLATILE_KEYS:
+            continue
+        if old_child.get(name) != new_child.get(name):
+            change.fields[name] = (old_child.get(name), new_child.get(name))
+
+    old_subentries, new_subentries = old.get("subentries") or dict(), new.get("subentries") or dict()
+    for endpoint in old_subentries.keys() | new_subentries.keys():
+        if endpoint not in old_subentries or endpoint not in new_subentries:
+            continue                # only compare what both sides exported
+        key = (lambda entry: entry.get("id")) if match_subentries_by_id else _natural_key(endpoint)
+        changes = _diff_subentries(old_subentries[endpoint], new_subentries[endpoint], key)
+        if changes:
+            change.subentries[endpoint] = changes
+
+    return change
+
+
+def _diff_by_id(old: "pykanka.snapshot.Snapshot", new: "pykanka.snapshot.Snapshot", match_subentries_by_id: bool) -> Changeset:
+    changeset = Changeset()
+    old_digests, new_digests = old.digests(), new.digests()
+    old_entry, new_entry = next(old_digests, None), next(new_digests, None)
+
+    while old_entry or new_entry:                   # both sides are sorted by id, so a single merge pass suffices
+        if new_entry is None or (old_entry is not None and old_entry[0] < new_entry[0]):
+            record = old.record(old_entry[0])
+            changeset.deleted.append(EntityChange(kind="deleted", type=record["type"], old=record))
+            old_entry = next(old_digests, None)
+        elif old_entry is None or new_entry[0] < old_entry[0]:
+            record = new.record(new_entry[0])
+            changeset.created.append(EntityChange(kind="created", type=record["type"], new=record))
+            new_entry = next(new_digests, None)
+        else:
+            if old_entry[1] == new_entry[1]:
+                changeset.unchanged += 1
+            else:
+                change = diff_records(old.record(old_entry[0]), new.record(new_entry[0]), match_subentries_by_id)
+                if change.fields or change.subentries:
+                    changeset.modified.append(change)
+                else:
+                    changeset.unchanged += 1
+            old_entry, new_entry = next(old_digests, None), next(new_digests, None)
+
+    return changeset
+
+
+def _diff_by_name(old: "pykanka.snapshot.Snapshot", new: "pykanka.snapshot.Snapshot") -> Changeset:
+    changeset = Changeset()
+    old_by_name = _ids_by_name(old)
+    new_by_name = _ids_by_name(new)
+
+    for name_key in old_by_name.keys() | new_by_name.keys():
+        old_ids, new_ids = old_by_name.get(name_key, []), new_by_name.get(name_key, [])
+
+        for old_id, new_id in zip(old_ids, new_ids):
+            if old.digest(old_id) == new.digest(new_id):
+                changeset.unchanged += 1
+                continue
+            change = diff_records(old.record(old_id), new.record(new_id), match_subentries_by_id=False)
+            if change.fields or change.subentries:
+                changeset.modified.append(change)
+            else:
+                changeset.unchanged += 1
+
+        for old_id in old_ids[len(new_ids):]:
+            record = old.record(old_id)
+            changeset.deleted.append(EntityChange(kind="deleted", type=record["type"], old=record))
+        for new_id in new_ids[len(old_ids):]:
+            record = new.record(new_id)
+            changeset.created.append(EntityChange(kind="created", type=record["type"], new=record))
+
+    return changeset
+
+
+def _ids_by_name(snapshot: "pykanka.snapshot.Snapshot") -> Dict[Tuple[str, str], List[int]]:
+    by_name = dict()
+    for record in snapshot.records():
+        by_name.setdefault((record["type"], record.get("name")), []).append(record["id"])
+    return by_name
+
+
+def _natural_key(endpoint: str) -> Callable[[Dict[str, Any]], tuple]:
+    keys = _subentry_keys.get(endpoint, ("name",))
+    return lambda entry: tuple(entry.get(k) for k in keys)
+
+
+def _diff_subentries(old: List[Dict[str, Any]], new: List[Dict[str, Any]], key: Callable) -> SubentryChanges:
+    changes = SubentryChanges()
+    old_by_key = dict()
+    for entry in old:
+        old_by_key.setdefault(key(entry), []).append(entry)
+
+    for entry in new:
+        matches = old_by_key.get(key(entry))
+        if not matches:
+            changes.added.append(entry)
+            continue
+        previous = matches.pop(0)
+        if pykanka.snapshot.strip_volatile(previous) != pykanka.snapshot.strip_volatile(entry):
+            changes.changed.append((previous, entry))
+
+    for remaining in old_by_key.values():
+        changes.removed.extend(remaining)
+
+    return changes
+
+
+def _queue_subentries(client: "pykanka.KankaClient", entity_id: int, endpoint: str, changes: SubentryChanges, delete: bool):
+    if endpoint not in pykanka.entity_subentries.subentry_type_dictionary or endpoint == "entity_files":
+        return                      # map markers belong to maps, and files can't be copied from their payloads
+
+    cls = pykanka.entity_subentries.subentry_type_dictionary[endpoint]
+    parent_key = "owner_id" if cls is pykanka.entity_subentries.Relation else "entity_id"
+
+    def build(values, subentry_id=None):
+        values = {key: value for key, value in values.items() if key in cls._possible}
+        values[parent_key] = entity_id
+        return cls(_client=client, id=subentry_id, **values)
+
+    for entry in changes.added:
+        build(entry).post()
+    for old_entry, new_entry in changes.changed:
+        data, url = build(new_entry)._prepare_post(dict())
+        client.request_patch(url=f"{url}/{old_entry['id']}", data=data)
+    if delete:
+        for entry in changes.removed:
+            build(entry, entry["id"]).delete()
+
+
+class _opened:
+    """Context manager turning any supported diff source into an open Snapshot"""
+
+    def __init__(self, source, subentries):
+        self.source = source
+        self.subentries = subentries
+        self._snapshot = None
+        self._temporary = None
+
+    def __enter__(self) -> "pykanka.snapshot.Snapshot":
+        if isinstance(self.source, pykanka.snapshot.Snapshot):
+            return self.source
+
+        if isinstance(self.source, str) and self._is_snapshot(self.source):
+            self._snapshot = pykanka.snapshot.Snapshot(self.source)
+            return self._snapshot
+
+        handle, self._temporary = tempfile.mkstemp(suffix=".snap")
+        os.close(handle)
+
+        if isinstance(self.source, str):
+            pykanka.snapshot.snapshot_from_export(self.source, self._temporary)
+        else:
+            pykanka.snapshot.write_snapshot(pykanka.exporter.iter_records(self.source, subentries=self.subentries), self._temporary)
+
+        self._snapshot = pykanka.snapshot.Snapshot(self._temporary)
+        return self._snapshot
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._snapshot:
+            self._snapshot.close()
+        if self._temporary:
+            os.remove(self._temporary)
+
+    @staticmethod
+    def _is_snapshot(path: str) -> bool:
+        with open(path, "rb") as f:
+            return f.read(len(pykanka.snapshot.MAGIC)) == pykanka.snapshot.MAGIC
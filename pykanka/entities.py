@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Optional, List, Union, Callable
 
 import pykanka.entity_subentries
+import pykanka.pagination
 import pykanka.child_types
 from pykanka.exceptions import *
 
@@ -97,7 +98,7 @@ class Entity:
 
         obj.data = EntityData(**response_data)
 
-        if not obj.child:
+        if not obj._child:
             obj._child = obj._build_child_from_json(child_json=child_data, child_type=obj.data.type,)
 
         return obj
@@ -227,17 +228,23 @@ class Entity:
             return pykanka.entity_subentries.EntityLink(_client=self.client, entity_id=self.data.id)
 
     def _get_all_of_type(self, endpoint, cls):
-        self._check_that_i_exist()
-        url = f"{self.base_url}{self.data.id}/{endpoint}"
+        return list(self.iter_subentries(endpoint, cls))
 
-        response = self.client.request_get(url)
-
-        objects = []
+    def iter_subentries(self, endpoint: str, cls=None, cursor: "pykanka.pagination.Cursor" = None) -> "pykanka.pagination.Listing":
+        """
+        Iterates over a subentry listing of this entity, page by page. Unlike all_attributes() etc, this can be resumed.
 
-        for entry in response.json()["data"]:
-            objects.append(cls(_client=self.client, **entry))
+        :param endpoint: Subentry endpoint, e.g. "attributes" or "relations"
+        :param cls: Subentry class to build, looked up in subentry_type_dictionary if None
+        :param cursor: Cursor taken from an earlier Listing of the same endpoint, to resume from
+        :return: Listing
+        """
+        self._check_that_i_exist()
+        url = f"{self.base_url}{self.data.id}/{endpoint}"
+        cls = cls or pykanka.entity_subentries.subentry_type_dictionary[endpoint]
 
-        return objects
+        return pykanka.pagination.Listing(self.client, url, build=lambda entry: cls(_client=self.client, **entry),
+                                          refresh=False, cursor=cursor)
 
     def all_attributes(self):
         return self._get_all_of_type("attributes", pykanka.entity_subentries.Attribute)
@@ -307,3 +307,15 @@ class EntityLink(GenericSubentry):                                  # Working
 
     def patch(self, **kwargs):
         print("patch not supported on this endpoint")
+
+
+subentry_type_dictionary = dict(attributes=Attribute,
+                                entity_events=EntityEvent,
+                                entity_files=EntityFile,
+                                entity_notes=EntityNote,
+                                entity_tags=EntityTag,
+                                relations=Relation,
+                                inventory=EntityInventory,
+                                entity_abilities=EntityAbility,
+                                entity_links=EntityLink
+                                )
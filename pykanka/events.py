@@ -0,0 +1,67 @@
+"""
+Notifications about writes made through a client.
+
+Local indexes register a listener with KankaClient.add_write_listener() and receive a WriteEvent for every successful
+post, put, patch or delete, including the ones sent by a batch, so they can stay current without polling.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List
+
+import pykanka.child_types
+
+
+@dataclass
+class WriteEvent:
+    method:     str
+    url:        str
+    path:       List[str]                                   # url segments after the campaign url, e.g. ["characters", "12"]
+    payload:    Dict[str, Any] = field(default_factory=dict)  # data sent with the request
+    data:       Optional[Dict[str, Any]] = None             # "data" part of the response, None for deletes
+
+    @classmethod
+    def from_response(cls, client: "pykanka.KankaClient", method: str, url: str, kwargs: Dict[str, Any],
+                      response) -> "WriteEvent":
+        relative = url[len(client.campaign_base_url):] if client.campaign_base_url and url.startswith(client.campaign_base_url) else url
+        path = [segment for segment in relative.split("?")[0].split("/") if segment]
+
+        data = None
+        if method != "delete" and response.content:
+            try:
+                data = response.json().get("data")
+            except ValueError:
+                pass
+
+        return cls(method=method, url=url, path=path, payload=dict(kwargs.get("data") or kwargs.get("json") or dict()), data=data)
+
+    @property
+    def type_name(self) -> Optional[str]:
+        """Key of child_type_dictionary if this write targets a child endpoint such as characters/12"""
+        if self.path:
+            return _endpoint_types.get(self.path[0])
+        return None
+
+    @property
+    def child_id(self) -> Optional[int]:
+        if self.type_name is None:
+            return None
+        if len(self.path) > 1:
+            return int(self.path[1])
+        return self.data.get("id") if self.data else None
+
+    @property
+    def entity_id(self) -> Optional[int]:
+        """Entity the write concerns, for child endpoints as well as subentry endpoints such as entities/5/attributes"""
+        if self.path and self.path[0] == "entities" and len(self.path) > 1:
+            return int(self.path[1])
+        return self.data.get("entity_id") if self.data else None
+
+    @property
+    def subentry_endpoint(self) -> Optional[str]:
+        """e.g. "attributes" for writes to entities/5/attributes"""
+        if len(self.path) > 2 and self.path[0] == "entities":
+            return self.path[2]
+        return None
+
+
+_endpoint_types = {cls.endpoint: type_name for type_name, cls in pykanka.child_types.child_type_dictionary.items()}
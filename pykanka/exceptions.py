@@ -28,3 +28,19 @@ class DeletingNonExistentError(Error, ValueError):
 
 class AccessingNonExistentError(Error):
     pass
+
+
+class BatchError(Error):
+    pass
+
+
+class UnresolvedReferenceError(Error, ValueError):
+    pass
+
+
+class ServerError(ResponseNotOkError):
+    pass
+
+
+class CalendarError(Error, ValueError):
+    pass
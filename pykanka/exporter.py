@@ -0,0 +1,204 @@
+"""
+Streaming export of a campaign to NDJSON.
+
+Every line holds one entity in the form accepted by Entity.from_json(), with its child data under "child".
+If subentries were requested, they are stored under "subentries", keyed by endpoint as in subentry_type_dictionary,
+plus "map_markers" for maps. Use record_to_entity() to turn a line back into an Entity.
+"""
+
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Union, Iterable, Callable, Dict, Any, Iterator, List, Tuple
+
+import pykanka.bulk
+import pykanka.child_types
+import pykanka.columnar
+import pykanka.entities
+import pykanka.entity_subentries
+import pykanka.ndjson
+import pykanka.snapshot
+from pykanka.exceptions import *
+
+_entity_fields = {f.name for f in fields(pykanka.entities.EntityData)}
+
+
+@dataclass
+class ExportProgress:
+    entities:       int = 0
+    pages:          int = 0
+    bytes_written:  int = 0         # bytes that reached the output file(s) so far, after compression if compressed
+    started:        float = 0.
+    current_type:   str = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def entities_per_second(self) -> float:
+        return self.entities / self.elapsed if self.elapsed else 0.
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_written / self.elapsed if self.elapsed else 0.
+
+
+def entity_record(type_name: str, child: Dict[str, Any], campaign_id: int = None) -> Dict[str, Any]:
+    """
+    Builds an export record from a child payload as returned by the API. The entity fields are taken from the child,
+    which saves requesting the entities endpoint separately.
+
+    :param type_name: Key of child_type_dictionary
+    :param child: Child payload
+    :param campaign_id: Campaign id to store with the entity
+    :return: dict accepted by Entity.from_json()
+    """
+    record = dict(
+        id=child.get("entity_id"),
+        name=child.get("name"),
+        type=type_name,
+        child_id=child.get("id"),
+        campaign_id=campaign_id,
+        is_private=child.get("is_private"),
+        is_template=child.get("is_template"),
+        tags=child.get("tags"),
+        created_at=child.get("created_at"),
+        created_by=child.get("created_by"),
+        updated_at=child.get("updated_at"),
+        updated_by=child.get("updated_by"),
+    )
+    record["child"] = child
+    return record
+
+
+def record_to_entity(client: "pykanka.KankaClient", record: Dict[str, Any]) -> "pykanka.entities.Entity":
+    """Builds an Entity, including its child, from an export record. Subentries are ignored. Requires no API calls."""
+    content = {key: value for key, value in record.items() if key in _entity_fields}
+    content["child"] = copy.copy(record["child"])
+    return pykanka.entities.Entity.from_json(client, content)
+
+
+def iter_records(client: "pykanka.KankaClient", types: Iterable[str] = None, subentries: Union[bool, Iterable[str]] = False,
+                 max_workers: int = 4, progress: ExportProgress = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields export records for every entity of the given types, fetching pages and subentries concurrently.
+    Only a few pages are held in memory at any time.
+
+    :param client: KankaClient
+    :param types: Keys of child_type_dictionary to export, all types if None
+    :param subentries: True for all subentries, or an iterable of subentry endpoints
+    :param max_workers: Maximum number of requests in flight at once
+    :param progress: ExportProgress to update while iterating
+    :return: generator of records
+    """
+    types = list(types or pykanka.child_types.child_type_dictionary.keys())
+    endpoints, map_markers = _subentry_endpoints(subentries)
+
+    for type_name in types:
+        if progress:
+            progress.current_type = type_name
+
+        url = pykanka.child_types.child_type_dictionary[type_name](client=client).base_url
+
+        for page in pykanka.bulk.iter_pages(client, url, max_workers=max_workers):
+            records = [entity_record(type_name, child, client.campaign_id) for child in page["data"]]
+
+            if endpoints:
+                _attach_subentries(client, records, endpoints, max_workers)
+            if map_markers and type_name == "map":
+                _attach_map_markers(client, records, max_workers)
+
+            if progress:
+                progress.pages += 1
+
+            yield from records
+
+
+def export(client: "pykanka.KankaClient", path: str, types: Iterable[str] = None, subentries: Union[bool, Iterable[str]] = False,
+           compression: str = None, max_workers: int = 4, on_progress: Callable[[ExportProgress], None] = None,
+           format: str = "ndjson") -> ExportProgress:
+    """
+    Streams a campaign to an NDJSON file, a snapshot, or a directory of Parquet or Arrow tables. See the module
+    docstring for the NDJSON format and pykanka.columnar for the tables.
+
+    :param client: KankaClient
+    :param path: Output file, or output directory for "parquet" and "arrow". Compressed if it ends in .gz, .bz2 or .xz,
+                 or if compression is given.
+    :param types: Keys of child_type_dictionary to export, all types if None
+    :param subentries: True for all subentries, or an iterable of subentry endpoints such as ["attributes", "relations"]
+    :param compression: "gzip", "bz2", "xz" or None. Only supported for NDJSON.
+    :param max_workers: Maximum number of requests in flight at once
+    :param on_progress: Called with the current ExportProgress after every page
+    :param format: "ndjson", "snapshot" for a memory-mappable pykanka.snapshot file, or "parquet" or "arrow" for one
+                   table per type and subentry endpoint, see pykanka.columnar
+    :return: ExportProgress with the final totals
+    """
+    progress = ExportProgress(started=time.monotonic())
+    records = iter_records(client, types=types, subentries=subentries, max_workers=max_workers, progress=progress)
+
+    if format == "snapshot":
+        if compression:
+            raise WrongParametersPassedToEntity("snapshots can't be compressed")
+        pykanka.snapshot.write_snapshot(_counted(records, progress, on_progress), path)
+        progress.bytes_written = os.path.getsize(path)
+    elif format in pykanka.columnar.FORMATS:
+        if compression:
+            raise WrongParametersPassedToEntity(f"{format} tables can't be compressed with {compression}")
+        tables = pykanka.columnar.write_tables(_counted(records, progress, on_progress), path, format=format)
+        progress.bytes_written = sum(os.path.getsize(os.path.join(path, f"{table}{pykanka.columnar.FORMATS[format]}"))
+                                     for table in tables)
+    elif format == "ndjson":
+        with open(path, "wb") as raw, pykanka.ndjson.open_ndjson(raw, "w", compression=compression) as f:
+            for record in _counted(records, progress, on_progress):
+                f.write(pykanka.ndjson.dumps(record) + "\n")
+                progress.bytes_written = raw.tell()     # lags behind by what the text and compression buffers hold
+        progress.bytes_written = os.path.getsize(path)
+    else:
+        raise WrongParametersPassedToEntity(f"unknown export format '{format}'")
+
+    if on_progress:
+        on_progress(progress)
+
+    return progress
+
+
+def _counted(records: Iterator[Dict[str, Any]], progress: ExportProgress,
+             on_progress: Callable[[ExportProgress], None]) -> Iterator[Dict[str, Any]]:
+    pages_reported = 0
+    for record in records:
+        yield record
+        progress.entities += 1
+
+        if on_progress and progress.pages != pages_reported:
+            pages_reported = progress.pages
+            on_progress(progress)
+
+
+def _subentry_endpoints(subentries: Union[bool, Iterable[str]]) -> Tuple[List[str], bool]:
+    """Returns the entity subentry endpoints to export and whether to export map markers"""
+    if subentries is True:
+        return list(pykanka.entity_subentries.subentry_type_dictionary.keys()), True
+    if not subentries:
+        return list(), False
+
+    endpoints = list(subentries)
+    unknown = set(endpoints) - pykanka.entity_subentries.subentry_type_dictionary.keys() - {"map_markers"}
+    if unknown:
+        raise WrongParametersPassedToEntity(f"unknown subentry endpoints: {unknown}")
+    return [endpoint for endpoint in endpoints if endpoint != "map_markers"], "map_markers" in endpoints
+
+
+def _attach_subentries(client: "pykanka.KankaClient", records: List[Dict[str, Any]], endpoints: List[str], max_workers: int):
+    by_id = {record["id"]: record for record in records}
+    for entity_id, found in pykanka.bulk.fetch_subentries(client, by_id.keys(), endpoints, max_workers=max_workers):
+        by_id[entity_id].setdefault("subentries", dict()).update(found)
+
+
+def _attach_map_markers(client: "pykanka.KankaClient", records: List[Dict[str, Any]], max_workers: int):
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        markers = executor.map(lambda record: pykanka.bulk.fetch_map_markers(client, record["child_id"]), records)
+        for record, found in zip(records, markers):
+            record.setdefault("subentries", dict())["map_markers"] = found
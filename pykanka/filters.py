@@ -0,0 +1,78 @@
+"""
+Filtering and projection for listings.
+
+Kanka's listing endpoints accept the same filters as the web interface as query parameters, e.g.
+characters?is_dead=1&location_id=12. Filters the endpoint understands are pushed down into the url, so fewer entries
+are transferred. Every filter is also checked on the client while streaming, which covers filters the server doesn't
+know and makes results exact where the server is lenient, e.g. name filters matching substrings.
+"""
+
+from typing import Dict, Any, Tuple, Callable, Iterable, Optional
+
+# fields every listing can filter on
+COMMON_FILTER_KEYS = frozenset({"name", "type", "is_private", "tags"})
+
+# fields that are usually large and rarely needed when listing
+HEAVY_FIELDS = ("entry", "entry_parsed")
+
+
+def server_filter_keys(cls) -> frozenset:
+    """Fields the listing endpoint of a child type can filter on: the common ones, references to other entities and flags"""
+    possible = getattr(cls, "_possible_keys", [])
+    return COMMON_FILTER_KEYS | {key for key in possible if key.endswith("_id") or (key.startswith("is_") and key != "is_private")}
+
+
+def split_filters(cls, filters: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Splits filters into query parameters for the server and the ones only the client can check.
+
+    :param cls: Child type class, e.g. pykanka.child_types.Character
+    :param filters: field -> value to match. Values can also be callables taking the field's value.
+    :return: (query parameters, filters the server can't apply)
+    """
+    supported = server_filter_keys(cls)
+    params, client_only = dict(), dict()
+
+    for key, value in filters.items():
+        if key not in supported or callable(value):
+            client_only[key] = value
+        elif key == "tags":
+            params["tags[]"] = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        elif isinstance(value, bool):
+            params[key] = int(value)
+        elif value is not None:
+            params[key] = value
+        else:
+            client_only[key] = value
+
+    return params, client_only
+
+
+def matches(entry: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """
+    Checks a listing entry against filters. "tags" matches if the entry has all given tags, callables are called with
+    the field's value, anything else has to be equal.
+    """
+    for key, expected in filters.items():
+        value = entry.get(key)
+        if callable(expected):
+            if not expected(value):
+                return False
+        elif key == "tags":
+            wanted = set(expected) if isinstance(expected, (list, tuple, set, frozenset)) else {expected}
+            if not wanted.issubset(value or []):
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def make_predicate(filters: Dict[str, Any]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    if not filters:
+        return None
+    return lambda entry: matches(entry, filters)
+
+
+def project(entry: Dict[str, Any], exclude: Iterable[str]) -> Dict[str, Any]:
+    """Returns entry without the excluded fields, so they are never turned into model attributes"""
+    return {key: value for key, value in entry.items() if key not in exclude}
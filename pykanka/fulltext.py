@@ -0,0 +1,238 @@
+"""
+Local full-text search over a campaign.
+
+FullTextIndex is an in-memory inverted index over entity names, entries (with the HTML stripped), attributes and
+entity notes. It is built from export records, e.g. an NDJSON export made with subentries=["attributes",
+"entity_notes"], and kept current with add()/remove() or apply_sync(). Queries are ranked with BM25, and the last word
+of a query also matches as a prefix, so partial input already finds results.
+
+    index = FullTextIndex.from_export("campaign.ndjson.gz")
+    for hit in index.search("dragon lai"):
+        print(hit.name, hit.score)
+"""
+
+import heapq
+import html
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Union, IO
+
+import pykanka.exporter
+import pykanka.ndjson
+
+_tags = re.compile(r"<[^>]+>")
+_words = re.compile(r"\w+")
+
+NAME_WEIGHT = 3         # a word in the name counts as often as this many words in the text
+
+
+def fold(text: str) -> str:
+    """Lower-cases text and strips diacritics, so "Élan" and "elan" compare equal"""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def strip_html(text: str) -> str:
+    return html.unescape(_tags.sub(" ", text))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _words.findall(fold(text))
+
+
+def record_text(record: Dict[str, Any]) -> List[str]:
+    """Words of the searchable text of an export record, excluding the name"""
+    child = record.get("child") or dict()
+    words = tokenize(strip_html(child.get("entry_parsed") or child.get("entry") or ""))
+
+    subentries = record.get("subentries") or dict()
+    for attribute in subentries.get("attributes", []):
+        words += tokenize(attribute.get("name"))
+        words += tokenize(str(attribute["value"]) if attribute.get("value") is not None else None)
+    for note in subentries.get("entity_notes", []):
+        words += tokenize(note.get("name"))
+        words += tokenize(strip_html(note.get("entry") or ""))
+
+    return words
+
+
+@dataclass
+class Hit:
+    entity_id:  int
+    score:      float
+    name:       Optional[str] = None
+    type:       Optional[str] = None
+    child_id:   Optional[int] = None
+
+
+@dataclass
+class _Document:
+    name:       Optional[str]
+    type:       Optional[str]
+    child_id:   Optional[int]
+    terms:      Counter         # term -> weighted frequency
+    length:     int
+    subentries: Optional[Dict[str, Any]] = None   # kept so that updates without subentries don't lose them
+
+
+class FullTextIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        :param k1: BM25 term frequency saturation
+        :param b: BM25 length normalisation
+        """
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, Dict[int, int]] = dict()     # term -> entity id -> weighted frequency
+        self._documents: Dict[int, _Document] = dict()
+        self._total_length = 0
+        self._vocabulary: List[str] = list()                   # sorted terms, rebuilt lazily for prefix lookups
+        self._vocabulary_stale = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], **kwargs) -> "FullTextIndex":
+        index = cls(**kwargs)
+        for record in records:
+            index.add(record)
+        return index
+
+    @classmethod
+    def from_export(cls, source: Union[str, IO], **kwargs) -> "FullTextIndex":
+        """Builds an index from an NDJSON export, see KankaClient.export()"""
+        return cls.from_records((record for _, record in pykanka.ndjson.iter_records(source)), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self._documents
+
+    # --- updates ---
+
+    def add(self, record: Dict[str, Any]):
+        """Adds or replaces an entity, given as an export record. Subentries of an earlier version are kept if the record has none."""
+        with self._lock:
+            previous = self._documents.get(record["id"])
+            if previous is not None:
+                if "subentries" not in record and previous.subentries:
+                    record = dict(record, subentries=previous.subentries)
+                self._remove(record["id"])
+
+            terms = Counter()
+            for word in tokenize(record.get("name")):
+                terms[word] += NAME_WEIGHT
+            terms.update(record_text(record))
+
+            document = _Document(name=record.get("name"), type=record.get("type"), child_id=record.get("child_id"),
+                                 terms=terms, length=sum(terms.values()), subentries=record.get("subentries"))
+            self._documents[record["id"]] = document
+            self._total_length += document.length
+
+            entity_id, vocabulary_size = record["id"], len(self._postings)
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, dict())[entity_id] = frequency
+            if len(self._postings) != vocabulary_size:
+                self._vocabulary_stale = True
+
+    def remove(self, entity_id: int):
+        with self._lock:
+            self._remove(entity_id)
+
+    def _remove(self, entity_id: int):
+        document = self._documents.pop(entity_id, None)
+        if document is None:
+            return
+
+        self._total_length -= document.length
+        for term in document.terms:
+            postings = self._postings[term]
+            postings.pop(entity_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_stale = True
+
+    def apply_sync(self, result: "pykanka.sync.SyncResult"):
+        """Applies the changes of a KankaClient.sync() result"""
+        for type_name, children in result.changed.items():
+            for child in children:
+                self.add(pykanka.exporter.entity_record(type_name, child.data.__dict__))
+        for entity_ids in result.deleted.values():
+            for entity_id in entity_ids:
+                self.remove(entity_id)
+
+    # --- queries ---
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True, type_name: str = None,
+               max_expansions: int = 50) -> List[Hit]:
+        """
+        Ranks entities against a query with BM25.
+
+        :param query: Search words
+        :param limit: Maximum number of hits
+        :param prefix: Let the last word match every term starting with it
+        :param type_name: Only return entities of this type
+        :param max_expansions: Maximum number of terms a prefix is expanded to, the most common ones are used
+        :return: hits, best first
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            scores: Dict[int, float] = dict()
+            count = len(self._documents)
+            average_length = self._total_length / count if count else 0.
+
+            for position, word in enumerate(words):
+                if prefix and position == len(words) - 1:
+                    terms = self._expand(word, max_expansions)
+                else:
+                    terms = [word] if word in self._postings else []
+
+                word_scores: Dict[int, float] = dict()       # a document scores once per query word, by its best term
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (count - len(postings) + .5) / (len(postings) + .5))
+                    for entity_id, frequency in postings.items():
+                        length = self._documents[entity_id].length
+                        score = idf * frequency * (self.k1 + 1) / (frequency + self.k1 * (1 - self.b + self.b * length / average_length))
+                        if score > word_scores.get(entity_id, 0.):
+                            word_scores[entity_id] = score
+
+                for entity_id, score in word_scores.items():
+                    scores[entity_id] = scores.get(entity_id, 0.) + score
+
+            if type_name:
+                scores = {entity_id: score for entity_id, score in scores.items() if self._documents[entity_id].type == type_name}
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [Hit(entity_id=entity_id, score=score, name=self._documents[entity_id].name,
+                        type=self._documents[entity_id].type, child_id=self._documents[entity_id].child_id)
+                    for entity_id, score in best]
+
+    def _expand(self, prefix: str, max_expansions: int) -> List[str]:
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+
+        terms = list()
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            terms.append(self._vocabulary[position])
+            position += 1
+
+        if len(terms) > max_expansions:
+            terms = heapq.nlargest(max_expansions, terms, key=lambda term: len(self._postings[term]))
+        return terms
@@ -0,0 +1,390 @@
+"""
+Campaign-wide relation graph.
+
+Every relation is a directed edge from its owner to its target entity. Entity ids are mapped to dense ordinals, and the
+edges are kept in compressed sparse row form: for each ordinal, a slice of flat integer arrays holds its neighbours,
+attitudes and relation ids, once for outgoing and once for incoming edges. Changes since the arrays were last built are
+kept in a small overlay and folded in once it grows.
+
+    graph = RelationGraph.from_client(client)
+    graph.within(hero_id, hops=3)
+    graph.shortest_path(hero_id, villain_id, cost=attitude_cost)
+"""
+
+import heapq
+import threading
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Callable, Union
+
+import pykanka.bulk
+import pykanka.sync
+
+OUT, IN, BOTH = "out", "in", "both"
+
+
+@dataclass
+class Edge:
+    id:         int                 # relation id
+    owner_id:   int
+    target_id:  int
+    attitude:   Optional[int] = None
+    mirror_id:  Optional[int] = None
+    relation:   Optional[str] = None
+
+    @classmethod
+    def from_json(cls, content: Dict[str, Any]) -> "Edge":
+        return cls(id=content["id"], owner_id=content["owner_id"], target_id=content["target_id"],
+                   attitude=content.get("attitude"), mirror_id=content.get("mirror_id"), relation=content.get("relation"))
+
+
+def attitude_cost(attitude: Optional[int]) -> float:
+    """Edge cost for weighted paths preferring friendly relations: 1 for attitude 100, 3 for attitude -100"""
+    return 1 + (100 - (attitude or 0)) / 100
+
+
+class _CSR:
+    """Adjacency of one direction, as offsets into flat arrays"""
+
+    def __init__(self, count: int, edges: List[Tuple[int, int, int, int]]):
+        """:param edges: (from ordinal, to ordinal, attitude, relation id)"""
+        edges.sort()
+        self.offsets = array("l", [0] * (count + 1))
+        for source, _, _, _ in edges:
+            self.offsets[source + 1] += 1
+        for i in range(count):
+            self.offsets[i + 1] += self.offsets[i]
+
+        self.neighbours = array("l", (edge[1] for edge in edges))
+        self.attitudes = array("h", (edge[2] for edge in edges))
+        self.relation_ids = array("q", (edge[3] for edge in edges))
+
+    def row(self, ordinal: int) -> range:
+        if ordinal + 1 >= len(self.offsets):
+            return range(0)
+        return range(self.offsets[ordinal], self.offsets[ordinal + 1])
+
+
+class RelationGraph:
+    def __init__(self, compact_ratio: float = .1):
+        """
+        :param compact_ratio: Rebuild the arrays once the overlay of changes holds this share of all edges
+        """
+        self.compact_ratio = compact_ratio
+
+        self._edges: Dict[int, Edge] = dict()           # relation id -> edge, the source of truth
+        self._ordinals: Dict[int, int] = dict()         # entity id -> ordinal
+        self._entity_ids = array("q")                   # ordinal -> entity id
+        self._csr = {OUT: _CSR(0, []), IN: _CSR(0, [])}
+        self._added: Dict[str, Dict[int, List[Tuple[int, int, int]]]] = {OUT: dict(), IN: dict()}
+        self._dropped: set = set()                      # relation ids in the arrays that were removed or replaced
+        self._overlay_size = 0
+        self._lock = threading.RLock()
+        self.synced_at: Optional[datetime] = None
+
+    # --- loading ---
+
+    @classmethod
+    def from_relations(cls, relations: Iterable[Dict[str, Any]], **kwargs) -> "RelationGraph":
+        graph = cls(**kwargs)
+        for relation in relations:
+            edge = Edge.from_json(relation)
+            graph._edges[edge.id] = edge
+        graph.compact()
+        return graph
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], **kwargs) -> "RelationGraph":
+        """Builds the graph from export records that include the "relations" subentries"""
+        return cls.from_relations((relation for record in records
+                                   for relation in (record.get("subentries") or dict()).get("relations", [])), **kwargs)
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", max_workers: int = 4, **kwargs) -> "RelationGraph":
+        """Loads every relation of the campaign from its relations listing, fetching pages concurrently"""
+        synced_at = datetime.now(timezone.utc)
+        graph = cls.from_relations(pykanka.bulk.iter_listing(client, f"{client.campaign_base_url}relations", max_workers=max_workers), **kwargs)
+        graph.synced_at = synced_at
+        return graph
+
+    def sync(self, client: "pykanka.KankaClient", max_workers: int = 4) -> int:
+        """
+        Fetches relations changed since the last load or sync with lastSync. Deleted relations aren't reported by
+        the listing, attach() the graph to the client to follow deletions made through it.
+
+        :return: number of changed relations
+        """
+        url = f"{client.campaign_base_url}relations"
+        if self.synced_at:
+            url = pykanka.bulk.with_params(url, lastSync=pykanka.sync.format_last_sync(self.synced_at))
+        synced_at = datetime.now(timezone.utc)
+
+        changed = 0
+        for relation in pykanka.bulk.iter_listing(client, url, max_workers=max_workers):
+            self.add(relation)
+            changed += 1
+        self.synced_at = synced_at
+        return changed
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the graph current with relation writes made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.subentry_endpoint != "relations":
+            return
+        if event.method == "delete":
+            if len(event.path) > 3:
+                self.remove(int(event.path[3]))
+        elif event.data:
+            self.add(event.data)
+
+    # --- updates ---
+
+    def add(self, relation: Union[Dict[str, Any], Edge]):
+        """Adds or replaces a relation"""
+        edge = relation if isinstance(relation, Edge) else Edge.from_json(relation)
+        with self._lock:
+            self._drop(edge.id)
+            self._edges[edge.id] = edge
+            owner, target = self._ordinal(edge.owner_id), self._ordinal(edge.target_id)
+            attitude = edge.attitude or 0
+            self._added[OUT].setdefault(owner, []).append((target, attitude, edge.id))
+            self._added[IN].setdefault(target, []).append((owner, attitude, edge.id))
+            self._overlay_size += 1
+            self._maybe_compact()
+
+    def remove(self, relation_id: int):
+        with self._lock:
+            self._drop(relation_id)
+            self._edges.pop(relation_id, None)
+            self._maybe_compact()
+
+    def _drop(self, relation_id: int):
+        edge = self._edges.get(relation_id)
+        if edge is None:
+            return
+        for direction, ordinal in ((OUT, self._ordinals[edge.owner_id]), (IN, self._ordinals[edge.target_id])):
+            added = self._added[direction].get(ordinal)
+            if added:
+                added[:] = [entry for entry in added if entry[2] != relation_id]
+        self._dropped.add(relation_id)
+        self._overlay_size += 1
+
+    def _ordinal(self, entity_id: int) -> int:
+        ordinal = self._ordinals.get(entity_id)
+        if ordinal is None:
+            ordinal = self._ordinals[entity_id] = len(self._entity_ids)
+            self._entity_ids.append(entity_id)
+        return ordinal
+
+    def _maybe_compact(self):
+        if self._overlay_size > max(self.compact_ratio * len(self._edges), 64):
+            self.compact()
+
+    def compact(self):
+        """Rebuilds the arrays from all edges and empties the overlay"""
+        with self._lock:
+            forward, backward = list(), list()
+            for edge in self._edges.values():
+                owner, target = self._ordinal(edge.owner_id), self._ordinal(edge.target_id)
+                forward.append((owner, target, edge.attitude or 0, edge.id))
+                backward.append((target, owner, edge.attitude or 0, edge.id))
+
+            self._csr = {OUT: _CSR(len(self._entity_ids), forward), IN: _CSR(len(self._entity_ids), backward)}
+            self._added = {OUT: dict(), IN: dict()}
+            self._dropped = set()
+            self._overlay_size = 0
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self._ordinals
+
+    def edge(self, relation_id: int) -> Optional[Edge]:
+        return self._edges.get(relation_id)
+
+    def _adjacent(self, ordinal: int, direction: str) -> Iterable[Tuple[int, int, int]]:
+        """(neighbour ordinal, attitude, relation id) of every edge at ordinal"""
+        for side in ((OUT, IN) if direction == BOTH else (direction,)):
+            csr = self._csr[side]
+            dropped = self._dropped
+            for i in csr.row(ordinal):
+                if not dropped or csr.relation_ids[i] not in dropped:
+                    yield csr.neighbours[i], csr.attitudes[i], csr.relation_ids[i]
+            yield from self._added[side].get(ordinal, ())
+
+    def _adjacent_ordinals(self, ordinal: int, direction: str):
+        """Neighbour ordinals and attitudes as two sequences, sliced straight from the arrays when there is no overlay"""
+        if self._overlay_size:
+            edges = list(self._adjacent(ordinal, direction))
+            return [edge[0] for edge in edges], [edge[1] for edge in edges]
+
+        neighbours, attitudes = array("l"), array("h")
+        for side in ((OUT, IN) if direction == BOTH else (direction,)):
+            csr = self._csr[side]
+            row = csr.row(ordinal)
+            neighbours += csr.neighbours[row.start:row.stop]
+            attitudes += csr.attitudes[row.start:row.stop]
+        return neighbours, attitudes
+
+    def neighbours(self, entity_id: int, direction: str = BOTH, min_attitude: int = None,
+                   max_attitude: int = None) -> List[int]:
+        """
+        Entities directly related to entity_id.
+
+        :param direction: "out" for relations owned by entity_id, "in" for relations targeting it, or "both"
+        :param min_attitude: Only follow relations with at least this attitude
+        :param max_attitude: Only follow relations with at most this attitude
+        """
+        ordinal = self._ordinals.get(entity_id)
+        if ordinal is None:
+            return []
+        found = dict()
+        for neighbour, attitude, _ in self._adjacent(ordinal, direction):
+            if (min_attitude is None or attitude >= min_attitude) and (max_attitude is None or attitude <= max_attitude):
+                found[self._entity_ids[neighbour]] = None
+        return list(found)
+
+    def relations_of(self, entity_id: int, direction: str = BOTH) -> List[Edge]:
+        ordinal = self._ordinals.get(entity_id)
+        if ordinal is None:
+            return []
+        return [self._edges[relation_id] for _, _, relation_id in self._adjacent(ordinal, direction)]
+
+    def within(self, entity_id: int, hops: int, direction: str = BOTH, min_attitude: int = None) -> Dict[int, int]:
+        """Entities reachable from entity_id in at most hops steps, with their distance. entity_id itself is left out."""
+        start = self._ordinals.get(entity_id)
+        if start is None:
+            return {}
+
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            ordinal = queue.popleft()
+            if distances[ordinal] == hops:
+                continue
+            neighbours, attitudes = self._adjacent_ordinals(ordinal, direction)
+            for neighbour, attitude in zip(neighbours, attitudes):
+                if neighbour not in distances and (min_attitude is None or attitude >= min_attitude):
+                    distances[neighbour] = distances[ordinal] + 1
+                    queue.append(neighbour)
+
+        distances.pop(start)
+        return {self._entity_ids[ordinal]: distance for ordinal, distance in distances.items()}
+
+    def shortest_path(self, source_id: int, target_id: int, direction: str = BOTH,
+                      cost: Callable[[int], float] = None) -> Optional[List[int]]:
+        """
+        Entity ids along a shortest path from source_id to target_id, both included, or None if there is none.
+
+        :param cost: Function of an edge's attitude giving its length, e.g. attitude_cost. Every edge has length 1 if None.
+        """
+        start, goal = self._ordinals.get(source_id), self._ordinals.get(target_id)
+        if start is None or goal is None:
+            return None
+
+        if start == goal:
+            return [source_id]
+        if cost is None:
+            return self._bidirectional_path(start, goal, direction)
+
+        costs = dict()                      # attitudes only take a few hundred values, compute each cost once
+        previous = {start: None}
+        distances = {start: 0.}
+        heap = [(0., start)]
+        while heap:
+            distance, ordinal = heapq.heappop(heap)
+            if ordinal == goal:
+                break
+            if distance > distances[ordinal]:
+                continue
+            neighbours, attitudes = self._adjacent_ordinals(ordinal, direction)
+            for neighbour, attitude in zip(neighbours, attitudes):
+                edge_cost = costs.get(attitude)
+                if edge_cost is None:
+                    edge_cost = costs[attitude] = cost(attitude)
+                candidate = distance + edge_cost
+                if candidate < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = candidate
+                    previous[neighbour] = ordinal
+                    heapq.heappush(heap, (candidate, neighbour))
+
+        if goal not in previous:
+            return None
+        return [self._entity_ids[ordinal] for ordinal in _walk_back(previous, goal)[::-1]]
+
+    def _bidirectional_path(self, start: int, goal: int, direction: str) -> Optional[List[int]]:
+        """Unweighted shortest path, searching from both ends and always growing the smaller frontier"""
+        backward_direction = {OUT: IN, IN: OUT, BOTH: BOTH}[direction]
+        forward, backward = {start: None}, {goal: None}
+        forward_frontier, backward_frontier = [start], [goal]
+
+        while forward_frontier and backward_frontier:
+            grow_forward = len(forward_frontier) <= len(backward_frontier)
+            frontier = forward_frontier if grow_forward else backward_frontier
+            seen, other = (forward, backward) if grow_forward else (backward, forward)
+            side = direction if grow_forward else backward_direction
+
+            next_frontier = list()
+            for ordinal in frontier:
+                for neighbour in self._adjacent_ordinals(ordinal, side)[0]:
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = ordinal
+                    if neighbour in other:
+                        path = _walk_back(forward, neighbour)[::-1] + _walk_back(backward, neighbour)[1:]
+                        return [self._entity_ids[step] for step in path]
+                    next_frontier.append(neighbour)
+
+            if grow_forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+
+        return None
+
+    def degree(self, entity_id: int, direction: str = BOTH) -> int:
+        ordinal = self._ordinals.get(entity_id)
+        if ordinal is None:
+            return 0
+        if not self._overlay_size:
+            return sum(len(self._csr[side].row(ordinal)) for side in ((OUT, IN) if direction == BOTH else (direction,)))
+        return sum(1 for _ in self._adjacent(ordinal, direction))
+
+    def degree_centrality(self, direction: str = BOTH) -> Dict[int, float]:
+        """Degree of every entity divided by the number of other entities"""
+        self.compact()
+        others = max(len(self._entity_ids) - 1, 1)
+        return {entity_id: self.degree(entity_id, direction) / others for entity_id in self._ordinals}
+
+    def most_connected(self, count: int = 10, direction: str = BOTH) -> List[Tuple[int, int]]:
+        """(entity id, degree) of the count entities with the most relations"""
+        self.compact()
+        return heapq.nlargest(count, ((entity_id, self.degree(entity_id, direction)) for entity_id in self._ordinals),
+                              key=lambda item: item[1])
+
+    def closeness(self, entity_id: int, direction: str = BOTH) -> float:
+        """Closeness centrality: reachable entities divided by the sum of their distances, scaled by the reachable share"""
+        distances = self.within(entity_id, hops=len(self._entity_ids), direction=direction)
+        if not distances:
+            return 0.
+        reachable = len(distances)
+        return reachable / sum(distances.values()) * reachable / max(len(self._entity_ids) - 1, 1)
+
+
+def _walk_back(previous: Dict[int, Optional[int]], ordinal: int) -> List[int]:
+    """Follows predecessor links from ordinal back to the start of a search"""
+    path = list()
+    while ordinal is not None:
+        path.append(ordinal)
+        ordinal = previous[ordinal]
+    return path
@@ -0,0 +1,315 @@
+"""
+Local trees of nestable child types.
+
+Locations, organisations, families, races, notes, tags, timelines, quests, journals and a few more types point at a
+parent of their own type (see GenericChildType._parent_key). A Hierarchy loads one such type in a single listing pass
+and numbers its tree in preorder (nested sets): every node gets the position where its subtree starts and ends. The
+descendants of a node are then one slice, its subtree size a subtraction and "is X inside Y" two comparisons.
+
+Parent changes only touch the parent and children maps, the numbering is redone lazily by the next query that needs
+it. Attached to a client, the hierarchy follows the writes made through it.
+
+    locations = Hierarchy.from_client(client, "location")
+    locations.attach(client)
+    locations.is_inside(tavern_id, kingdom_id)
+    locations.descendants(kingdom_id)
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional
+
+import pykanka.bulk
+import pykanka.child_types
+import pykanka.sync
+from pykanka.exceptions import *
+
+
+def nestable_types() -> List[str]:
+    """Keys of child_type_dictionary of the types that have a parent of their own type"""
+    return [type_name for type_name, cls in pykanka.child_types.child_type_dictionary.items() if cls._parent_key]
+
+
+class Hierarchy:
+    def __init__(self, type_name: str):
+        """
+        :param type_name: Key of child_type_dictionary of a nestable type, e.g. "location"
+        """
+        cls = pykanka.child_types.child_type_dictionary[type_name]
+        if not cls._parent_key:
+            raise WrongParametersPassedToEntity(f"{type_name} can't be nested, nestable types are {', '.join(nestable_types())}")
+
+        self.type_name = type_name
+        self.parent_key = cls._parent_key
+        self.endpoint = cls.endpoint
+
+        self._parents: Dict[int, Optional[int]] = dict()       # child id -> parent child id
+        self._children: Dict[int, List[int]] = dict()           # child id -> child ids of its direct children
+        self._entity_ids: Dict[int, int] = dict()               # child id -> entity id
+        self._child_ids: Dict[int, int] = dict()                # entity id -> child id
+
+        self._order: List[int] = list()                         # child ids in preorder
+        self._enter: Dict[int, int] = dict()                    # child id -> position in _order
+        self._exit: Dict[int, int] = dict()                     # child id -> position after its last descendant
+        self._depths: Dict[int, int] = dict()
+        self._stale = False
+
+        self._lock = threading.RLock()
+        self.synced_at: Optional[datetime] = None
+
+    # --- loading ---
+
+    @classmethod
+    def from_children(cls, type_name: str, children: Iterable[Dict[str, Any]]) -> "Hierarchy":
+        """Builds the tree from child payloads as returned by the type's listing, e.g. locations"""
+        hierarchy = cls(type_name)
+        for child in children:
+            hierarchy._store(child["id"], child.get(hierarchy.parent_key), child.get("entity_id"))
+        hierarchy._renumber()
+        return hierarchy
+
+    @classmethod
+    def from_records(cls, type_name: str, records: Iterable[Dict[str, Any]]) -> "Hierarchy":
+        """Builds the tree from export records, e.g. of an NDJSON export, a mirror or a snapshot. Records of other types are skipped."""
+        return cls.from_children(type_name, (dict(record.get("child") or dict(), id=record["child_id"], entity_id=record["id"])
+                                             for record in records if record.get("type") == type_name))
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", type_name: str, max_workers: int = 4) -> "Hierarchy":
+        """Loads the tree from the type's listing, fetching pages concurrently"""
+        synced_at = datetime.now(timezone.utc)
+        endpoint = pykanka.child_types.child_type_dictionary[type_name].endpoint
+        hierarchy = cls.from_children(type_name, pykanka.bulk.iter_listing(client, f"{client.campaign_base_url}{endpoint}",
+                                                                          max_workers=max_workers))
+        hierarchy.synced_at = synced_at
+        return hierarchy
+
+    def sync(self, client: "pykanka.KankaClient", max_workers: int = 4) -> int:
+        """
+        Fetches children changed since the last load or sync with lastSync and applies their parents. Deletions
+        aren't reported by the listing, attach() the hierarchy to the client to follow deletions made through it.
+
+        :return: number of changed children
+        """
+        url = f"{client.campaign_base_url}{self.endpoint}"
+        if self.synced_at:
+            url = pykanka.bulk.with_params(url, lastSync=pykanka.sync.format_last_sync(self.synced_at))
+        synced_at = datetime.now(timezone.utc)
+
+        changed = 0
+        for child in pykanka.bulk.iter_listing(client, url, max_workers=max_workers):
+            self.set_parent(child["id"], child.get(self.parent_key), entity_id=child.get("entity_id"))
+            changed += 1
+        self.synced_at = synced_at
+        return changed
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the tree current with every write made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.type_name is None:
+            if event.method == "delete" and event.path[:1] == ["entities"] and len(event.path) == 2:
+                child_id = self._child_ids.get(int(event.path[1]))
+                if child_id is not None:
+                    self.remove(child_id)
+            return
+
+        if event.type_name != self.type_name:
+            return
+        if event.method == "delete":
+            if event.child_id is not None:
+                self.remove(event.child_id)
+        elif event.data and event.data.get("id") is not None:
+            self.set_parent(event.data["id"], event.data.get(self.parent_key), entity_id=event.data.get("entity_id"))
+
+    # --- updates ---
+
+    def set_parent(self, child_id: int, parent_id: Optional[int], entity_id: int = None):
+        """Adds a child or moves it, with its subtree, below parent_id. A parent_id of None makes it a root."""
+        with self._lock:
+            if parent_id is not None and self._leads_to(parent_id, child_id):
+                raise WrongParametersPassedToEntity(f"{self.type_name} {parent_id} is inside {child_id}, it can't become its parent")
+
+            known = child_id in self._parents
+            if entity_id is not None:
+                self._entity_ids[child_id] = entity_id
+                self._child_ids[entity_id] = child_id
+            if known and self._parents[child_id] == parent_id:
+                return
+
+            if known:
+                self._unlink(child_id)
+            self._store(child_id, parent_id)
+            self._stale = True
+
+    def remove(self, child_id: int):
+        """Removes a child. Its children become roots, as the API doesn't delete them with their parent."""
+        with self._lock:
+            if child_id not in self._parents:
+                return
+            self._unlink(child_id)
+            del self._parents[child_id]
+            for orphan in self._children.pop(child_id, []):
+                self._parents[orphan] = None
+            entity_id = self._entity_ids.pop(child_id, None)
+            self._child_ids.pop(entity_id, None)
+            self._stale = True
+
+    def _store(self, child_id: int, parent_id: Optional[int], entity_id: int = None):
+        self._parents[child_id] = parent_id
+        if parent_id is not None:
+            self._children.setdefault(parent_id, []).append(child_id)
+        if entity_id is not None:
+            self._entity_ids[child_id] = entity_id
+            self._child_ids[entity_id] = child_id
+
+    def _unlink(self, child_id: int):
+        parent_id = self._parents[child_id]
+        siblings = self._children.get(parent_id)
+        if siblings:
+            siblings.remove(child_id)
+            if not siblings:
+                del self._children[parent_id]
+
+    def _renumber(self):
+        """Numbers every node in preorder. Parents that aren't known, e.g. private ones, count as missing."""
+        order, enter, exit_, depths = list(), dict(), dict(), dict()
+
+        def visit(root: int):
+            enter[root], depths[root] = len(order), 0
+            order.append(root)
+            stack = [(root, iter(self._children.get(root, ())))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child in enter:              # only reachable through a cycle in inconsistent data
+                        continue
+                    enter[child], depths[child] = len(order), depths[node] + 1
+                    order.append(child)
+                    stack.append((child, iter(self._children.get(child, ()))))
+                    break
+                else:
+                    exit_[node] = len(order)
+                    stack.pop()
+
+        for child_id, parent_id in self._parents.items():
+            if parent_id is None or parent_id not in self._parents:
+                visit(child_id)
+        for child_id in self._parents:             # whatever is left hangs in a cycle, start it anywhere
+            if child_id not in enter:
+                visit(child_id)
+
+        self._order, self._enter, self._exit, self._depths = order, enter, exit_, depths
+        self._stale = False
+
+    def _numbered(self):
+        if self._stale:
+            self._renumber()
+
+    def _is_inside(self, child_id: int, ancestor_id: int) -> bool:
+        if child_id not in self._parents or ancestor_id not in self._parents:
+            return False
+        if not self._stale:
+            return self._enter[ancestor_id] < self._enter[child_id] < self._exit[ancestor_id]
+        return ancestor_id in self._walk_up(child_id)       # cheaper than renumbering between writes
+
+    def _leads_to(self, child_id: int, ancestor_id: int) -> bool:
+        """
+        Whether the parent chain from child_id, itself included, reaches ancestor_id. Unlike _is_inside() this also
+        follows parents that aren't loaded yet, e.g. a parent_id stored before the parent itself arrived.
+        """
+        seen = set()
+        while child_id is not None and child_id not in seen:
+            if child_id == ancestor_id:
+                return True
+            seen.add(child_id)
+            child_id = self._parents.get(child_id)
+        return False
+
+    def _walk_up(self, child_id: int) -> List[int]:
+        ancestors, seen = list(), {child_id}
+        parent_id = self._parents.get(child_id)
+        while parent_id is not None and parent_id in self._parents and parent_id not in seen:
+            ancestors.append(parent_id)
+            seen.add(parent_id)
+            parent_id = self._parents[parent_id]
+        return ancestors
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    def __contains__(self, child_id: int) -> bool:
+        return child_id in self._parents
+
+    def parent(self, child_id: int) -> Optional[int]:
+        return self._parents.get(child_id)
+
+    def children(self, child_id: int) -> List[int]:
+        """Child ids of the direct children"""
+        with self._lock:
+            return list(self._children.get(child_id, ()))
+
+    def roots(self) -> List[int]:
+        with self._lock:
+            return [child_id for child_id, parent_id in self._parents.items() if parent_id is None or parent_id not in self._parents]
+
+    def entity_id(self, child_id: int) -> Optional[int]:
+        return self._entity_ids.get(child_id)
+
+    def child_id(self, entity_id: int) -> Optional[int]:
+        return self._child_ids.get(entity_id)
+
+    def ancestors(self, child_id: int) -> List[int]:
+        """Child ids from the parent up to the root"""
+        with self._lock:
+            return self._walk_up(child_id)
+
+    def descendants(self, child_id: int) -> List[int]:
+        """Child ids of the whole subtree below child_id, in preorder"""
+        with self._lock:
+            if child_id not in self._parents:
+                return []
+            self._numbered()
+            return self._order[self._enter[child_id] + 1:self._exit[child_id]]
+
+    def subtree_size(self, child_id: int) -> int:
+        """Number of nodes in the subtree of child_id, including itself"""
+        with self._lock:
+            if child_id not in self._parents:
+                return 0
+            self._numbered()
+            return self._exit[child_id] - self._enter[child_id]
+
+    def depth(self, child_id: int) -> int:
+        """0 for roots"""
+        with self._lock:
+            if self._stale:
+                return len(self._walk_up(child_id))
+            return self._depths.get(child_id, 0)
+
+    def is_inside(self, child_id: int, ancestor_id: int) -> bool:
+        """Whether child_id is somewhere below ancestor_id, e.g. a tavern inside a kingdom"""
+        with self._lock:
+            return self._is_inside(child_id, ancestor_id)
+
+    def common_ancestor(self, first_id: int, second_id: int) -> Optional[int]:
+        """Deepest node both are inside of or equal to, None if they are in different trees"""
+        with self._lock:
+            first_path = [first_id] + self._walk_up(first_id)
+            second_path = set([second_id] + self._walk_up(second_id))
+            for child_id in first_path:
+                if child_id in second_path:
+                    return child_id
+            return None
+
+
+def hierarchies(client: "pykanka.KankaClient", types: Iterable[str] = None, max_workers: int = 4) -> Dict[str, Hierarchy]:
+    """Loads the hierarchies of several nestable types, by default all of them"""
+    return {type_name: Hierarchy.from_client(client, type_name, max_workers=max_workers)
+            for type_name in (types or nestable_types())}
@@ -0,0 +1,221 @@
+"""
+Streaming bulk import of NDJSON files into a campaign.
+
+Every line is one record of the form
+
+    {"type": "character", "ref": "hero-1",
+     "data": {"name": "Jonathan Green", "location_id": {"$ref": "loc-1"}, "tags": [{"$ref": "tag-2"}]},
+     "attributes": [{"name": "HP", "value": "42"}],
+     "relations": [{"relation": "rival", "target_id": {"$entity": "villain-1"}, "visibility": "all"}]}
+
+"type" is a key of child_type_dictionary and "data" holds the fields accepted by that type's post().
+Subentries are listed under the endpoint names of subentry_type_dictionary (except entity_files, which need uploads)
+and are created after their entity.
+{"$ref": ...} is replaced with the child id of an earlier record and {"$entity": ...} with its entity id,
+anywhere in "data" or the subentries. "ref" is optional and only needed for records that are referenced.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import Union, IO, Dict, Any, List, Tuple, Optional
+
+import pykanka.child_types
+import pykanka.entity_subentries
+import pykanka.journal
+import pykanka.ndjson
+from pykanka.exceptions import *
+
+
+@dataclass
+class ImportFailure:
+    line:   int
+    ref:    Optional[str]
+    error:  Exception
+
+
+@dataclass
+class ImportResult:
+    created:    int = 0
+    skipped:    int = 0                     # records the journal shows as already imported
+    subentries: int = 0
+    failures:   List[ImportFailure] = field(default_factory=list)
+    ids:        Dict[str, Tuple[int, int]] = field(default_factory=dict)    # ref -> (child id, entity id)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+class Importer:
+    """
+    Posts NDJSON records through a bounded thread pool. At most max_pending records are read ahead of the ones
+    still being posted, so memory use doesn't grow with the size of the input.
+    A record that references another one waits until that record has been created.
+    """
+
+    def __init__(self, client: "pykanka.KankaClient", max_workers: int = 8, max_pending: int = 64,
+                 journal: "pykanka.journal.WriteJournal" = None):
+        """
+        :param client: KankaClient of the campaign to import into
+        :param max_workers: Maximum number of records posted at once
+        :param max_pending: Maximum number of records read ahead of the ones already created
+        :param journal: WriteJournal. Records it shows as done aren't posted again, so interrupted imports can be resumed.
+        """
+        self.client = client
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending, self.max_workers)
+        self.journal = journal
+
+        self._refs: Dict[str, Union[Future, Tuple[int, int]]] = dict()
+        self._lock = threading.Lock()
+
+    def run(self, source: Union[str, IO]) -> ImportResult:
+        """
+        Imports all records of an NDJSON file.
+
+        :param source: File path or open file object
+        :return: ImportResult
+        """
+        result = ImportResult()
+        slots = threading.BoundedSemaphore(self.max_pending)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for line_no, record in pykanka.ndjson.iter_records(source):
+                slots.acquire()
+                future = executor.submit(self._import_record, line_no, record, result)
+                future.add_done_callback(lambda _: slots.release())
+
+                ref = record.get("ref")
+                if ref is not None:
+                    with self._lock:
+                        if ref in self._refs:
+                            raise WrongParametersPassedToEntity(f"line {line_no}: ref '{ref}' is used more than once")
+                        self._refs[ref] = future
+                    future.add_done_callback(lambda f, ref=ref: self._settle(ref, f))
+
+        result.ids = {ref: ids for ref, ids in self._refs.items() if type(ids) == tuple}
+        return result
+
+    def _settle(self, ref: str, future: Future):
+        """Replaces a finished future by the ids it produced, so they don't keep the record alive"""
+        if future.exception() is None:
+            with self._lock:
+                self._refs[ref] = future.result()
+
+    def _import_record(self, line_no: int, record: Dict[str, Any], result: ImportResult) -> Tuple[int, int]:
+        try:
+            cls = pykanka.child_types.child_type_dictionary[record["type"]]
+
+            data = self._resolve(record.get("data", {}))
+            child = cls.from_json(self.client, data)
+            payload, files = child._prepare_post(None)
+
+            entry, skipped = self._post(child.base_url, data=payload, files=files)
+            ids = (entry["id"], entry["entity_id"])
+        except Exception as e:
+            with self._lock:
+                result.failures.append(ImportFailure(line=line_no, ref=record.get("ref"), error=e))
+            raise
+
+        with self._lock:
+            if skipped:
+                result.skipped += 1
+            else:
+                result.created += 1
+
+        for endpoint, subentry_cls in pykanka.entity_subentries.subentry_type_dictionary.items():
+            if endpoint == "entity_files":
+                continue
+            for values in record.get(endpoint, []):
+                try:
+                    self._import_subentry(subentry_cls, ids[1], values)
+                    with self._lock:
+                        result.subentries += 1
+                except Exception as e:                  # the entity itself exists, so records referencing it can go ahead
+                    with self._lock:
+                        result.failures.append(ImportFailure(line=line_no, ref=record.get("ref"), error=e))
+
+        return ids
+
+    def _import_subentry(self, cls, entity_id: int, values: Dict[str, Any]):
+        values = self._resolve(values)
+        if cls is pykanka.entity_subentries.Relation:
+            values["owner_id"] = entity_id
+        else:
+            values["entity_id"] = entity_id
+
+        subentry = cls(_client=self.client, **values)
+        data, url = subentry._prepare_post({})
+        self._post(url, data=data)
+
+    def _post(self, url: str, **kwargs) -> Tuple[Dict[str, Any], bool]:
+        """
+        Posts directly, bypassing any batch on the client.
+
+        :return: (the response's data, whether the journal showed the post as already done)
+        """
+        key = None
+        if self.journal:
+            journaled = {k: v for k, v in kwargs.items() if k != "files"}
+            key = self.journal.key_for("post", url, journaled)
+            entry = self.journal.lookup(key)
+            if entry and entry.done:
+                return entry.data or dict(), True
+            self.journal.record(key, "post", url, journaled)
+
+        try:
+            response = self.client._request("post", url, **kwargs)
+            if not response.ok:
+                raise ResponseNotOkError(f"Response from {url} not OK, code {response.status_code}: {response.text}")
+        except Exception as e:
+            if key:
+                self.journal.fail(key, e)
+            raise
+
+        if key:
+            self.journal.complete(key, response)
+        return response.json()["data"], False
+
+    def _resolve(self, value):
+        """Returns a copy of value with all {"$ref": ...} and {"$entity": ...} placeholders replaced by ids"""
+        if isinstance(value, dict):
+            if len(value) == 1 and ("$ref" in value or "$entity" in value):
+                child_id, entity_id = self._lookup(value.get("$ref", value.get("$entity")))
+                return child_id if "$ref" in value else entity_id
+            return {key: self._resolve(v) for key, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(v) for v in value]
+        return value
+
+    def _lookup(self, ref: str) -> Tuple[int, int]:
+        with self._lock:
+            target = self._refs.get(ref)
+
+        if target is None:
+            raise UnresolvedReferenceError(f"'{ref}' doesn't refer to an earlier record")
+        if type(target) == tuple:
+            return target
+
+        try:
+            return target.result()        # blocks until the referenced record has been created
+        except Exception as e:
+            raise UnresolvedReferenceError(f"'{ref}' could not be created: {e}") from e
+
+
+def import_ndjson(client: "pykanka.KankaClient", source: Union[str, IO], max_workers: int = 8, max_pending: int = 64,
+                  journal: Union["pykanka.journal.WriteJournal", str] = None) -> ImportResult:
+    """
+    Imports an NDJSON file into the client's campaign. See the module docstring for the record format.
+
+    :param client: KankaClient of the campaign to import into
+    :param source: File path or open file object, compressed files are recognised by their extension
+    :param max_workers: Maximum number of records posted at once
+    :param max_pending: Maximum number of records read ahead of the ones already created
+    :param journal: WriteJournal or path of a journal file, to make the import resumable
+    :return: ImportResult
+    """
+    if type(journal) == str:
+        journal = pykanka.journal.WriteJournal(journal)
+
+    return Importer(client, max_workers=max_workers, max_pending=max_pending, journal=journal).run(source)
@@ -0,0 +1,240 @@
+"""
+Inventories across a whole campaign.
+
+Inventory entries can only be listed per entity. InventoryIndex fetches the inventories of many entities concurrently
+once and keeps the summed amounts in both directions, item -> holders and holder -> items, so questions like "who has
+item 42" or "how many healing potions does the party carry" are dict lookups. attach() keeps it current with the
+inventory writes made through a client.
+
+Items are keyed by their item_id (the child id of the Item). Entries that only have a name, without a linked item,
+are keyed by that name.
+
+    inventories = InventoryIndex.from_client(client, types=["character"])
+    inventories.holders(42)
+    inventories.total(potion_id, holders=party_entity_ids)
+    inventories.attach(client)
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Set, Union
+
+import pykanka.bulk
+import pykanka.child_types
+
+ItemKey = Union[int, str]   # item_id, or the name of an entry that isn't linked to an item
+
+
+@dataclass
+class _Entry:
+    id:             int
+    holder:         int                 # entity id of the entity holding the item
+    item:           ItemKey
+    amount:         int
+    is_equipped:    bool
+
+
+def _item_key(entry: Dict[str, Any]) -> Optional[ItemKey]:
+    if entry.get("item_id") is not None:
+        return int(entry["item_id"])
+    return entry.get("name") or None
+
+
+class InventoryIndex:
+    def __init__(self):
+        self._entries: Dict[int, _Entry] = dict()                   # inventory id -> entry
+        self._entries_of: Dict[int, Set[int]] = dict()              # holder -> inventory ids
+        self._holders: Dict[ItemKey, Dict[int, int]] = dict()       # item -> holder -> summed amount
+        self._items: Dict[int, Dict[ItemKey, int]] = dict()         # holder -> item -> summed amount
+        self._totals: Dict[ItemKey, int] = dict()                   # item -> amount in the whole campaign
+        self._lock = threading.RLock()
+
+    # --- loading ---
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "InventoryIndex":
+        """Builds the index from EntityInventory payloads, which carry the entity_id of their holder"""
+        index = cls()
+        for entry in entries:
+            index.add(entry)
+        return index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "InventoryIndex":
+        """Builds the index from export records with subentries=["inventory"]. Records without them are skipped."""
+        index = cls()
+        for record in records:
+            if "inventory" in (record.get("subentries") or dict()):
+                index.set_inventory(record["id"], record["subentries"]["inventory"])
+        return index
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", entity_ids: Iterable[int] = None, types: Iterable[str] = None,
+                    max_workers: int = 8) -> "InventoryIndex":
+        """
+        Fetches the inventories of many entities, max_workers of them at a time. There is no campaign-wide inventory
+        listing, so this costs one request per entity: limit it with entity_ids or types where possible.
+
+        :param client: KankaClient
+        :param entity_ids: Entities whose inventories to load
+        :param types: Load every entity of these types instead, e.g. ["character", "location"]. All entities if
+                      neither is given.
+        :param max_workers: Maximum number of requests in flight at once
+        """
+        campaign_url = client.campaign_base_url
+        if entity_ids is None and types is None:
+            entity_ids = (entity["id"] for entity in pykanka.bulk.iter_listing(client, f"{campaign_url}entities", max_workers=4))
+        elif entity_ids is None:
+            entity_ids = (child["entity_id"] for type_name in types for child in pykanka.bulk.iter_listing(
+                client, f"{campaign_url}{pykanka.child_types.child_type_dictionary[type_name].endpoint}", max_workers=4))
+
+        index = cls()
+        for entity_id, subentries in pykanka.bulk.fetch_subentries(client, entity_ids, ["inventory"], max_workers=max_workers):
+            index.set_inventory(entity_id, subentries["inventory"])
+        return index
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the index current with inventory writes made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.subentry_endpoint == "inventory":
+            if event.method == "delete":
+                if len(event.path) > 3:
+                    self.remove(int(event.path[3]))
+            elif event.data:
+                self.add(event.data, holder=int(event.path[1]))
+            return
+
+        if event.method != "delete":
+            return
+        if event.type_name is None and event.path[:1] == ["entities"] and len(event.path) == 2:
+            self.remove_holder(int(event.path[1]))
+        elif event.type_name == "item" and event.child_id is not None:
+            self.remove_item(event.child_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- updates ---
+
+    def add(self, entry: Dict[str, Any], holder: int = None):
+        """
+        Adds or replaces an inventory entry.
+
+        :param entry: EntityInventory payload
+        :param holder: Entity id of the holder, if the payload has no entity_id
+        """
+        item = _item_key(entry)
+        holder = entry.get("entity_id") if holder is None else holder
+        if item is None or holder is None:
+            return
+
+        amount = entry.get("amount")
+        stored = _Entry(id=entry["id"], holder=int(holder), item=item, amount=1 if amount is None else int(amount),
+                        is_equipped=bool(entry.get("is_equipped")))
+        with self._lock:
+            self.remove(stored.id)
+            self._entries[stored.id] = stored
+            self._entries_of.setdefault(stored.holder, set()).add(stored.id)
+            self._count(stored, added=True)
+
+    def remove(self, inventory_id: int):
+        with self._lock:
+            stored = self._entries.pop(inventory_id, None)
+            if stored is None:
+                return
+            entries = self._entries_of[stored.holder]
+            entries.discard(inventory_id)
+            if not entries:
+                del self._entries_of[stored.holder]
+            self._count(stored, added=False)
+
+    def set_inventory(self, holder: int, entries: Iterable[Dict[str, Any]]):
+        """Replaces the whole inventory of an entity"""
+        with self._lock:
+            self.remove_holder(holder)
+            for entry in entries:
+                self.add(entry, holder=holder)
+
+    def remove_holder(self, holder: int):
+        with self._lock:
+            for inventory_id in list(self._entries_of.get(holder, ())):
+                self.remove(inventory_id)
+
+    def remove_item(self, item: ItemKey):
+        """Removes an item from every inventory, e.g. after the Item was deleted"""
+        with self._lock:
+            for inventory_id in [stored.id for stored in self._entries.values() if stored.item == item]:
+                self.remove(inventory_id)
+
+    def _count(self, stored: _Entry, added: bool):
+        """Adds an entry's amount to the sums of its item and holder, or takes it off again"""
+        amount = stored.amount if added else -stored.amount
+        held = added or any(entry.item == stored.item for entry in self._entries_in(stored.holder))
+        for sums, outer, inner in ((self._holders, stored.item, stored.holder), (self._items, stored.holder, stored.item)):
+            counts = sums.setdefault(outer, dict())
+            counts[inner] = counts.get(inner, 0) + amount
+            if not held:
+                del counts[inner]
+            if not counts:
+                del sums[outer]
+
+        self._totals[stored.item] = self._totals.get(stored.item, 0) + amount
+        if not added and stored.item not in self._holders:
+            del self._totals[stored.item]
+
+    def _entries_in(self, holder: int) -> Iterable[_Entry]:
+        return (self._entries[inventory_id] for inventory_id in self._entries_of.get(holder, ()))
+
+    # --- queries ---
+
+    def total(self, item: ItemKey, holders: Iterable[int] = None) -> int:
+        """
+        Amount of an item in the campaign.
+
+        :param item: item_id, or the name of an unlinked entry
+        :param holders: Only count the inventories of these entity ids, e.g. the party
+        """
+        if holders is None:
+            return self._totals.get(item, 0)
+        with self._lock:
+            held = self._holders.get(item, dict())
+            return sum(held.get(holder, 0) for holder in set(holders))
+
+    def totals(self) -> Dict[ItemKey, int]:
+        """Amount of every item in the campaign"""
+        with self._lock:
+            return dict(self._totals)
+
+    def holders(self, item: ItemKey) -> Dict[int, int]:
+        """Entity ids holding an item, with the amount each holds"""
+        with self._lock:
+            return dict(self._holders.get(item, dict()))
+
+    def items_of(self, holder: int, equipped: bool = None) -> Dict[ItemKey, int]:
+        """
+        Items held by an entity, with summed amounts.
+
+        :param holder: Entity id
+        :param equipped: True for equipped entries only, False for the ones that aren't, None for all
+        """
+        with self._lock:
+            if equipped is None:
+                return dict(self._items.get(holder, dict()))
+            items = dict()
+            for stored in self._entries_in(holder):
+                if stored.is_equipped == equipped:
+                    items[stored.item] = items.get(stored.item, 0) + stored.amount
+            return items
+
+    def owns(self, holder: int, item: ItemKey) -> bool:
+        return item in self._items.get(holder, ())
+
+    def entry_ids(self, holder: int) -> List[int]:
+        """Inventory ids of an entity's entries, e.g. to patch or delete them"""
+        with self._lock:
+            return sorted(self._entries_of.get(holder, ()))
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional, Iterator, Dict, Any, List
+
+import requests
+
+from pykanka.exceptions import *
+
+
+@dataclass
+class JournalEntry:
+    key:        str
+    method:     str
+    url:        str
+    payload:    Dict[str, Any]
+    status:     str                         # "pending", "done" or "failed"
+    server_id:  Optional[int] = None
+    entity_id:  Optional[int] = None
+    data:       Optional[Dict[str, Any]] = None
+    error:      Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+
+class WriteJournal:
+    """
+    Local write-ahead journal for bulk writes, stored in a SQLite file.
+
+    Every write is recorded before it is sent and marked done together with the server's response data once it
+    succeeded. Running the same sequence of writes again with the same journal skips everything that already landed,
+    so an interrupted import can simply be restarted. Writes are identified by a hash of method, url and payload,
+    plus a counter to tell apart identical writes within one run.
+
+    A write that reached the server but crashed before being marked done will be sent again, so duplicates are limited
+    to the requests that were in flight at the time of the crash.
+
+        journal = WriteJournal("import.journal")
+        with client.batch(journal=journal):
+            ...
+    """
+
+    _schema = """
+        CREATE TABLE IF NOT EXISTS operations (
+            key         TEXT PRIMARY KEY,
+            method      TEXT NOT NULL,
+            url         TEXT NOT NULL,
+            payload     TEXT NOT NULL,
+            status      TEXT NOT NULL,
+            server_id   INTEGER,
+            entity_id   INTEGER,
+            data        TEXT,
+            error       TEXT,
+            queued_at   REAL NOT NULL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS operations_status ON operations (status);
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the SQLite file. Created if it doesn't exist.
+        """
+        self.path = path
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")       # commits don't fsync the main database file
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(self._schema)
+
+        self._lock = threading.Lock()
+        self._occurrences = defaultdict(int)
+
+    def __enter__(self) -> "WriteJournal":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def key_for(self, method: str, url: str, payload: Dict[str, Any]) -> str:
+        """Returns the journal key of a write. Identical writes get consecutive keys in the order they are issued."""
+        digest = hashlib.sha1(f"{method} {url} {self._dumps(payload)}".encode()).hexdigest()
+        with self._lock:
+            self._occurrences[digest] += 1
+            return f"{digest}:{self._occurrences[digest]}"
+
+    def lookup(self, key: str) -> Optional[JournalEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT key, method, url, payload, status, server_id, entity_id, data, error FROM operations WHERE key = ?",
+                (key,)).fetchone()
+        return self._entry(row) if row else None
+
+    def record(self, key: str, method: str, url: str, payload: Dict[str, Any]):
+        """Records a write as pending, unless it is already in the journal"""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO operations (key, method, url, payload, status, queued_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                (key, method, url, self._dumps(payload), time.time()))
+
+    def record_many(self, entries: List[tuple]):
+        """Records several (key, method, url, payload) writes as pending in a single transaction"""
+        now = time.time()
+        rows = [(key, method, url, self._dumps(payload), now) for key, method, url, payload in entries]
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO operations (key, method, url, payload, status, queued_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                    rows)
+
+    def complete(self, key: str, response: requests.Response):
+        """Marks a write as done and stores the data the server returned for it"""
+        data = None
+        if response.content:
+            try:
+                data = response.json().get("data")
+            except ValueError:
+                pass
+
+        server_id = data.get("id") if isinstance(data, dict) else None
+        entity_id = data.get("entity_id") if isinstance(data, dict) else None
+
+        with self._lock:
+            self._connection.execute(
+                "UPDATE operations SET status = 'done', server_id = ?, entity_id = ?, data = ?, error = NULL, finished_at = ? WHERE key = ?",
+                (server_id, entity_id, self._dumps(data) if data is not None else None, time.time(), key))
+
+    def fail(self, key: str, error: Exception):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE operations SET status = 'failed', error = ?, finished_at = ? WHERE key = ?",
+                (str(error), time.time(), key))
+
+    def unfinished(self) -> Iterator[JournalEntry]:
+        """Yields all pending and failed writes, in the order they were queued"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, method, url, payload, status, server_id, entity_id, data, error FROM operations "
+                "WHERE status != 'done' ORDER BY queued_at, rowid").fetchall()
+        for row in rows:
+            yield self._entry(row)
+
+    def replay(self, client: "pykanka.KankaClient", max_workers: int = 8) -> "pykanka.batch.Batch":
+        """
+        Sends all unfinished writes again, without needing the code that originally issued them.
+
+        :param client: KankaClient to send the writes through
+        :param max_workers: Maximum number of requests in flight at once
+        :return: the flushed Batch
+        """
+        with client.batch(max_workers=max_workers, journal=self) as batch:
+            for entry in self.unfinished():
+                batch.queue(entry.method, entry.url, _journal_key=entry.key, **entry.payload)
+        return batch
+
+    def stats(self) -> Dict[str, int]:
+        """Number of journaled writes per status"""
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM operations GROUP BY status").fetchall())
+
+    @staticmethod
+    def _dumps(value) -> str:
+        return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+    @staticmethod
+    def _entry(row) -> JournalEntry:
+        key, method, url, payload, status, server_id, entity_id, data, error = row
+        return JournalEntry(key=key, method=method, url=url, payload=json.loads(payload), status=status,
+                            server_id=server_id, entity_id=entity_id, data=json.loads(data) if data else None, error=error)
@@ -1,14 +1,47 @@
+import threading
 import time
-from typing import Generator, Union, Callable, Dict, Any
+import warnings
+from datetime import datetime
+from typing import Generator, Union, Callable, Dict, Any, IO, Iterable, List
 
 import requests
 import tenacity
 
+import pykanka.batch
+import pykanka.bulk
 import pykanka.child_types
 import pykanka.entities
+import pykanka.events
+import pykanka.exporter
+import pykanka.filters
+import pykanka.importer
+import pykanka.journal
+import pykanka.pagination
+import pykanka.query
+import pykanka.search
+import pykanka.sync
+import pykanka.transfer
 from pykanka.exceptions import *
 
 
+class _RateLimiter:
+    """Spaces requests out evenly so that no more than per_minute requests are started in any minute. Thread safe."""
+
+    def __init__(self, per_minute: int):
+        self._interval = 60 / per_minute
+        self._next = 0.
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
 class KankaClient:
     """Main client for interacting with the Kanka.io API"""
 
@@ -32,11 +65,13 @@ class KankaClient:
         entity=pykanka.entities.Entity
     )
 
-    def __init__(self, token: str, campaign: Union[str, int] = None, cache_duration: int = 600, on_request: Callable = None, kanka_locale: str = None):
+    def __init__(self, token: str, campaign: Union[str, int] = None, cache_duration: int = 600, on_request: Callable = None, kanka_locale: str = None,
+                 rate_limit: int = None):
         """Create a client associated with a specific campaign.
 
         :param token: User API token from kanka.io
         :param campaign: Campaign name or ID
+        :param rate_limit: Maximum requests per minute, shared by all threads using this client. Unlimited if None.
         """
    
         self._api_token = token
@@ -60,12 +95,20 @@ class KankaClient:
 
         self._on_request = on_request
 
+        self._rate_limiter = _RateLimiter(rate_limit) if rate_limit else None
+        self._local = threading.local()
+        self._batch = None
+
+        self.sync_state = pykanka.sync.SyncState()
+        self.mirror = None              # CampaignMirror that query() reads from instead of the API, if set
+        self._write_listeners = list()
+
     @property
     def cache(self):
         t = time.time()
-        for entry in self._cache.keys():
-            if t - self._cache[entry][1].time() > self._cache_duration:
-                self._cache.pop(entry)
+        for entry, (_, stored_at) in list(self._cache.items()):     # copied, other threads may change the cache meanwhile
+            if t - stored_at > self._cache_duration:
+                self._cache.pop(entry, None)
         return self._cache
 
     @property
@@ -76,6 +119,14 @@ class KankaClient:
     def campaign_base_url(self):
         return self._campaign_base_url
 
+    @property
+    def _session(self) -> requests.Session:
+        """One session per thread, so concurrent requests can reuse connections"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
     def view_campaigns(self):
         return requests.get("https://kanka.io/api/1.0/campaigns/", headers=self._headers).json()
 
@@ -106,7 +157,10 @@ class KankaClient:
 
     @tenacity.retry(retry=tenacity.retry_if_exception_type(ApiThrottlingError), wait=tenacity.wait_fixed(5))
     def _request(self, method, url, **kwargs):
-        response = requests.request(method=method, url=url, headers=self._headers, **kwargs)
+        if self._rate_limiter:
+            self._rate_limiter.wait()
+
+        response = self._session.request(method=method, url=url, headers=self._headers, **kwargs)
 
         if self._on_request:
             self._on_request(method=method, url=url, response=response, **kwargs)
@@ -115,36 +169,142 @@ class KankaClient:
             print("API request limit reached. Retrying in 5 seconds.")
             raise ApiThrottlingError()
 
+        if method != "get" and response.ok and self._write_listeners:
+            self._notify_write(pykanka.events.WriteEvent.from_response(self, method, url, kwargs, response))
+
         return response
 
+    def add_write_listener(self, listener: Callable[["pykanka.events.WriteEvent"], None]):
+        """Calls listener with a WriteEvent after every successful write made through this client, batched or not"""
+        self._write_listeners.append(listener)
+
+    def remove_write_listener(self, listener: Callable[["pykanka.events.WriteEvent"], None]):
+        if listener in self._write_listeners:
+            self._write_listeners.remove(listener)
+
+    def _notify_write(self, event: "pykanka.events.WriteEvent"):
+        for listener in list(self._write_listeners):
+            try:
+                listener(event)
+            except Exception as e:          # the write itself went through, don't report it as failed
+                warnings.warn(f"write listener {listener!r} failed: {e!r}")
+
     def request_get(self, url: str, refresh=False, **kwargs):
         """get request with proper headers. usually shouldn't be accessed directly."""
         if not refresh and self._cache_duration:
-            if url in self.cache:
-                return self._cache[url][0]  # return the reponse portion of the cache
+            cached = self.cache.get(url)
+            if cached:
+                return cached[0]  # return the reponse portion of the cache
 
         response = self._request("get", url, **kwargs)
 
         if self._cache_duration:
-            self._cache[url] = (response, time)
+            self._cache[url] = (response, time.time())
 
         return response
 
     def request_post(self, url: str, **kwargs):
         """post request with proper headers. usually shouldn't be accessed directly."""
-        return self._request("post", url, **kwargs)
+        return self._write("post", url, **kwargs)
 
     def request_put(self, url: str, **kwargs):
         """put request with proper headers. usually shouldn't be accessed directly."""
-        return self._request("put", url, **kwargs)
+        return self._write("put", url, **kwargs)
 
     def request_patch(self, url: str, **kwargs):
         """patch request with proper headers. usually shouldn't be accessed directly."""
-        return self._request("patch", url, **kwargs)
+        return self._write("patch", url, **kwargs)
 
     def request_delete(self, url: str, **kwargs):
         """delete request with proper headers. usually shouldn't be accessed directly."""
-        return self._request("delete", url, **kwargs)
+        return self._write("delete", url, **kwargs)
+
+    def _write(self, method: str, url: str, **kwargs):
+        if self._batch:
+            return self._batch.queue(method, url, **kwargs)
+        return self._request(method, url, **kwargs)
+
+    def batch(self, max_workers: int = 8, raise_on_error: bool = False,
+              journal: Union["pykanka.journal.WriteJournal", str] = None) -> "pykanka.batch.Batch":
+        """
+        Returns a context manager that queues all writes made through this client and sends them concurrently on exit.
+        Patches to the same url are merged into one request. See pykanka.batch.Batch for details.
+
+        :param max_workers: Maximum number of requests in flight at once
+        :param raise_on_error: Raise a BatchError after the flush if any operation failed
+        :param journal: WriteJournal or path of a journal file. Writes the journal shows as done are skipped, so an
+                        interrupted run can be repeated without creating duplicates.
+        :return: Batch
+        """
+        if type(journal) == str:
+            journal = pykanka.journal.WriteJournal(journal)
+        return pykanka.batch.Batch(self, max_workers=max_workers, raise_on_error=raise_on_error, journal=journal)
+
+    def _begin_batch(self, batch: "pykanka.batch.Batch"):
+        if self._batch:
+            raise BatchError("a batch is already active on this client")
+        self._batch = batch
+
+    def _end_batch(self, batch: "pykanka.batch.Batch"):
+        if self._batch is batch:
+            self._batch = None
+
+    def export(self, path: str, types: Iterable[str] = None, subentries: Union[bool, Iterable[str]] = False, compression: str = None,
+               max_workers: int = 4, on_progress: Callable[["pykanka.exporter.ExportProgress"], None] = None,
+               format: str = "ndjson") -> "pykanka.exporter.ExportProgress":
+        """
+        Streams every entity of this campaign, including child data and optionally subentries, to an NDJSON file.
+        Pages are fetched concurrently and written as they arrive, so memory use doesn't depend on the campaign's size.
+
+        :param path: Output file, or directory for "parquet" and "arrow". Compressed if it ends in .gz, .bz2 or .xz, or if compression is given.
+        :param types: Type names to export, e.g. ["character", "location"]. All types if None.
+        :param subentries: True for all subentries, or a list of endpoints such as ["attributes", "relations", "map_markers"]
+        :param compression: "gzip", "bz2", "xz" or None
+        :param max_workers: Maximum number of requests in flight at once
+        :param on_progress: Called with an ExportProgress (entities, bytes written, throughput) after every page
+        :param format: "ndjson", "snapshot" for a memory-mapped file with random access (see pykanka.snapshot), or
+                       "parquet" or "arrow" for one typed table per type and subentry endpoint (see pykanka.columnar)
+        :return: ExportProgress with the final totals
+        """
+        return pykanka.exporter.export(self, path, types=types, subentries=subentries, compression=compression,
+                                       max_workers=max_workers, on_progress=on_progress, format=format)
+
+    def import_ndjson(self, source: Union[str, IO], max_workers: int = 8, max_pending: int = 64,
+                      journal: Union["pykanka.journal.WriteJournal", str] = None) -> "pykanka.importer.ImportResult":
+        """
+        Streams records from an NDJSON file into this campaign. See pykanka.importer for the record format.
+
+        :param source: File path or open file object, compressed files are recognised by their extension
+        :param max_workers: Maximum number of records posted at once
+        :param max_pending: Maximum number of records read ahead of the ones already created
+        :param journal: WriteJournal or path of a journal file, to make the import resumable
+        :return: ImportResult
+        """
+        return pykanka.importer.import_ndjson(self, source, max_workers=max_workers, max_pending=max_pending, journal=journal)
+
+    def copy_to(self, target: "KankaClient", types: Iterable[str] = None, subentries: Union[bool, Iterable[str]] = True,
+                max_workers: int = 8) -> "pykanka.transfer.CopyResult":
+        """
+        Copies entities of this campaign into another one, translating every reference to the new ids.
+        See pykanka.transfer for details.
+
+        :param target: KankaClient of the campaign to copy into
+        :param types: Type names to copy, e.g. ["character", "location"]. All types if None.
+        :param subentries: True for all subentries, or a list of endpoints such as ["attributes", "relations", "map_markers"]
+        :param max_workers: Maximum number of requests in flight at once
+        :return: CopyResult mapping source ids to target ids
+        """
+        return pykanka.transfer.copy_campaign(self, target, types=types, subentries=subentries, max_workers=max_workers)
+
+    def query(self, type_name: str) -> "pykanka.query.Query":
+        """
+        Starts a lazy query over one type, e.g. client.query("character").where(is_dead=False).order_by("name").limit(50).
+        See pykanka.query.Query.
+
+        :param type_name: Key of the type dictionary, e.g. "character" or "entity"
+        :return: Query
+        """
+        return pykanka.query.Query(self, type_name)
 
     def search(self, name: str, refresh: bool = True):
         url = f"{self.campaign_base_url}search/{name}"
@@ -152,6 +312,30 @@ class KankaClient:
         for entry in response.json()["data"]:
             yield self.get_entity(entity_id=entry["entity_id"], refresh=refresh)
 
+    def search_results(self, name: str, refresh: bool = False) -> "pykanka.pagination.Listing":
+        """
+        Searches the campaign without fetching the entities found, unlike search(). Results are built from the search
+        response alone and stream in page by page; use hydrate() to turn the ones you need into Entity objects.
+
+        :param name: Search term
+        :param refresh: Ignore cached responses
+        :return: Listing of pykanka.search.SearchResult
+        """
+        url = f"{self.campaign_base_url}search/{name}"
+        return pykanka.pagination.Listing(self, url, build=pykanka.search.SearchResult.from_json, refresh=refresh)
+
+    def hydrate(self, results: Iterable["pykanka.search.SearchResult"], max_workers: int = 8,
+                refresh: bool = False) -> List[pykanka.entities.Entity]:
+        """
+        Fetches the entities of search results concurrently, reusing cached responses.
+
+        :param results: SearchResults, e.g. from search_results()
+        :param max_workers: Maximum number of requests in flight at once
+        :param refresh: Ignore cached responses
+        :return: list of Entity objects, in the order of results
+        """
+        return pykanka.search.hydrate(self, results, max_workers=max_workers, refresh=refresh)
+
     def get_entity_of_type(self, type_name: str, type_specific_id: int = None, refresh: bool = False) -> Any:
         if type_specific_id:
             return self._type_dictionary[type_name].from_id(self, type_specific_id, refresh=refresh)
@@ -167,18 +351,55 @@ class KankaClient:
         data.pop("to")
         return data
 
-    def get_all_of_type(self, type_name: str, refresh: bool = True):
+    def get_all_of_type(self, type_name: str, refresh: bool = True, since: Union[datetime, str] = None,
+                        cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                        **filters) -> "pykanka.pagination.Listing":
+        """
+        Iterates over every object of a type, one page at a time. Failing pages are retried.
+
+            client.get_all_of_type("character", is_dead=False, location_id=12, exclude=pykanka.filters.HEAVY_FIELDS)
+
+        :param type_name: Key of the type dictionary, e.g. "character" or "entity"
+        :param refresh: Ignore cached pages
+        :param since: Only return objects updated at or after this time, using the API's lastSync parameter
+        :param cursor: Cursor taken from an earlier Listing of this type, to resume an interrupted walk
+        :param exclude: Fields to drop from every entry before the object is built, e.g. ["entry", "entry_parsed"]
+        :param filters: field=value pairs the objects have to match. Filters the API supports are sent as query
+                        parameters, the rest are checked while streaming. See pykanka.filters.
+        :return: Listing, whose cursor attribute can be saved at any point
+        """
         url = self.get_entity_of_type(type_name=type_name).base_url
         cls = self.get_entity_of_type(type_name=type_name).__class__
 
-        while url:
-            data = self.request_get(url, refresh=refresh).json()
+        if since:
+            url = pykanka.bulk.with_params(url, lastSync=pykanka.sync.format_last_sync(since))
+
+        params, _ = pykanka.filters.split_filters(cls, filters)
+        if params:
+            url = pykanka.bulk.with_params(url, **params)
 
-            url = data["links"]["next"]
+        if exclude:
+            exclude = frozenset(exclude)
+            build = lambda entry: cls.from_json(self, pykanka.filters.project(entry, exclude))
+        else:
+            build = lambda entry: cls.from_json(self, entry)
 
-            for entry in data["data"]:
-                entity = cls.from_json(self, entry)
-                yield entity
+        return pykanka.pagination.Listing(self, url, build=build, refresh=refresh, cursor=cursor,
+                                          where=pykanka.filters.make_predicate(filters))
+
+    def sync(self, state: "pykanka.sync.SyncState" = None, types: Iterable[str] = None, max_workers: int = 4) -> "pykanka.sync.SyncResult":
+        """
+        Fetches everything that changed since the last sync. The first call fetches the whole campaign.
+        Deleted entities are reported separately in the result's deleted attribute.
+
+        :param state: SyncState to continue from, e.g. one restored with SyncState.from_json(). Defaults to this client's sync_state.
+        :param types: Type names to report changes for, all types if None
+        :param max_workers: Maximum number of requests in flight at once
+        :return: SyncResult
+        """
+        if state is not None:
+            self.sync_state = state
+        return pykanka.sync.sync(self, state=self.sync_state, types=types, max_workers=max_workers)
 
     def get_entity(self, entity_id: int = None, refresh: bool = False) -> pykanka.entities.Entity:
         return self.get_entity_of_type(type_name="entity", type_specific_id=entity_id, refresh=refresh)
@@ -228,50 +449,82 @@ class KankaClient:
     def get_timeline(self, timeline_id: int = None, refresh: bool = False) -> pykanka.child_types.Timeline:
         return self.get_entity_of_type(type_name="timeline", type_specific_id=timeline_id, refresh=refresh)
 
-    def all_entities(self, refresh: bool = False) -> Generator[pykanka.entities.Entity, None, None]:
-        return self.get_all_of_type(type_name="entity", refresh=refresh)
-
-    def all_abilities(self, refresh: bool = False) -> Generator[pykanka.child_types.Ability, None, None]:
-        return self.get_all_of_type(type_name="ability", refresh=refresh)
-
-    def all_calendars(self, refresh: bool = False) -> Generator[pykanka.child_types.Calendar, None, None]:
-        return self.get_all_of_type(type_name="calendar", refresh=refresh)
-
-    def all_characters(self, refresh: bool = False) -> Generator[pykanka.child_types.Character, None, None]:
-        return self.get_all_of_type(type_name="character", refresh=refresh)
-
-    def all_events(self, refresh: bool = False) -> Generator[pykanka.child_types.Event, None, None]:
-        return self.get_all_of_type(type_name="event", refresh=refresh)
-
-    def all_families(self, refresh: bool = False) -> Generator[pykanka.child_types.Family, None, None]:
-        return self.get_all_of_type(type_name="family", refresh=refresh)
-
-    def all_items(self, refresh: bool = False) -> Generator[pykanka.child_types.Item, None, None]:
-        return self.get_all_of_type(type_name="item", refresh=refresh)
-
-    def all_journals(self, refresh: bool = False) -> Generator[pykanka.child_types.Journal, None, None]:
-        return self.get_all_of_type(type_name="journal", refresh=refresh)
-
-    def all_locations(self, refresh: bool = False) -> Generator[pykanka.child_types.Location, None, None]:
-        return self.get_all_of_type(type_name="location", refresh=refresh)
-
-    def all_maps(self, refresh: bool = False) -> Generator[pykanka.child_types.Map, None, None]:
-        return self.get_all_of_type(type_name="map", refresh=refresh)
-
-    def all_notes(self, refresh: bool = False) -> Generator[pykanka.child_types.Note, None, None]:
-        return self.get_all_of_type(type_name="note", refresh=refresh)
-
-    def all_organisations(self, refresh: bool = False) -> Generator[pykanka.child_types.Organisation, None, None]:
-        return self.get_all_of_type(type_name="organisation", refresh=refresh)
-
-    def all_quests(self, refresh: bool = False) -> Generator[pykanka.child_types.Quest, None, None]:
-        return self.get_all_of_type(type_name="quest", refresh=refresh)
-
-    def all_races(self, refresh: bool = False) -> Generator[pykanka.child_types.Race, None, None]:
-        return self.get_all_of_type(type_name="race", refresh=refresh)
-
-    def all_tags(self, refresh: bool = False) -> Generator[pykanka.child_types.Tag, None, None]:
-        return self.get_all_of_type(type_name="tag", refresh=refresh)
-
-    def all_timelines(self, refresh: bool = False) -> Generator[pykanka.child_types.Timeline, None, None]:
-        return self.get_all_of_type(type_name="timeline", refresh=refresh)
+    def all_entities(self, refresh: bool = False, since: Union[datetime, str] = None,
+                     cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                     **filters) -> Generator[pykanka.entities.Entity, None, None]:
+        return self.get_all_of_type(type_name="entity", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_abilities(self, refresh: bool = False, since: Union[datetime, str] = None,
+                      cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                      **filters) -> Generator[pykanka.child_types.Ability, None, None]:
+        return self.get_all_of_type(type_name="ability", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_calendars(self, refresh: bool = False, since: Union[datetime, str] = None,
+                      cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                      **filters) -> Generator[pykanka.child_types.Calendar, None, None]:
+        return self.get_all_of_type(type_name="calendar", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_characters(self, refresh: bool = False, since: Union[datetime, str] = None,
+                       cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                       **filters) -> Generator[pykanka.child_types.Character, None, None]:
+        return self.get_all_of_type(type_name="character", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_events(self, refresh: bool = False, since: Union[datetime, str] = None,
+                   cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                   **filters) -> Generator[pykanka.child_types.Event, None, None]:
+        return self.get_all_of_type(type_name="event", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_families(self, refresh: bool = False, since: Union[datetime, str] = None,
+                     cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                     **filters) -> Generator[pykanka.child_types.Family, None, None]:
+        return self.get_all_of_type(type_name="family", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_items(self, refresh: bool = False, since: Union[datetime, str] = None,
+                  cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                  **filters) -> Generator[pykanka.child_types.Item, None, None]:
+        return self.get_all_of_type(type_name="item", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_journals(self, refresh: bool = False, since: Union[datetime, str] = None,
+                     cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                     **filters) -> Generator[pykanka.child_types.Journal, None, None]:
+        return self.get_all_of_type(type_name="journal", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_locations(self, refresh: bool = False, since: Union[datetime, str] = None,
+                      cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                      **filters) -> Generator[pykanka.child_types.Location, None, None]:
+        return self.get_all_of_type(type_name="location", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_maps(self, refresh: bool = False, since: Union[datetime, str] = None,
+                 cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                 **filters) -> Generator[pykanka.child_types.Map, None, None]:
+        return self.get_all_of_type(type_name="map", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_notes(self, refresh: bool = False, since: Union[datetime, str] = None,
+                  cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                  **filters) -> Generator[pykanka.child_types.Note, None, None]:
+        return self.get_all_of_type(type_name="note", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_organisations(self, refresh: bool = False, since: Union[datetime, str] = None,
+                          cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                          **filters) -> Generator[pykanka.child_types.Organisation, None, None]:
+        return self.get_all_of_type(type_name="organisation", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_quests(self, refresh: bool = False, since: Union[datetime, str] = None,
+                   cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                   **filters) -> Generator[pykanka.child_types.Quest, None, None]:
+        return self.get_all_of_type(type_name="quest", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_races(self, refresh: bool = False, since: Union[datetime, str] = None,
+                  cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                  **filters) -> Generator[pykanka.child_types.Race, None, None]:
+        return self.get_all_of_type(type_name="race", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_tags(self, refresh: bool = False, since: Union[datetime, str] = None,
+                 cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                 **filters) -> Generator[pykanka.child_types.Tag, None, None]:
+        return self.get_all_of_type(type_name="tag", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
+
+    def all_timelines(self, refresh: bool = False, since: Union[datetime, str] = None,
+                      cursor: "pykanka.pagination.Cursor" = None, exclude: Iterable[str] = None,
+                      **filters) -> Generator[pykanka.child_types.Timeline, None, None]:
+        return self.get_all_of_type(type_name="timeline", refresh=refresh, since=since, cursor=cursor, exclude=exclude, **filters)
@@ -0,0 +1,210 @@
+"""
+Organisation and family membership in both directions.
+
+OrganisationData.members and FamilyData.members list the characters of a group. MembershipIndex reads them once from
+the organisation and family listings and keeps the reverse direction as well, so both "who is in this organisation"
+and "which organisations and families is this character in" are dict lookups. The groups' own Hierarchy objects
+resolve nesting: with nested=True, members of sub-organisations count as members of the organisations above them.
+
+    memberships = MembershipIndex.from_client(client)
+    memberships.organisations_of(character_id, nested=True)
+    memberships.members("organisation", guild_id, nested=True)
+    memberships.sync(client)
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+import pykanka.bulk
+import pykanka.child_types
+import pykanka.sync
+from pykanka.exceptions import *
+from pykanka.hierarchy import Hierarchy
+
+GROUP_TYPES = ("organisation", "family")
+
+Group = Tuple[str, int]     # (type name, child id), e.g. ("organisation", 4)
+
+
+class MembershipIndex:
+    def __init__(self):
+        self.hierarchies: Dict[str, Hierarchy] = {type_name: Hierarchy(type_name) for type_name in GROUP_TYPES}
+
+        self._members: Dict[Group, Set[int]] = dict()              # group -> character ids
+        self._groups_of: Dict[int, Set[Group]] = dict()            # character id -> groups
+        self._nested_members: Dict[Group, Set[int]] = dict()       # cached, cleared on every change
+        self._lock = threading.RLock()
+        self.synced_at: Optional[datetime] = None
+
+    # --- loading ---
+
+    @classmethod
+    def from_children(cls, organisations: Iterable[Dict[str, Any]] = (), families: Iterable[Dict[str, Any]] = ()) -> "MembershipIndex":
+        """Builds the index from organisation and family payloads as returned by their listings"""
+        index = cls()
+        for type_name, children in (("organisation", organisations), ("family", families)):
+            for child in children:
+                index._apply(type_name, child)
+        return index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "MembershipIndex":
+        """Builds the index from export records. Records of other types are skipped."""
+        index = cls()
+        for record in records:
+            if record.get("type") in GROUP_TYPES:
+                index._apply(record["type"], dict(record.get("child") or dict(), id=record["child_id"], entity_id=record["id"]))
+        return index
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", max_workers: int = 4) -> "MembershipIndex":
+        """Loads every organisation and family from their listings, fetching pages concurrently"""
+        index = cls()
+        index.sync(client, max_workers=max_workers)
+        return index
+
+    def sync(self, client: "pykanka.KankaClient", max_workers: int = 4) -> int:
+        """
+        Fetches the organisations and families changed since the last load or sync with lastSync and replaces their
+        members and parents. Deleted groups aren't reported by the listings, attach() the index to the client to
+        follow deletions made through it.
+
+        :return: number of changed groups
+        """
+        synced_at = datetime.now(timezone.utc)
+        changed = 0
+        for type_name in GROUP_TYPES:
+            url = f"{client.campaign_base_url}{pykanka.child_types.child_type_dictionary[type_name].endpoint}"
+            if self.synced_at:
+                url = pykanka.bulk.with_params(url, lastSync=pykanka.sync.format_last_sync(self.synced_at))
+            for child in pykanka.bulk.iter_listing(client, url, max_workers=max_workers):
+                self._apply(type_name, child)
+                changed += 1
+        self.synced_at = synced_at
+        return changed
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the index current with organisation and family writes made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.type_name is None:
+            if event.method == "delete" and event.path[:1] == ["entities"] and len(event.path) == 2:
+                entity_id = int(event.path[1])
+                for type_name, hierarchy in self.hierarchies.items():
+                    child_id = hierarchy.child_id(entity_id)
+                    if child_id is not None:
+                        self.remove_group(type_name, child_id)
+            return
+
+        if event.type_name not in GROUP_TYPES:
+            return
+        if event.method == "delete":
+            if event.child_id is not None:
+                self.remove_group(event.type_name, event.child_id)
+        elif event.data and event.data.get("id") is not None:
+            self._apply(event.type_name, event.data)
+
+    # --- updates ---
+
+    def set_members(self, type_name: str, group_id: int, character_ids: Iterable[int]):
+        """Replaces the members of an organisation or family"""
+        if type_name not in GROUP_TYPES:
+            raise WrongParametersPassedToEntity(f"{type_name} has no members, groups are {', '.join(GROUP_TYPES)}")
+
+        group = (type_name, group_id)
+        with self._lock:
+            new_members, old_members = set(character_ids), self._members.get(group, set())
+            for character_id in old_members - new_members:
+                self._leave(character_id, group)
+            for character_id in new_members - old_members:
+                self._groups_of.setdefault(character_id, set()).add(group)
+            self._members[group] = new_members
+            self._nested_members.clear()
+
+    def remove_group(self, type_name: str, group_id: int):
+        group = (type_name, group_id)
+        with self._lock:
+            for character_id in self._members.pop(group, ()):
+                self._leave(character_id, group)
+            self.hierarchies[type_name].remove(group_id)
+            self._nested_members.clear()
+
+    def _apply(self, type_name: str, child: Dict[str, Any]):
+        hierarchy = self.hierarchies[type_name]
+        with self._lock:
+            if hierarchy.parent_key in child or child["id"] not in hierarchy:
+                hierarchy.set_parent(child["id"], child.get(hierarchy.parent_key), entity_id=child.get("entity_id"))
+            if "members" in child:
+                self.set_members(type_name, child["id"], child["members"] or ())
+            self._nested_members.clear()
+
+    def _leave(self, character_id: int, group: Group):
+        groups = self._groups_of.get(character_id)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._groups_of[character_id]
+
+    # --- queries ---
+
+    def members(self, type_name: str, group_id: int, nested: bool = False) -> Set[int]:
+        """
+        Character ids of the members of an organisation or family.
+
+        :param type_name: "organisation" or "family"
+        :param group_id: Child id of the organisation or family
+        :param nested: Include the members of every group nested below it
+        """
+        group = (type_name, group_id)
+        with self._lock:
+            if not nested:
+                return set(self._members.get(group, ()))
+
+            members = self._nested_members.get(group)
+            if members is None:
+                members = set(self._members.get(group, ()))
+                for descendant in self.hierarchies[type_name].descendants(group_id):
+                    members |= self._members.get((type_name, descendant), set())
+                self._nested_members[group] = members
+            return set(members)
+
+    def groups_of(self, character_id: int, type_name: str = None, nested: bool = False) -> Set[Group]:
+        """
+        Organisations and families a character is a member of, as (type name, child id) pairs.
+
+        :param character_id: Child id of the character
+        :param type_name: Only return groups of this type
+        :param nested: Also return every group above the ones the character is a direct member of
+        """
+        with self._lock:
+            groups = {group for group in self._groups_of.get(character_id, ()) if type_name is None or group[0] == type_name}
+            if nested:
+                for group_type, group_id in list(groups):
+                    groups.update((group_type, ancestor) for ancestor in self.hierarchies[group_type].ancestors(group_id))
+            return groups
+
+    def organisations_of(self, character_id: int, nested: bool = False) -> Set[int]:
+        return {group_id for _, group_id in self.groups_of(character_id, "organisation", nested=nested)}
+
+    def families_of(self, character_id: int, nested: bool = False) -> Set[int]:
+        return {group_id for _, group_id in self.groups_of(character_id, "family", nested=nested)}
+
+    def is_member(self, character_id: int, type_name: str, group_id: int, nested: bool = False) -> bool:
+        """Whether a character is in a group, with nested=True also through a group nested below it"""
+        with self._lock:
+            groups = self._groups_of.get(character_id, ())
+            if (type_name, group_id) in groups:
+                return True
+            if not nested:
+                return False
+            hierarchy = self.hierarchies[type_name]
+            return any(group_type == type_name and hierarchy.is_inside(member_of, group_id) for group_type, member_of in groups)
+
+    def characters(self) -> List[int]:
+        """Character ids that are a member of at least one group"""
+        return list(self._groups_of)
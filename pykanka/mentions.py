@@ -0,0 +1,241 @@
+"""
+Backlinks between entities.
+
+Entries reference other entities with mentions such as [character:12] or [location:7|the old mill] in entry, which
+the API renders as links in entry_parsed. MentionIndex scans the entries and entity notes of export records one at a
+time, so an export of any size can be streamed through it, and keeps the mentions in both directions. Re-reading an
+export later only re-parses entities whose updated_at (or whose notes' updated_at) changed.
+
+    mentions = MentionIndex.from_export("campaign.ndjson.gz")
+    mentions.referenced_by(entity_id)
+    mentions.refresh_from_export("campaign.ndjson.gz")
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Union, IO, Tuple, Iterator
+
+import pykanka.child_types
+import pykanka.exporter
+import pykanka.ndjson
+import pykanka.sync
+
+_endpoint_types = {cls.endpoint: type_name for type_name, cls in pykanka.child_types.child_type_dictionary.items()}
+
+_raw_mention = re.compile(r"\[(entity|" + "|".join(pykanka.child_types.child_type_dictionary) + r"):(\d+)(?:\|[^\]]*)?\]")
+_link = re.compile(r"href=[\"'][^\"']*/(?:campaign|w)/\d+/(entities|" + "|".join(_endpoint_types) + r")/(\d+)[^\"']*[\"']")
+
+Target = Union[int, Tuple[str, int]]    # entity id, or (type name, child id) for links to a child page
+
+
+@dataclass(frozen=True)
+class Mention:
+    source_id:  int                     # entity id of the mentioning entity
+    target:     Target
+    field:      str                     # "entry" or "entity_notes"
+    note_id:    Optional[int] = None    # id of the EntityNote for mentions in notes
+
+
+def parse_mentions(text: Optional[str]) -> Iterator[Target]:
+    """
+    Targets mentioned in an entry, in order. Raw mentions ([type:id]) name the entity id. Links in entry_parsed name
+    either the entity or the child page, the latter are returned as (type name, child id).
+    """
+    if not text:
+        return
+    if "[" in text:
+        for match in _raw_mention.finditer(text):
+            yield int(match.group(2))
+    if "href" not in text:
+        return
+    for match in _link.finditer(text):
+        if match.group(1) == "entities":
+            yield int(match.group(2))
+        else:
+            yield _endpoint_types[match.group(1)], int(match.group(2))
+
+
+def _record_mentions(record: Dict[str, Any], notes: List[Dict[str, Any]]) -> List[Mention]:
+    source_id = record["id"]
+    child = record.get("child") or dict()
+    mentions = dict()                   # mentions by (target, field, note id), in order of appearance
+
+    for text in (child.get("entry"), child.get("entry_parsed")):
+        for target in parse_mentions(text):
+            mention = Mention(source_id=source_id, target=target, field="entry")
+            mentions.setdefault(mention, None)
+    for note in notes:
+        for text in (note.get("entry"), note.get("entry_parsed")):
+            for target in parse_mentions(text):
+                mention = Mention(source_id=source_id, target=target, field="entity_notes", note_id=note.get("id"))
+                mentions.setdefault(mention, None)
+
+    return [mention for mention in mentions if mention.target != source_id]
+
+
+def _version(record: Dict[str, Any], notes: List[Dict[str, Any]]) -> Tuple:
+    """What has to change for an entity's mentions to be re-parsed"""
+    def timestamp(value):
+        parsed = pykanka.sync.parse_timestamp(value)
+        return parsed.timestamp() if parsed else None
+
+    return (timestamp(record.get("updated_at")),) + tuple(sorted((note.get("id"), timestamp(note.get("updated_at"))) for note in notes))
+
+
+@dataclass
+class _Source:
+    name:       Optional[str]
+    type:       Optional[str]
+    child_id:   Optional[int]
+    version:    Tuple
+    notes:      List[Dict[str, Any]]    # kept so that records without subentries don't lose the note mentions
+    mentions:   List[Mention]
+
+
+class MentionIndex:
+    def __init__(self):
+        self._sources: Dict[int, _Source] = dict()                      # entity id -> what it mentions
+        self._incoming: Dict[Target, Dict[int, List[Mention]]] = dict() # target -> source entity id -> mentions
+        self._by_child: Dict[Tuple[str, int], int] = dict()             # (type, child id) -> entity id
+        self._lock = threading.RLock()
+
+    # --- loading ---
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "MentionIndex":
+        index = cls()
+        index.refresh(records)
+        return index
+
+    @classmethod
+    def from_export(cls, source: Union[str, IO]) -> "MentionIndex":
+        """Builds the index from an NDJSON export, see KankaClient.export(). Export with subentries=["entity_notes"] to include notes."""
+        return cls.from_records(record for _, record in pykanka.ndjson.iter_records(source))
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    # --- updates ---
+
+    def refresh(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Adds or updates entities from export records, re-parsing only the ones that changed since they were last seen.
+
+        :return: number of entities parsed
+        """
+        parsed = 0
+        for record in records:
+            parsed += self.update(record)
+        return parsed
+
+    def refresh_from_export(self, source: Union[str, IO], remove_missing: bool = False) -> int:
+        """
+        Applies a newer export of the same campaign, see refresh().
+
+        :param source: NDJSON export
+        :param remove_missing: Also remove entities that are no longer in the export
+        :return: number of entities parsed
+        """
+        seen = set()
+
+        def records():
+            for _, record in pykanka.ndjson.iter_records(source):
+                seen.add(record["id"])
+                yield record
+
+        parsed = self.refresh(records())
+        if remove_missing:
+            for entity_id in set(self._sources) - seen:
+                self.remove(entity_id)
+        return parsed
+
+    def update(self, record: Dict[str, Any]) -> bool:
+        """Adds or updates one entity from an export record. Returns False if it was unchanged and not parsed again."""
+        with self._lock:
+            previous = self._sources.get(record["id"])
+            subentries = record.get("subentries")
+            if subentries is not None and "entity_notes" in subentries:
+                notes = subentries["entity_notes"]
+            else:
+                notes = previous.notes if previous else []
+
+            version = _version(record, notes)
+            if previous is not None and previous.version == version:
+                return False
+
+            self._remove(record["id"])
+            source = _Source(name=record.get("name"), type=record.get("type"), child_id=record.get("child_id"),
+                             version=version, notes=notes, mentions=_record_mentions(record, notes))
+            self._sources[record["id"]] = source
+            if source.type and source.child_id is not None:
+                self._by_child[(source.type, source.child_id)] = record["id"]
+            for mention in source.mentions:
+                self._incoming.setdefault(mention.target, dict()).setdefault(record["id"], []).append(mention)
+            return True
+
+    def remove(self, entity_id: int):
+        with self._lock:
+            self._remove(entity_id)
+
+    def _remove(self, entity_id: int):
+        source = self._sources.pop(entity_id, None)
+        if source is None:
+            return
+        if source.type and source.child_id is not None:
+            self._by_child.pop((source.type, source.child_id), None)
+        for target in {mention.target for mention in source.mentions}:
+            incoming = self._incoming.get(target)
+            if incoming is not None:
+                incoming.pop(entity_id, None)
+                if not incoming:
+                    del self._incoming[target]
+
+    def apply_sync(self, result: "pykanka.sync.SyncResult"):
+        """Applies the changes of a KankaClient.sync() result. Note mentions are kept as they were."""
+        for type_name, children in result.changed.items():
+            for child in children:
+                self.update(pykanka.exporter.entity_record(type_name, child.data.__dict__))
+        for entity_ids in result.deleted.values():
+            for entity_id in entity_ids:
+                self.remove(entity_id)
+
+    # --- queries ---
+
+    def mentions_in(self, entity_id: int) -> List[Mention]:
+        """Everything an entity mentions, in its entry and notes"""
+        source = self._sources.get(entity_id)
+        return list(source.mentions) if source else []
+
+    def backlinks(self, entity_id: int) -> List[Mention]:
+        """Every mention of an entity, whether by entity id or by a link to its child page"""
+        with self._lock:
+            keys = [entity_id]
+            source = self._sources.get(entity_id)
+            if source and source.type and source.child_id is not None:
+                keys.append((source.type, source.child_id))
+
+            mentions = list()
+            for key in keys:
+                for source_mentions in self._incoming.get(key, dict()).values():
+                    mentions.extend(mention for mention in source_mentions if mention.source_id != entity_id)
+            return mentions
+
+    def referenced_by(self, entity_id: int) -> List[int]:
+        """Entity ids of the entities mentioning entity_id, sorted by name, e.g. for a "referenced by" section"""
+        with self._lock:
+            source_ids = {mention.source_id for mention in self.backlinks(entity_id)}
+            return sorted(source_ids, key=lambda source_id: ((self._sources[source_id].name or "").casefold(), source_id))
+
+    def resolve(self, target: Target) -> Optional[int]:
+        """Entity id of a mention target, None if it links to a child that isn't in the index"""
+        if isinstance(target, tuple):
+            return self._by_child.get(target)
+        return target
+
+    def dangling(self) -> List[Mention]:
+        """Mentions of entities that aren't in the index, e.g. deleted ones or ones left out of the export"""
+        with self._lock:
+            return [mention for target, incoming in self._incoming.items()
+                    if self.resolve(target) not in self._sources
+                    for mentions in incoming.values() for mention in mentions]
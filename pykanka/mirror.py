@@ -0,0 +1,334 @@
+"""
+Local SQLite copy of a campaign for reads that don't need the network.
+
+A mirror is filled from an export file (see pykanka.exporter) and kept current with incremental syncs.
+Entities are stored as export records and turned back into the usual Entity, child and subentry objects on read.
+"""
+
+import json
+import sqlite3
+import threading
+from dataclasses import fields
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Iterator, Union, IO, Dict, Any
+
+import pykanka.child_types
+import pykanka.entity_subentries
+import pykanka.exporter
+import pykanka.ndjson
+import pykanka.sync
+from pykanka.exceptions import *
+
+
+class CampaignMirror:
+    """
+    Local copy of a campaign, indexed by entity id, child id, type, name, parent and updated_at.
+
+        mirror = CampaignMirror(client, "campaign.sqlite")
+        mirror.load_export("campaign.ndjson.gz")
+        mirror.sync()
+        mirror.get_character(12)
+    """
+
+    _schema = """
+        CREATE TABLE IF NOT EXISTS entities (
+            id          INTEGER PRIMARY KEY,
+            child_id    INTEGER,
+            type        TEXT NOT NULL,
+            name        TEXT COLLATE NOCASE,
+            parent_id   INTEGER,
+            updated_at  TEXT,
+            record      TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS entities_child ON entities (type, child_id);
+        CREATE INDEX IF NOT EXISTS entities_name ON entities (name, type);
+        CREATE INDEX IF NOT EXISTS entities_parent ON entities (type, parent_id);
+        CREATE INDEX IF NOT EXISTS entities_updated ON entities (type, updated_at);
+
+        CREATE TABLE IF NOT EXISTS subentries (
+            endpoint    TEXT NOT NULL,
+            id          INTEGER NOT NULL,
+            entity_id   INTEGER NOT NULL,
+            record      TEXT NOT NULL,
+            PRIMARY KEY (endpoint, id)
+        );
+        CREATE INDEX IF NOT EXISTS subentries_entity ON subentries (entity_id, endpoint);
+
+        CREATE TABLE IF NOT EXISTS type_state (
+            type        TEXT PRIMARY KEY,
+            synced_at   TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key         TEXT PRIMARY KEY,
+            value       TEXT
+        );
+    """
+
+    def __init__(self, client: "pykanka.KankaClient", path: str = ":memory:"):
+        """
+        :param client: KankaClient of the mirrored campaign. Used for syncing and to build model objects.
+        :param path: SQLite file to store the mirror in. Kept in memory by default.
+        """
+        self.client = client
+        self.path = path
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(self._schema)
+        self._lock = threading.RLock()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # --- filling the mirror ---
+
+    def load_export(self, source: Union[str, IO], exported_at: datetime = None):
+        """
+        Replaces the mirror's contents with an export file.
+
+        :param source: Path or file object of an NDJSON export
+        :param exported_at: When the export was made, used for staleness. Defaults to now.
+        """
+        exported_at = exported_at or datetime.now(timezone.utc)
+        state = pykanka.sync.SyncState()
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entities")
+            self._connection.execute("DELETE FROM subentries")
+            self._connection.execute("DELETE FROM type_state")
+
+            types = set()
+            for _, record in pykanka.ndjson.iter_records(source):
+                self._store_record(record)
+                types.add(record["type"])
+                state.known.setdefault(record["type"], set()).add(record["id"])
+                state._advance(record["type"], pykanka.sync.parse_timestamp(record.get("updated_at")))
+
+            for type_name in types:
+                self._mark_synced(type_name, exported_at)
+            self._save_state(state)
+
+    def sync(self, types=None, max_workers: int = 4) -> "pykanka.sync.SyncResult":
+        """
+        Fetches changes since the last sync or loaded export and applies them. Subentries of changed entities are kept
+        as they were; load a fresh export to refresh those.
+
+        :param types: Type names to sync, all types if None
+        :param max_workers: Maximum number of requests in flight at once
+        :return: the SyncResult that was applied
+        """
+        result = self.client.sync(state=self._load_state(), types=types, max_workers=max_workers)
+        self.apply_sync(result)
+        return result
+
+    def apply_sync(self, result: "pykanka.sync.SyncResult"):
+        """Applies a SyncResult obtained from KankaClient.sync()"""
+        with self._lock, self._connection:
+            for type_name, children in result.changed.items():
+                for child in children:
+                    self._store_record(pykanka.exporter.entity_record(type_name, _asdict(child.data), self.client.campaign_id))
+
+            for entity_ids in result.deleted.values():
+                self.delete_entities(entity_ids)
+
+            for type_name, synced_at in result.state.synced_at.items():
+                self._mark_synced(type_name, synced_at)
+            self._save_state(result.state)
+
+    def store(self, record: Dict[str, Any]):
+        """Adds or replaces a single export record"""
+        with self._lock, self._connection:
+            self._store_record(record)
+
+    def delete_entities(self, entity_ids: List[int]):
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM entities WHERE id = ?", [(i,) for i in entity_ids])
+            self._connection.executemany("DELETE FROM subentries WHERE entity_id = ?", [(i,) for i in entity_ids])
+
+    # --- reading ---
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+
+    def get_record(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the raw export record of an entity, or None"""
+        return self._one("SELECT record FROM entities WHERE id = ?", (entity_id,))
+
+    def get_entity(self, entity_id: int) -> "pykanka.entities.Entity":
+        record = self.get_record(entity_id)
+        if record is None:
+            raise AccessingNonExistentError(f"entity {entity_id} is not in the mirror")
+        return pykanka.exporter.record_to_entity(self.client, record)
+
+    def get_child(self, type_name: str, child_id: int) -> "pykanka.child_types.GenericChildType":
+        record = self._one("SELECT record FROM entities WHERE type = ? AND child_id = ?", (type_name, child_id))
+        if record is None:
+            raise AccessingNonExistentError(f"{type_name} {child_id} is not in the mirror")
+        return pykanka.exporter.record_to_entity(self.client, record).child
+
+    def get_ability(self, ability_id: int) -> "pykanka.child_types.Ability":
+        return self.get_child("ability", ability_id)
+
+    def get_calendar(self, calendar_id: int) -> "pykanka.child_types.Calendar":
+        return self.get_child("calendar", calendar_id)
+
+    def get_character(self, character_id: int) -> "pykanka.child_types.Character":
+        return self.get_child("character", character_id)
+
+    def get_event(self, event_id: int) -> "pykanka.child_types.Event":
+        return self.get_child("event", event_id)
+
+    def get_family(self, family_id: int) -> "pykanka.child_types.Family":
+        return self.get_child("family", family_id)
+
+    def get_item(self, item_id: int) -> "pykanka.child_types.Item":
+        return self.get_child("item", item_id)
+
+    def get_journal(self, journal_id: int) -> "pykanka.child_types.Journal":
+        return self.get_child("journal", journal_id)
+
+    def get_location(self, location_id: int) -> "pykanka.child_types.Location":
+        return self.get_child("location", location_id)
+
+    def get_map(self, map_id: int) -> "pykanka.child_types.Map":
+        return self.get_child("map", map_id)
+
+    def get_note(self, note_id: int) -> "pykanka.child_types.Note":
+        return self.get_child("note", note_id)
+
+    def get_organisation(self, organisation_id: int) -> "pykanka.child_types.Organisation":
+        return self.get_child("organisation", organisation_id)
+
+    def get_quest(self, quest_id: int) -> "pykanka.child_types.Quest":
+        return self.get_child("quest", quest_id)
+
+    def get_race(self, race_id: int) -> "pykanka.child_types.Race":
+        return self.get_child("race", race_id)
+
+    def get_tag(self, tag_id: int) -> "pykanka.child_types.Tag":
+        return self.get_child("tag", tag_id)
+
+    def get_timeline(self, timeline_id: int) -> "pykanka.child_types.Timeline":
+        return self.get_child("timeline", timeline_id)
+
+    def iter_records(self, type_name: str = None) -> Iterator[Dict[str, Any]]:
+        """Yields raw export records, of one type or of all types"""
+        if type_name:
+            rows = self._all("SELECT record FROM entities WHERE type = ? ORDER BY id", (type_name,))
+        else:
+            rows = self._all("SELECT record FROM entities ORDER BY id", ())
+        for row in rows:
+            yield json.loads(row[0])
+
+    def all_of_type(self, type_name: str) -> Iterator["pykanka.child_types.GenericChildType"]:
+        for record in self.iter_records(type_name):
+            yield pykanka.exporter.record_to_entity(self.client, record).child
+
+    def find_by_name(self, name: str, type_name: str = None) -> List["pykanka.entities.Entity"]:
+        """Entities whose name matches exactly, ignoring case"""
+        if type_name:
+            rows = self._all("SELECT record FROM entities WHERE name = ? AND type = ?", (name, type_name))
+        else:
+            rows = self._all("SELECT record FROM entities WHERE name = ?", (name,))
+        return [pykanka.exporter.record_to_entity(self.client, json.loads(row[0])) for row in rows]
+
+    def children_of(self, type_name: str, child_id: int) -> List["pykanka.child_types.GenericChildType"]:
+        """Direct children of a nestable child, e.g. the locations whose parent_location_id is child_id"""
+        rows = self._all("SELECT record FROM entities WHERE type = ? AND parent_id = ?", (type_name, child_id))
+        return [pykanka.exporter.record_to_entity(self.client, json.loads(row[0])).child for row in rows]
+
+    def descendants_of(self, type_name: str, child_id: int) -> List["pykanka.child_types.GenericChildType"]:
+        """All children of a nestable child at any depth, e.g. every location inside a country"""
+        rows = self._all("""
+            WITH RECURSIVE subtree(child_id) AS (
+                SELECT child_id FROM entities WHERE type = :type AND parent_id = :root
+                UNION
+                SELECT e.child_id FROM entities e JOIN subtree s ON e.type = :type AND e.parent_id = s.child_id
+            )
+            SELECT e.record FROM entities e JOIN subtree s ON e.type = :type AND e.child_id = s.child_id
+        """, dict(type=type_name, root=child_id))
+        return [pykanka.exporter.record_to_entity(self.client, json.loads(row[0])).child for row in rows]
+
+    def subentries(self, entity_id: int, endpoint: str) -> List["pykanka.entity_subentries.GenericSubentry"]:
+        """
+        Subentries of an entity, as stored by an export with subentries.
+
+        :param entity_id: Entity id
+        :param endpoint: Key of subentry_type_dictionary, e.g. "attributes"
+        """
+        cls = pykanka.entity_subentries.subentry_type_dictionary[endpoint]
+        names = {f.name for f in fields(cls)}
+        rows = self._all("SELECT record FROM subentries WHERE entity_id = ? AND endpoint = ? ORDER BY id", (entity_id, endpoint))
+        return [cls(_client=self.client, **{k: v for k, v in json.loads(row[0]).items() if k in names}) for row in rows]
+
+    def updated_since(self, since: datetime, type_name: str = None) -> List["pykanka.entities.Entity"]:
+        since = pykanka.sync.format_last_sync(since)
+        if type_name:
+            rows = self._all("SELECT record FROM entities WHERE type = ? AND updated_at >= ?", (type_name, since))
+        else:
+            rows = self._all("SELECT record FROM entities WHERE updated_at >= ?", (since,))
+        return [pykanka.exporter.record_to_entity(self.client, json.loads(row[0])) for row in rows]
+
+    def synced_at(self, type_name: str) -> Optional[datetime]:
+        with self._lock:
+            row = self._connection.execute("SELECT synced_at FROM type_state WHERE type = ?", (type_name,)).fetchone()
+        return pykanka.sync.parse_timestamp(row[0]) if row else None
+
+    def staleness(self, type_name: str) -> Optional[timedelta]:
+        """How long ago the given type was last synced, or None if it never was"""
+        synced_at = self.synced_at(type_name)
+        return datetime.now(timezone.utc) - synced_at if synced_at else None
+
+    # --- internals ---
+
+    def _store_record(self, record: Dict[str, Any]):
+        child = record.get("child") or dict()
+        cls = pykanka.child_types.child_type_dictionary.get(record["type"])
+        parent_id = child.get(cls._parent_key) if cls and cls._parent_key else None
+        subentries = record.get("subentries")
+
+        stored = {key: value for key, value in record.items() if key != "subentries"}
+        updated_at = record.get("updated_at")
+        if updated_at is not None:
+            updated_at = pykanka.sync.format_last_sync(pykanka.sync.parse_timestamp(updated_at))
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entities (id, child_id, type, name, parent_id, updated_at, record) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record["id"], record.get("child_id"), record["type"], record.get("name"), parent_id, updated_at,
+             pykanka.ndjson.dumps(stored)))
+
+        if subentries is not None:
+            self._connection.execute("DELETE FROM subentries WHERE entity_id = ?", (record["id"],))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO subentries (endpoint, id, entity_id, record) VALUES (?, ?, ?, ?)",
+                [(endpoint, entry["id"], record["id"], pykanka.ndjson.dumps(entry))
+                 for endpoint, entries in subentries.items() for entry in entries])
+
+    def _mark_synced(self, type_name: str, synced_at: datetime):
+        self._connection.execute("INSERT OR REPLACE INTO type_state (type, synced_at) VALUES (?, ?)",
+                                 (type_name, synced_at.isoformat()))
+
+    def _save_state(self, state: "pykanka.sync.SyncState"):
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sync_state', ?)", (state.to_json(),))
+
+    def _load_state(self) -> "pykanka.sync.SyncState":
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'sync_state'").fetchone()
+        return pykanka.sync.SyncState.from_json(row[0]) if row else pykanka.sync.SyncState()
+
+    def _one(self, query: str, parameters) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(query, parameters).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _all(self, query: str, parameters) -> list:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+
+def _asdict(data) -> Dict[str, Any]:
+    """Shallow dict of a data class, unlike dataclasses.asdict() this doesn't deep copy nested lists and dicts"""
+    return {f.name: getattr(data, f.name) for f in fields(data)}
@@ -0,0 +1,237 @@
+"""
+Autocompletion of entity names.
+
+NameIndex keeps the case- and diacritic-folded names (and aliases) of all entities in a sorted list. A prefix lookup is
+a binary search, and every word of a name is a key of its own, so "gre" finds "Jonathan Green", and with several words
+each has to start a word of the name, so "jon gr" finds it too. If there aren't enough prefix matches, names within a
+small edit distance are suggested too. Attached to a client, the index follows writes made through it.
+
+    names = NameIndex.from_client(client)
+    names.attach(client)
+    names.complete("jon gr")
+"""
+
+import threading
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Set
+
+import pykanka.events
+from pykanka.fulltext import fold
+
+
+@dataclass
+class NameMatch:
+    entity_id:  int
+    name:       str
+    type:       Optional[str] = None
+    child_id:   Optional[int] = None
+    distance:   int = 0             # edit distance of a fuzzy match, 0 for prefix matches
+
+
+@dataclass
+class _Name:
+    name:       str
+    type:       Optional[str]
+    child_id:   Optional[int]
+    keys:       Tuple[str, ...]
+
+
+def _keys(names: Iterable[str]) -> Set[str]:
+    """The folded name, and the rest of it starting at every later word"""
+    keys = set()
+    for name in names:
+        words = fold(name).split()
+        for i in range(len(words)):
+            keys.add(" ".join(words[i:]))
+    return keys
+
+
+def _successor(stem: str) -> str:
+    """Smallest string sorting after every string that starts with stem"""
+    return stem[:-1] + chr(ord(stem[-1]) + 1)
+
+
+class NameIndex:
+    def __init__(self):
+        self._names: Dict[int, _Name] = dict()
+        self._sorted: List[Tuple[str, int]] = list()         # (key, entity id), sorted
+        self._by_child: Dict[Tuple[str, int], int] = dict()   # (type, child id) -> entity id
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "NameIndex":
+        """Builds an index from export records, e.g. of an NDJSON export, a mirror or a snapshot"""
+        index = cls()
+        entries = list()
+        for record in records:
+            entries.append(index._store(record["id"], record.get("name"), record.get("type"), record.get("child_id")))
+        index._sorted = sorted(key_entry for keys in entries for key_entry in keys)
+        return index
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", refresh: bool = False) -> "NameIndex":
+        """Builds an index from the campaign's entity listing, using cached pages unless refresh is set"""
+        return cls.from_records(dict(id=entity.data.id, name=entity.data.name, type=entity.data.type, child_id=entity.data.child_id)
+                                for entity in client.all_entities(refresh=refresh))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # --- updates ---
+
+    def add(self, entity_id: int, name: str, type_name: str = None, child_id: int = None, aliases: Iterable[str] = ()):
+        """Adds or renames an entity. Aliases are found like the name, but matches report the name."""
+        with self._lock:
+            self._remove(entity_id)
+            for key_entry in self._store(entity_id, name, type_name, child_id, aliases):
+                insort(self._sorted, key_entry)
+
+    def remove(self, entity_id: int):
+        with self._lock:
+            self._remove(entity_id)
+
+    def _store(self, entity_id: int, name: Optional[str], type_name: Optional[str], child_id: Optional[int],
+               aliases: Iterable[str] = ()) -> List[Tuple[str, int]]:
+        keys = tuple(sorted(_keys([name or ""] + list(aliases))))
+        self._names[entity_id] = _Name(name=name or "", type=type_name, child_id=child_id, keys=keys)
+        if type_name and child_id is not None:
+            self._by_child[(type_name, child_id)] = entity_id
+        return [(key, entity_id) for key in keys]
+
+    def _remove(self, entity_id: int):
+        entry = self._names.pop(entity_id, None)
+        if entry is None:
+            return
+        if entry.type and entry.child_id is not None:
+            self._by_child.pop((entry.type, entry.child_id), None)
+        for key in entry.keys:
+            position = bisect_left(self._sorted, (key, entity_id))
+            if position < len(self._sorted) and self._sorted[position] == (key, entity_id):
+                del self._sorted[position]
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the index current with every write made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.type_name is None:
+            if event.method == "delete" and event.path[:1] == ["entities"] and len(event.path) == 2:
+                self.remove(int(event.path[1]))
+            return
+
+        if event.method == "delete":
+            entity_id = self._by_child.get((event.type_name, event.child_id))
+            if entity_id is not None:
+                self.remove(entity_id)
+        elif event.data and event.data.get("entity_id") is not None:
+            self.add(event.data["entity_id"], event.data.get("name"), event.type_name, event.data.get("id"))
+
+    # --- lookups ---
+
+    def prefix(self, text: str, limit: int = 10, type_name: str = None) -> List[NameMatch]:
+        """
+        Entities with a word of their name starting with every word of text, e.g. "jon gr" for "Jonathan Green". Names
+        starting with the first word of text come first.
+        """
+        words = fold(text).split()
+        if not words:
+            return []
+        longest = max(range(len(words)), key=lambda i: len(words[i]))    # narrows the range of keys the most
+        scanned, others = words[longest], words[:longest] + words[longest + 1:]
+
+        with self._lock:
+            found = dict()
+            position = bisect_left(self._sorted, (scanned,))
+            while position < len(self._sorted) and self._sorted[position][0].startswith(scanned):
+                entity_id = self._sorted[position][1]
+                position += 1
+                entry = self._names[entity_id]
+                if type_name and entry.type != type_name:
+                    continue
+                if others and not all(any(word.startswith(other) for key in entry.keys for word in key.split())
+                                      for other in others):
+                    continue
+                starts_name = fold(entry.name).startswith(words[0])
+                rank = (not starts_name, len(entry.name), entry.name)
+                if entity_id not in found or rank < found[entity_id]:
+                    found[entity_id] = rank
+
+            best = sorted(found, key=found.get)[:limit]
+            return [self._match(entity_id) for entity_id in best]
+
+    def fuzzy(self, text: str, max_distance: int = 2, limit: int = 10, type_name: str = None) -> List[NameMatch]:
+        """
+        Entities with a name, or a word of one, that starts with text give or take max_distance edits, so unfinished
+        input with a typo still matches. At most one edit per three characters of text is allowed.
+
+        The sorted keys are walked like a trie: edit distance rows are shared between keys with a common prefix, and
+        all keys below a prefix that is already too far off are skipped with a binary search.
+        """
+        query = " ".join(fold(text).split())
+        max_distance = min(max_distance, len(query) // 3)      # short input would match almost anything otherwise
+        if not query:
+            return []
+        depth_limit = len(query) + max_distance
+
+        with self._lock:
+            found = dict()
+            rows = [list(range(len(query) + 1))]        # rows[d]: distances between prefixes of query and of the key of length d
+            previous_key = ""
+            position = 0
+
+            while position < len(self._sorted):
+                key, entity_id = self._sorted[position]
+
+                common = 0
+                while common < len(rows) - 1 and common < len(key) and key[common] == previous_key[common]:
+                    common += 1
+                del rows[common + 1:]
+                previous_key = key
+
+                for char in key[common:depth_limit]:
+                    last = rows[-1]
+                    row = [last[0] + 1]
+                    for i, query_char in enumerate(query, 1):
+                        row.append(min(last[i] + 1, row[i - 1] + 1, last[i - 1] + (query_char != char)))
+                    rows.append(row)
+                    if min(row) > max_distance:         # rows never get closer again, stop extending the key
+                        break
+
+                # the best prefix of the key may lie before the row that ended the walk, so this is kept either way
+                candidates = rows[max(len(query) - max_distance, 0):]
+                distance = min(row[-1] for row in candidates) if candidates else max_distance + 1
+
+                stem = key[:len(rows) - 1]
+                if stem and (len(stem) >= depth_limit or min(rows[-1]) > max_distance):
+                    end = bisect_left(self._sorted, (_successor(stem),), position)
+                else:                                   # the key ended before the walk did, it is alone in its block
+                    end = position + 1
+                if distance <= max_distance:            # every key of the block starts with stem and has the same distance
+                    for _, entity_id in self._sorted[position:end]:
+                        entry = self._names[entity_id]
+                        if type_name and entry.type != type_name:
+                            continue
+                        if entity_id not in found or distance < found[entity_id]:
+                            found[entity_id] = distance
+                position = end
+
+            best = sorted(found, key=lambda entity_id: (found[entity_id], len(self._names[entity_id].name)))[:limit]
+            return [self._match(entity_id, found[entity_id]) for entity_id in best]
+
+    def complete(self, text: str, limit: int = 10, max_distance: int = 2, type_name: str = None) -> List[NameMatch]:
+        """Prefix matches, topped up with fuzzy matches if there are fewer than limit"""
+        matches = self.prefix(text, limit=limit, type_name=type_name)
+        if len(matches) < limit and max_distance > 0:
+            seen = {match.entity_id for match in matches}
+            for match in self.fuzzy(text, max_distance=max_distance, limit=limit, type_name=type_name):
+                if match.entity_id not in seen and len(matches) < limit:
+                    matches.append(match)
+        return matches
+
+    def _match(self, entity_id: int, distance: int = 0) -> NameMatch:
+        entry = self._names[entity_id]
+        return NameMatch(entity_id=entity_id, name=entry.name, type=entry.type, child_id=entry.child_id, distance=distance)
@@ -0,0 +1,61 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+from typing import Union, IO, Iterator, Tuple, Dict, Any
+
+_openers = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def open_ndjson(path: Union[str, IO[bytes]], mode: str = "r", compression: str = None) -> IO[str]:
+    """
+    Opens an NDJSON file as text, transparently (de)compressing it.
+
+    :param path: File path, or a binary file object opened with a matching mode
+    :param mode: "r", "w" or "a"
+    :param compression: "gzip", "bz2", "xz" or None. If None, it is guessed from the file extension.
+    :return: text file object
+    """
+    name = path if isinstance(path, str) else getattr(path, "name", "")
+    if compression:
+        opener = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}[compression]
+    else:
+        opener = next((op for suffix, op in _openers.items() if str(name).endswith(suffix)), None)
+
+    if opener:
+        return opener(path, f"{mode}t", encoding="utf-8")
+    if not isinstance(path, str):
+        return io.TextIOWrapper(path, encoding="utf-8", newline="\n")
+    return open(path, mode, encoding="utf-8", newline="\n")
+
+
+def iter_records(source: Union[str, IO]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lazily reads an NDJSON file line by line. Blank lines are skipped.
+
+    :param source: File path or open text/binary file object
+    :return: generator of (line number, record) tuples
+    """
+    if isinstance(source, str):
+        with open_ndjson(source) as f:
+            yield from iter_records(f)
+        return
+
+    if isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        source = io.TextIOWrapper(source, encoding="utf-8")
+
+    for line_no, line in enumerate(source, start=1):
+        if line.strip():
+            yield line_no, json.loads(line)
+
+
+def dumps(record: Dict[str, Any]) -> str:
+    """Serialises a record to a single line. Datetimes are written in ISO format."""
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,18 @@
+"""Imports of optional dependencies, which are only needed by a few modules and installed through setup.py extras."""
+
+import importlib
+
+
+def require(module: str, extra: str):
+    """
+    Imports an optional dependency, or explains how to install it.
+
+    :param module: Module to import, e.g. "numpy"
+    :param extra: Name of the setup.py extra that installs it, e.g. "numpy"
+    :return: the imported module
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"This feature needs {module}, which isn't installed. "
+                          f"Install it with: pip install \"pykanka[{extra}]\"") from e
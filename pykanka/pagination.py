@@ -0,0 +1,118 @@
+"""
+Resumable iteration over paginated listings.
+
+A Listing yields the entries of a listing one at a time and keeps a Cursor pointing at the next entry: the url of the
+page it is on and how many entries of that page were already yielded. The cursor can be stored with to_json() and
+passed back in later to continue where an interrupted walk stopped. Pages that fail with a connection error or a
+server error are retried before the Listing gives up.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Callable, Any, Dict, Optional, Union
+
+import requests
+import tenacity
+
+from pykanka.exceptions import *
+
+# errors that are worth retrying a page for
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, ServerError)
+
+
+@dataclass(frozen=True)
+class Cursor:
+    url:        str         # page the listing is on
+    position:   int = 0     # entries of that page already yielded
+
+    def to_json(self) -> str:
+        return json.dumps(dict(url=self.url, position=self.position))
+
+    @classmethod
+    def from_json(cls, content: Union[str, dict]) -> "Cursor":
+        if type(content) == str:
+            content = json.loads(content)
+        return cls(url=content["url"], position=content.get("position", 0))
+
+
+class Listing:
+    """
+    Iterator over every entry of a paginated listing, one page in memory at a time.
+
+        listing = client.all_characters()
+        for character in listing:
+            save_checkpoint(listing.cursor.to_json())
+        ...
+        for character in client.all_characters(cursor=Cursor.from_json(load_checkpoint())):
+            ...
+    """
+
+    def __init__(self, client: "pykanka.KankaClient", url: str, build: Callable[[Dict[str, Any]], Any] = None,
+                 refresh: bool = True, cursor: Cursor = None, retries: int = 3, retry_wait: float = 1.,
+                 where: Callable[[Dict[str, Any]], bool] = None):
+        """
+        :param client: KankaClient
+        :param url: Url of the listing's first page. Ignored if cursor is given.
+        :param build: Turns an entry of the listing into the object that is yielded. Entries are yielded as dicts if None.
+        :param refresh: Ignore cached pages
+        :param cursor: Cursor of an earlier Listing over the same listing, to resume from
+        :param retries: How often a failing page is retried
+        :param retry_wait: Seconds to wait before the first retry, doubling with every further one
+        :param where: Entries for which this returns False are skipped before they are built
+        """
+        self.client = client
+        self.refresh = refresh
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self._build = build or (lambda entry: entry)
+        self._where = where
+
+        cursor = cursor or Cursor(url)
+        self._url: Optional[str] = cursor.url
+        self._position: int = cursor.position
+        self._page: Optional[Dict[str, Any]] = None
+
+    @property
+    def cursor(self) -> Optional[Cursor]:
+        """Position of the next entry, or None once the listing is exhausted"""
+        if self._url is None:
+            return None
+        return Cursor(self._url, self._position)
+
+    def __iter__(self) -> "Listing":
+        return self
+
+    def __next__(self):
+        while self._url is not None:
+            if self._page is None:
+                self._page = self._fetch(self._url)
+
+            while self._position < len(self._page["data"]):
+                entry = self._page["data"][self._position]
+                self._position += 1
+                if self._where is None or self._where(entry):
+                    return self._build(entry)
+
+            self._url = self._page.get("links", {}).get("next")
+            self._position = 0
+            self._page = None
+
+        raise StopIteration
+
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        retrying = tenacity.Retrying(retry=tenacity.retry_if_exception_type(TRANSIENT_ERRORS),
+                                     stop=tenacity.stop_after_attempt(self.retries + 1),
+                                     wait=tenacity.wait_exponential(multiplier=self.retry_wait),
+                                     reraise=True)
+
+        for attempt in retrying:
+            with attempt:
+                retried = attempt.retry_state.attempt_number > 1
+                response = self.client.request_get(url, refresh=self.refresh or retried)     # never reuse a failed, cached page
+
+                if response.status_code >= 500:
+                    raise ServerError(f"Response from {url} not OK, code {response.status_code}: {response.reason}")
+                if not response.ok:
+                    raise ResponseNotOkError(f"Response from {url} not OK, code {response.status_code}: {response.reason}")
+
+                return response.json()
@@ -0,0 +1,117 @@
+"""
+Lazy, composable queries over one entity type.
+
+    query = client.query("character").where(is_dead=False, race_id=3).order_by("name").limit(50)
+    for character in query:
+        ...
+
+Nothing is fetched until the query is iterated. Filters the API supports are pushed down into the listing url (see
+pykanka.filters), the rest are checked while streaming. Without order_by(), pages are only fetched until limit() is
+satisfied. Kanka's listings can't be sorted, so order_by() reads the whole filtered listing, keeping only the best
+`limit` objects in memory. If the client has a CampaignMirror that has synced the type, the query reads from the mirror
+instead of the API.
+"""
+
+import heapq
+from itertools import islice
+from typing import Dict, Any, Tuple, Optional, Iterator, Iterable, List
+
+import pykanka.filters
+from pykanka.exceptions import *
+
+
+class Query:
+    def __init__(self, client: "pykanka.KankaClient", type_name: str, filters: Dict[str, Any] = None,
+                 order: Tuple[str, ...] = (), max_results: Optional[int] = None, excluded: Tuple[str, ...] = (),
+                 refresh: bool = False, use_mirror: bool = True):
+        if type_name not in client._type_dictionary:
+            raise WrongParametersPassedToEntity(f"unknown type '{type_name}'")
+
+        self.client = client
+        self.type_name = type_name
+        self.filters = dict(filters or dict())
+        self.order = tuple(order)
+        self.max_results = max_results
+        self.excluded = tuple(excluded)
+        self.refresh = refresh
+        self.use_mirror = use_mirror
+
+    def _copy(self, **changes) -> "Query":
+        values = dict(filters=self.filters, order=self.order, max_results=self.max_results, excluded=self.excluded,
+                      refresh=self.refresh, use_mirror=self.use_mirror)
+        values.update(changes)
+        return Query(self.client, self.type_name, **values)
+
+    def where(self, **filters) -> "Query":
+        """Adds field=value filters. Values can also be callables taking the field's value, see pykanka.filters.matches()."""
+        return self._copy(filters={**self.filters, **filters})
+
+    def order_by(self, *fields: str) -> "Query":
+        """Sorts by the given fields, "-name" sorts descending. Objects missing a field come last."""
+        return self._copy(order=fields)
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(max_results=count)
+
+    def exclude(self, *fields: str) -> "Query":
+        """Drops fields such as "entry" before objects are built"""
+        return self._copy(excluded=self.excluded + fields)
+
+    def fresh(self) -> "Query":
+        """Bypasses the client's response cache and mirror"""
+        return self._copy(refresh=True, use_mirror=False)
+
+    def __iter__(self) -> Iterator[Any]:
+        objects = self._source()
+
+        if not self.order:
+            return islice(objects, self.max_results) if self.max_results is not None else objects
+
+        return iter(self._sorted(objects))
+
+    def all(self) -> List[Any]:
+        return list(self)
+
+    def first(self) -> Optional[Any]:
+        return next(iter(self.limit(1)), None)
+
+    def _source(self) -> Iterator[Any]:
+        mirror = self.client.mirror
+        if self.use_mirror and mirror is not None and self.type_name != "entity" and mirror.synced_at(self.type_name):
+            return self._from_mirror(mirror)
+
+        return self.client.get_all_of_type(self.type_name, refresh=self.refresh, exclude=self.excluded or None, **self.filters)
+
+    def _from_mirror(self, mirror: "pykanka.mirror.CampaignMirror") -> Iterator[Any]:
+        cls = self.client._type_dictionary[self.type_name]
+        excluded = frozenset(self.excluded)
+
+        for record in mirror.iter_records(self.type_name):
+            child = record["child"]
+            if pykanka.filters.matches(child, self.filters):
+                yield cls.from_json(self.client, pykanka.filters.project(child, excluded) if excluded else child)
+
+    def _sorted(self, objects: Iterable[Any]) -> List[Any]:
+        fields = [(field[1:], True) if field.startswith("-") else (field, False) for field in self.order]
+        directions = {descending for _, descending in fields}
+
+        if self.max_results is not None and len(directions) == 1:
+            descending = directions.pop()
+            if descending:          # None still sorts last
+                return heapq.nlargest(self.max_results, objects, key=lambda obj: [(value is not None, value) for value in _values(obj, fields)])
+            return heapq.nsmallest(self.max_results, objects, key=lambda obj: [(value is None, value) for value in _values(obj, fields)])
+
+        objects = list(objects)
+        for name, descending in reversed(fields):           # stable sorts, least significant field first
+            present = [obj for obj in objects if _value(obj, name) is not None]
+            missing = [obj for obj in objects if _value(obj, name) is None]
+            objects = sorted(present, key=lambda obj: _value(obj, name), reverse=descending) + missing
+        return objects[:self.max_results] if self.max_results is not None else objects
+
+
+def _value(obj, name: str):
+    return getattr(obj.data, name, None)
+
+
+def _values(obj, fields) -> List[Any]:
+    return [_value(obj, name) for name, _ in fields]
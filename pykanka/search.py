@@ -0,0 +1,58 @@
+"""
+Search results that don't cost a request each.
+
+KankaClient.search_results() yields SearchResult records built straight from the search payload. Only the hits that are
+actually needed are turned into full Entity objects with hydrate(), which fetches them concurrently and through the
+client's response cache.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Iterable, List
+
+
+@dataclass
+class SearchResult:
+    entity_id:  int
+    name:       Optional[str] = None
+    type:       Optional[str] = None
+    child_id:   Optional[int] = None
+    is_private: Optional[bool] = None
+    tooltip:    Optional[str] = None
+    url:        Optional[str] = None
+
+    @classmethod
+    def from_json(cls, content: Dict[str, Any]) -> "SearchResult":
+        return cls(
+            entity_id=content["entity_id"],
+            name=content.get("name"),
+            type=content.get("type"),
+            child_id=content.get("id"),
+            is_private=content.get("is_private"),
+            tooltip=content.get("tooltip"),
+            url=content.get("url"),
+        )
+
+    def hydrate(self, client: "pykanka.KankaClient", refresh: bool = False) -> "pykanka.entities.Entity":
+        return client.get_entity(self.entity_id, refresh=refresh)
+
+
+def hydrate(client: "pykanka.KankaClient", results: Iterable[SearchResult], max_workers: int = 8,
+            refresh: bool = False) -> List["pykanka.entities.Entity"]:
+    """
+    Fetches the entities of several search results at once. Each entity is requested once, even if it appears in
+    several results, and cached responses are reused unless refresh is set.
+
+    :param client: KankaClient
+    :param results: SearchResults to hydrate
+    :param max_workers: Maximum number of requests in flight at once
+    :param refresh: Ignore cached responses
+    :return: list of Entity objects, in the order of results
+    """
+    results = list(results)
+    entity_ids = list(dict.fromkeys(result.entity_id for result in results))
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        entities = dict(zip(entity_ids, executor.map(lambda entity_id: client.get_entity(entity_id, refresh=refresh), entity_ids)))
+
+    return [entities[result.entity_id] for result in results]
@@ -0,0 +1,209 @@
+"""
+Binary campaign snapshots with random access by entity id.
+
+A snapshot file holds the same records as an NDJSON export, but is opened with mmap and only decodes the records that
+are asked for. Opening is constant time, and processes opening the same file share its pages through the OS cache.
+
+Layout, all integers little endian:
+
+    magic           8 bytes     b"PKSNAP" + format version (2 bytes)
+    records         compact, key-sorted UTF-8 JSON, back to back
+    ids             count * u64, sorted ascending
+    offsets         count * u64, start of each record
+    lengths         count * u32, length of each record
+    digests         count * 8 bytes, content_digest() of each record
+    footer          u64 index offset, u64 count, 8 bytes magic
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Dict, Any, Iterator, Optional, Union, IO
+
+import pykanka.exporter
+import pykanka.ndjson
+from pykanka.exceptions import *
+
+MAGIC = b"PKSNAP\x00\x01"
+_footer = struct.Struct("<QQ8s")
+
+# bookkeeping fields that change without the content changing, or differ between copies of the same content
+VOLATILE_KEYS = frozenset({"id", "entity_id", "child_id", "campaign_id", "created_at", "created_by", "updated_at",
+                           "updated_by", "image", "image_full", "image_thumb", "image_uuid", "header_image", "header_full"})
+
+
+def canonical_json(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=pykanka.ndjson._default).encode("utf-8")
+
+
+def strip_volatile(value):
+    """Returns a copy of a record without the keys in VOLATILE_KEYS, at any depth"""
+    if isinstance(value, dict):
+        return {key: strip_volatile(v) for key, v in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(v) for v in value]
+    return value
+
+
+def content_digest(record: Dict[str, Any]) -> bytes:
+    """8 byte hash of a record's content, ignoring bookkeeping fields such as ids and timestamps"""
+    return hashlib.blake2b(canonical_json(strip_volatile(record)), digest_size=8).digest()
+
+
+def write_snapshot(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """
+    Writes records to a snapshot file. Records are streamed to disk, only the index is kept in memory.
+
+    :param records: Export records, e.g. from pykanka.exporter.iter_records() or an NDJSON export
+    :param path: Output file
+    :return: number of records written
+    """
+    index = list()
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        for record in records:
+            data = canonical_json(record)
+            index.append((record["id"], f.tell(), len(data), content_digest(record)))
+            f.write(data)
+
+        index.sort()
+        for i in range(1, len(index)):
+            if index[i][0] == index[i - 1][0]:
+                raise WrongParametersPassedToEntity(f"entity {index[i][0]} appears more than once")
+
+        index_offset = f.tell()
+        f.write(struct.pack(f"<{len(index)}Q", *(entry[0] for entry in index)))
+        f.write(struct.pack(f"<{len(index)}Q", *(entry[1] for entry in index)))
+        f.write(struct.pack(f"<{len(index)}I", *(entry[2] for entry in index)))
+        f.write(b"".join(entry[3] for entry in index))
+        f.write(_footer.pack(index_offset, len(index), MAGIC))
+
+    return len(index)
+
+
+def snapshot_from_export(source: Union[str, IO], path: str) -> int:
+    """Converts an NDJSON export to a snapshot file"""
+    return write_snapshot((record for _, record in pykanka.ndjson.iter_records(source)), path)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped snapshot.
+
+        with Snapshot("campaign.snap", client) as snapshot:
+            entity = snapshot[1234]
+    """
+
+    def __init__(self, path: str, client: "pykanka.KankaClient" = None):
+        """
+        :param path: Snapshot file
+        :param client: KankaClient used to build Entity objects. Only needed for snapshot[entity_id].
+        """
+        self.path = path
+        self.client = client
+
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < len(MAGIC) + _footer.size:
+                raise ValueError(f"{path} is not a pykanka snapshot")
+
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._mmap[:len(MAGIC)] != MAGIC or _footer.unpack_from(self._mmap, size - _footer.size)[2] != MAGIC:
+                self._mmap.close()
+                raise ValueError(f"{path} is not a pykanka snapshot, is truncated or has an unsupported version")
+        except Exception:
+            self._file.close()
+            raise
+
+        index_offset, count, _ = _footer.unpack_from(self._mmap, size - _footer.size)
+
+        view = memoryview(self._mmap)
+        self._count = count
+        self._ids = self._column(view[index_offset:index_offset + 8 * count], "Q")
+        self._offsets = self._column(view[index_offset + 8 * count:index_offset + 16 * count], "Q")
+        self._lengths = self._column(view[index_offset + 16 * count:index_offset + 20 * count], "I")
+        self._digests = view[index_offset + 20 * count:index_offset + 28 * count]
+
+    @staticmethod
+    def _column(view: memoryview, typecode: str):
+        """Interprets part of the index as an integer array without copying it, except on big endian machines"""
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        column = array(typecode, bytes(view))
+        column.byteswap()
+        return column
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for view in (self._ids, self._offsets, self._lengths, self._digests):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, entity_id: int) -> bool:
+        return self._position(entity_id) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __getitem__(self, entity_id: int) -> "pykanka.entities.Entity":
+        if self.client is None:
+            raise ValueError("a client is required to build Entity objects, use record() for the raw data")
+        return pykanka.exporter.record_to_entity(self.client, self.record(entity_id))
+
+    def ids(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def record(self, entity_id: int) -> Dict[str, Any]:
+        """Decodes and returns the export record of an entity"""
+        position = self._position(entity_id)
+        if position is None:
+            raise KeyError(entity_id)
+        return self._record_at(position)
+
+    def get(self, entity_id: int, default=None) -> Optional[Dict[str, Any]]:
+        position = self._position(entity_id)
+        return default if position is None else self._record_at(position)
+
+    def digest(self, entity_id: int) -> bytes:
+        """content_digest() of an entity's record, read from the index without decoding the record"""
+        position = self._position(entity_id)
+        if position is None:
+            raise KeyError(entity_id)
+        return bytes(self._digests[8 * position:8 * position + 8])
+
+    def digests(self) -> Iterator[tuple]:
+        """Yields (entity id, content digest) for every record, in id order"""
+        for position in range(self._count):
+            yield self._ids[position], bytes(self._digests[8 * position:8 * position + 8])
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Yields every record, in id order"""
+        for position in range(self._count):
+            yield self._record_at(position)
+
+    def _position(self, entity_id: int) -> Optional[int]:
+        position = bisect_left(self._ids, entity_id)
+        if position < self._count and self._ids[position] == entity_id:
+            return position
+        return None
+
+    def _record_at(self, position: int) -> Dict[str, Any]:
+        offset = self._offsets[position]
+        return json.loads(self._mmap[offset:offset + self._lengths[position]])
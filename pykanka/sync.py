@@ -0,0 +1,183 @@
+"""
+Incremental synchronisation using the lastSync parameter of Kanka's listing endpoints.
+
+The first sync of a type walks the whole campaign. After that, a sync asks the entities endpoint for everything updated
+since the oldest mark of the synced types, fetches child data only for the types that actually changed, and compares
+the campaign's entity count against the known ids to notice deletions. On a campaign where nothing changed that is two
+requests. Every type keeps its own mark, so syncing some types never skips changes to the others.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Set, List, Optional, Iterable, Union
+
+import pykanka.bulk
+import pykanka.child_types
+
+
+def parse_timestamp(value: Union[str, datetime, None]) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_last_sync(value: Union[str, datetime]) -> str:
+    """Formats a timestamp the way the lastSync parameter expects it. Naive datetimes are taken to be UTC."""
+    if isinstance(value, str):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+@dataclass
+class SyncState:
+    """What a previous sync has seen. Can be stored with to_json() and restored with from_json()."""
+
+    high_water:         Dict[str, datetime] = field(default_factory=dict)   # changes of each type are known up to this updated_at
+    entities_high_water: Optional[datetime] = None                          # newest of the marks
+    known:              Dict[str, Set[int]] = field(default_factory=dict)   # entity ids per type
+    synced_at:          Dict[str, datetime] = field(default_factory=dict)   # time of the last successful sync per type
+
+    @property
+    def entity_count(self) -> int:
+        return sum(len(ids) for ids in self.known.values())
+
+    def type_of(self, entity_id: int) -> Optional[str]:
+        for type_name, ids in self.known.items():
+            if entity_id in ids:
+                return type_name
+        return None
+
+    def to_json(self) -> str:
+        return json.dumps(dict(
+            high_water={key: value.isoformat() for key, value in self.high_water.items()},
+            entities_high_water=self.entities_high_water.isoformat() if self.entities_high_water else None,
+            known={key: sorted(value) for key, value in self.known.items()},
+            synced_at={key: value.isoformat() for key, value in self.synced_at.items()},
+        ))
+
+    @classmethod
+    def from_json(cls, content: Union[str, dict]) -> "SyncState":
+        if type(content) == str:
+            content = json.loads(content)
+        return cls(
+            high_water={key: parse_timestamp(value) for key, value in content.get("high_water", {}).items()},
+            entities_high_water=parse_timestamp(content.get("entities_high_water")),
+            known={key: set(value) for key, value in content.get("known", {}).items()},
+            synced_at={key: parse_timestamp(value) for key, value in content.get("synced_at", {}).items()},
+        )
+
+    def _advance(self, type_name: str, updated_at: Optional[datetime]):
+        if updated_at is None:
+            return
+        if type_name not in self.high_water or updated_at > self.high_water[type_name]:
+            self.high_water[type_name] = updated_at
+        if self.entities_high_water is None or updated_at > self.entities_high_water:
+            self.entities_high_water = updated_at
+
+
+@dataclass
+class SyncResult:
+    state:      SyncState
+    changed:    Dict[str, List["pykanka.child_types.GenericChildType"]] = field(default_factory=dict)
+    deleted:    Dict[str, List[int]] = field(default_factory=dict)      # entity ids per type
+    full:       bool = False                                            # True if this was an initial, complete sync
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.changed.values()) and not any(self.deleted.values())
+
+
+def sync(client: "pykanka.KankaClient", state: SyncState = None, types: Iterable[str] = None, max_workers: int = 4) -> SyncResult:
+    """
+    Fetches everything that changed since the given state.
+
+    :param client: KankaClient
+    :param state: SyncState of a previous sync. A full sync is done if None.
+    :param types: Keys of child_type_dictionary to report changes for, all types if None
+    :param max_workers: Maximum number of requests in flight at once
+    :return: SyncResult. Its state is updated in place and can be passed to the next sync.
+    """
+    state = state or SyncState()
+    types = list(types or pykanka.child_types.child_type_dictionary.keys())
+    fresh = {type_name for type_name in types if type_name not in state.high_water}     # never synced, walk everything
+    result = SyncResult(state=state, full=len(fresh) == len(types))
+    entities_url = f"{client.campaign_base_url}entities"
+    now = datetime.now(timezone.utc)
+
+    if fresh:
+        delta = list(pykanka.bulk.iter_listing(client, entities_url, max_workers=max_workers))
+    else:
+        since = min(state.high_water[type_name] for type_name in types)
+        delta_url = pykanka.bulk.with_params(entities_url, lastSync=format_last_sync(since))
+        delta = list(pykanka.bulk.iter_listing(client, delta_url, max_workers=max_workers))
+
+    for type_name in fresh:
+        state.known[type_name] = set()
+
+    changed_ids = dict()
+    for entry in delta:
+        type_name = entry["type"]
+        known = state.known.setdefault(type_name, set())
+        if type_name not in types:
+            known.add(entry["id"])  # for the entity count only, the type keeps its mark and sees the change when synced
+            continue
+        updated_at = parse_timestamp(entry.get("updated_at"))
+
+        if type_name not in fresh and entry["id"] in known and updated_at and updated_at <= state.high_water[type_name]:
+            continue                # lastSync is inclusive, skip what the previous sync already returned
+
+        known.add(entry["id"])
+        changed_ids.setdefault(type_name, set()).add(entry["id"])
+
+    for type_name in types:
+        if type_name not in changed_ids:
+            state.synced_at[type_name] = now
+            continue
+
+        url = pykanka.child_types.child_type_dictionary[type_name](client=client).base_url
+        if type_name not in fresh:
+            url = pykanka.bulk.with_params(url, lastSync=format_last_sync(state.high_water[type_name]))
+
+        cls = pykanka.child_types.child_type_dictionary[type_name]
+        children = [cls.from_json(client, entry) for entry in pykanka.bulk.iter_listing(client, url, max_workers=max_workers)
+                    if entry.get("entity_id") in changed_ids[type_name]]
+
+        result.changed[type_name] = children
+        state.synced_at[type_name] = now
+
+    # the delta holds every change of any type since its lastSync, so each synced type is now known up to its newest entry
+    newest = max(filter(None, (parse_timestamp(entry.get("updated_at")) for entry in delta)), default=None)
+    for type_name in types:
+        state._advance(type_name, newest)
+
+    if not result.full:
+        _detect_deletions(client, state, result, [type_name for type_name in types if type_name not in fresh],
+                          entities_url, max_workers)
+
+    return result
+
+
+def _detect_deletions(client: "pykanka.KankaClient", state: SyncState, result: SyncResult, types: List[str], entities_url: str,
+                      max_workers: int):
+    """Compares the campaign's entity count with the known ids, and only walks the id list if they disagree"""
+    total = pykanka.bulk.get_json(client, entities_url).get("meta", {}).get("total")
+
+    if total is not None and total == state.entity_count:
+        return
+
+    existing = dict()
+    for entry in pykanka.bulk.iter_listing(client, entities_url, max_workers=max_workers):
+        existing.setdefault(entry["type"], set()).add(entry["id"])
+
+    for type_name in types:
+        known = state.known.get(type_name, set())
+        gone = known - existing.get(type_name, set())
+        if gone:                    # other types keep theirs until they are synced and the deletion is reported
+            known -= gone
+            result.deleted[type_name] = sorted(gone)
+
+    for type_name, ids in existing.items():         # so that the counts agree next time, even for untracked types
+        state.known.setdefault(type_name, set()).update(ids)
@@ -0,0 +1,323 @@
+"""
+Tag membership as bitmaps.
+
+TagIndex maps entity ids to dense ordinals and stores the members of each tag as a bitmap over them, held in a plain
+Python int: bit n is set if the entity with ordinal n carries the tag. And, or and not of whole tags are then single
+integer operations, so "tagged A and B but not C" stays fast on large campaigns. Nested tags (tag_id) are handled
+through a tag Hierarchy: with nested=True, a tag also stands for all tags below it.
+
+    tags = TagIndex.from_client(client)
+    tags.attach(client)
+    tags.select(all_of=[heroes], none_of=[dead], nested=True)
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+import pykanka.bulk
+import pykanka.sync
+from pykanka.hierarchy import Hierarchy
+
+
+_set_bits = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+_nonzero = bytes([0] + [1] * 255)
+
+
+def bits_to_ordinals(bitmap: int) -> List[int]:
+    """Positions of the set bits, lowest first"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    flags = data.translate(_nonzero)        # lets find() skip empty bytes at C speed
+    ordinals = list()
+    position = flags.find(1)
+    while position != -1:
+        ordinals.extend(position * 8 + bit for bit in _set_bits[data[position]])
+        position = flags.find(1, position + 1)
+    return ordinals
+
+
+def ordinals_to_bits(ordinals: Iterable[int], size: int) -> int:
+    """Bitmap with the given positions set, built in one go rather than with an OR per bit"""
+    data = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        data[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(data, "little")
+
+
+def bit_count(bitmap: int) -> int:
+    if hasattr(bitmap, "bit_count"):        # Python 3.10+
+        return bitmap.bit_count()
+    return bin(bitmap).count("1")
+
+
+class TagIndex:
+    def __init__(self):
+        self.tags = Hierarchy("tag")
+
+        self._ordinals: Dict[int, int] = dict()                # entity id -> ordinal
+        self._entity_ids: List[Optional[int]] = list()         # ordinal -> entity id, None once removed
+        self._members: Dict[int, int] = dict()                 # tag id -> bitmap of entity ordinals
+        self._tags_of: Dict[int, Set[int]] = dict()            # entity id -> tag ids
+        self._types: Dict[str, int] = dict()                   # entity type -> bitmap of entity ordinals
+        self._type_of: Dict[int, str] = dict()                 # entity id -> type
+        self._entity_tags: Dict[int, Tuple[int, int]] = dict() # EntityTag id -> (entity id, tag id)
+        self._all = 0                                          # bitmap of every entity in the index
+        self._nested: Dict[int, int] = dict()                  # tag id -> bitmap including nested tags, cached
+        self._lock = threading.RLock()
+        self.synced_at: Optional[datetime] = None
+
+    # --- loading ---
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "TagIndex":
+        """
+        Builds an index from export records, e.g. of an NDJSON export, a mirror or a snapshot. Tag records make up the
+        tag hierarchy, and "entity_tags" subentries, if exported, let deletions of those EntityTags be followed.
+        """
+        index = cls()
+        entities = list()
+        for record in records:
+            entities.append((record["id"], record.get("type"), record.get("tags")))
+            if record.get("type") == "tag":
+                child = record.get("child") or dict()
+                index.tags.set_parent(record["child_id"], child.get("tag_id"), entity_id=record["id"])
+            for entity_tag in (record.get("subentries") or dict()).get("entity_tags", []):
+                index._entity_tags[entity_tag["id"]] = (entity_tag["entity_id"], entity_tag["tag_id"])
+        index._load(entities)
+        return index
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", max_workers: int = 4) -> "TagIndex":
+        """
+        Loads the tags of every entity from the entities listing, and the tag hierarchy from the tags listing. The
+        EntityTags of tagged entities are fetched as well, so that deleting one of them can be followed.
+        """
+        synced_at = datetime.now(timezone.utc)
+        index = cls()
+        index.tags = Hierarchy.from_client(client, "tag", max_workers=max_workers)
+        index._load((entity["id"], entity.get("type"), entity.get("tags"))
+                    for entity in pykanka.bulk.iter_listing(client, f"{client.campaign_base_url}entities", max_workers=max_workers))
+        index._fetch_entity_tags(client, [entity_id for entity_id, tag_ids in index._tags_of.items() if tag_ids], max_workers)
+        index.synced_at = synced_at
+        return index
+
+    def sync(self, client: "pykanka.KankaClient", max_workers: int = 4) -> int:
+        """
+        Applies the tags of entities changed since the last load or sync, fetched with lastSync. Deleted entities
+        aren't reported by the listing, attach() the index to the client to follow deletions made through it.
+
+        :return: number of changed entities
+        """
+        url = f"{client.campaign_base_url}entities"
+        if self.synced_at:
+            url = pykanka.bulk.with_params(url, lastSync=pykanka.sync.format_last_sync(self.synced_at))
+        synced_at = datetime.now(timezone.utc)
+
+        self.tags.sync(client, max_workers=max_workers)
+        tagged = list()
+        changed = 0
+        for entity in pykanka.bulk.iter_listing(client, url, max_workers=max_workers):
+            self.set_tags(entity["id"], entity.get("tags") or (), type_name=entity.get("type"))
+            if entity.get("tags"):
+                tagged.append(entity["id"])
+            changed += 1
+        self._fetch_entity_tags(client, tagged, max_workers)
+        self._nested.clear()
+        self.synced_at = synced_at
+        return changed
+
+    def _load(self, entities: Iterable[Tuple[int, Optional[str], Optional[List[int]]]]):
+        """Bulk load into an empty index: bitmaps are assembled once per tag and type instead of bit by bit"""
+        members, types = dict(), dict()
+        for entity_id, type_name, tag_ids in entities:
+            ordinal = self._ordinals[entity_id] = len(self._entity_ids)
+            self._entity_ids.append(entity_id)
+            self._tags_of[entity_id] = set(tag_ids or ())
+            for tag_id in self._tags_of[entity_id]:
+                members.setdefault(tag_id, []).append(ordinal)
+            if type_name:
+                self._type_of[entity_id] = type_name
+                types.setdefault(type_name, []).append(ordinal)
+
+        size = len(self._entity_ids)
+        self._members = {tag_id: ordinals_to_bits(ordinals, size) for tag_id, ordinals in members.items()}
+        self._types = {type_name: ordinals_to_bits(ordinals, size) for type_name, ordinals in types.items()}
+        self._all = (1 << size) - 1
+
+    def _fetch_entity_tags(self, client: "pykanka.KankaClient", entity_ids: List[int], max_workers: int):
+        """Remembers which EntityTag stands for which membership, the entities listing only has the tag ids"""
+        for entity_id, found in pykanka.bulk.fetch_subentries(client, entity_ids, ["entity_tags"], max_workers=max_workers):
+            with self._lock:
+                for entity_tag in found["entity_tags"]:
+                    self._entity_tags[entity_tag["id"]] = (entity_id, entity_tag["tag_id"])
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the index current with every write made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.subentry_endpoint == "entity_tags":
+            if event.method == "delete":
+                if len(event.path) > 3:
+                    self.remove_entity_tag(int(event.path[3]))
+            elif event.data:
+                self.add_tag(event.data["entity_id"], event.data["tag_id"], entity_tag_id=event.data.get("id"))
+            return
+
+        if event.type_name is None:
+            if event.method == "delete" and event.path[:1] == ["entities"] and len(event.path) == 2:
+                self.remove_entity(int(event.path[1]))
+            return
+
+        if event.type_name == "tag":
+            tag_id = event.child_id
+            self.tags.on_write(event)
+            with self._lock:
+                self._nested.clear()
+                if event.method == "delete" and tag_id is not None:
+                    self._drop_tag(tag_id)
+
+        if event.method == "delete":
+            return
+        if event.data and event.data.get("entity_id") is not None and "tags" in event.data:
+            self.set_tags(event.data["entity_id"], event.data["tags"] or (), type_name=event.type_name)
+
+    # --- updates ---
+
+    def set_tags(self, entity_id: int, tag_ids: Iterable[int], type_name: str = None):
+        """Replaces the tags of an entity, adding it to the index if needed"""
+        with self._lock:
+            ordinal = self._ordinal(entity_id)
+            bit = 1 << ordinal
+            if type_name and self._type_of.get(entity_id) != type_name:
+                self._untype(entity_id, bit)
+                self._type_of[entity_id] = type_name
+                self._types[type_name] = self._types.get(type_name, 0) | bit
+
+            new_tags, old_tags = set(tag_ids), self._tags_of.get(entity_id, set())
+            for tag_id in old_tags - new_tags:
+                self._members[tag_id] &= ~bit
+            for tag_id in new_tags - old_tags:
+                self._members[tag_id] = self._members.get(tag_id, 0) | bit
+            self._tags_of[entity_id] = new_tags
+            if new_tags != old_tags:
+                self._nested.clear()
+
+    def add_tag(self, entity_id: int, tag_id: int, entity_tag_id: int = None):
+        with self._lock:
+            if entity_tag_id is not None:
+                self._entity_tags[entity_tag_id] = (entity_id, tag_id)
+            self.set_tags(entity_id, self._tags_of.get(entity_id, set()) | {tag_id})
+
+    def remove_tag(self, entity_id: int, tag_id: int):
+        with self._lock:
+            if entity_id in self._ordinals:
+                self.set_tags(entity_id, self._tags_of.get(entity_id, set()) - {tag_id})
+
+    def remove_entity_tag(self, entity_tag_id: int):
+        """Removes the membership an EntityTag subentry stood for, if it is known"""
+        with self._lock:
+            membership = self._entity_tags.pop(entity_tag_id, None)
+            if membership is not None:
+                self.remove_tag(*membership)
+
+    def remove_entity(self, entity_id: int):
+        with self._lock:
+            ordinal = self._ordinals.pop(entity_id, None)
+            if ordinal is None:
+                return
+            bit = 1 << ordinal
+            for tag_id in self._tags_of.pop(entity_id, ()):
+                self._members[tag_id] &= ~bit
+            self._untype(entity_id, bit)
+            self._all &= ~bit
+            self._entity_ids[ordinal] = None
+            self._nested.clear()
+            tag_id = self.tags.child_id(entity_id)
+            if tag_id is not None:                  # the entity was a tag itself
+                self._drop_tag(tag_id)
+                self.tags.remove(tag_id)
+
+    def _drop_tag(self, tag_id: int):
+        bitmap = self._members.pop(tag_id, 0)
+        for ordinal in bits_to_ordinals(bitmap):
+            self._tags_of[self._entity_ids[ordinal]].discard(tag_id)
+
+    def _untype(self, entity_id: int, bit: int):
+        type_name = self._type_of.pop(entity_id, None)
+        if type_name is not None:
+            self._types[type_name] &= ~bit
+
+    def _ordinal(self, entity_id: int) -> int:
+        ordinal = self._ordinals.get(entity_id)
+        if ordinal is None:
+            ordinal = self._ordinals[entity_id] = len(self._entity_ids)
+            self._entity_ids.append(entity_id)
+            self._all |= 1 << ordinal
+        return ordinal
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def tags_of(self, entity_id: int) -> Set[int]:
+        return set(self._tags_of.get(entity_id, ()))
+
+    def bitmap(self, tag_id: int, nested: bool = False) -> int:
+        """Members of a tag as a bitmap, with nested=True including the members of every tag below it"""
+        if not nested:
+            return self._members.get(tag_id, 0)
+        with self._lock:
+            bitmap = self._nested.get(tag_id)
+            if bitmap is None:
+                bitmap = self._members.get(tag_id, 0)
+                for descendant in self.tags.descendants(tag_id):
+                    bitmap |= self._members.get(descendant, 0)
+                self._nested[tag_id] = bitmap
+            return bitmap
+
+    def match(self, all_of: Iterable[int] = (), any_of: Iterable[int] = (), none_of: Iterable[int] = (),
+              nested: bool = False, type_name: str = None) -> int:
+        """
+        Bitmap of the entities matching a tag query, see select()
+        """
+        with self._lock:
+            result = self._types.get(type_name, 0) if type_name else self._all
+            for tag_id in all_of:
+                result &= self.bitmap(tag_id, nested)
+            any_of = list(any_of)
+            if any_of:
+                union = 0
+                for tag_id in any_of:
+                    union |= self.bitmap(tag_id, nested)
+                result &= union
+            for tag_id in none_of:
+                result &= ~self.bitmap(tag_id, nested)
+            return result
+
+    def select(self, all_of: Iterable[int] = (), any_of: Iterable[int] = (), none_of: Iterable[int] = (),
+               nested: bool = False, type_name: str = None) -> List[int]:
+        """
+        Entities by their tags.
+
+        :param all_of: Tag ids the entities must all carry
+        :param any_of: Tag ids of which the entities must carry at least one
+        :param none_of: Tag ids the entities must not carry
+        :param nested: Let each tag stand for itself and every tag nested below it
+        :param type_name: Only return entities of this type, e.g. "character"
+        :return: entity ids, in the order they were added to the index
+        """
+        return self.entity_ids(self.match(all_of, any_of, none_of, nested=nested, type_name=type_name))
+
+    def count(self, all_of: Iterable[int] = (), any_of: Iterable[int] = (), none_of: Iterable[int] = (),
+              nested: bool = False, type_name: str = None) -> int:
+        """Number of entities select() would return, without building the list"""
+        return bit_count(self.match(all_of, any_of, none_of, nested=nested, type_name=type_name))
+
+    def entity_ids(self, bitmap: int) -> List[int]:
+        """Entity ids of the ordinals set in bitmap, e.g. one combined from bitmap() calls"""
+        return [self._entity_ids[ordinal] for ordinal in bits_to_ordinals(bitmap)]
@@ -0,0 +1,315 @@
+"""
+Campaign-wide index of calendar events.
+
+EventIndex collects the EntityEvent subentries of every entity, converts their dates to day ordinals with the
+CalendarEngine of their calendar and answers "what happens between these two dates" with an interval tree per
+calendar. Recurring events are stored once, as the span from their first occurrence to recurring_until, and only
+expanded into occurrences for the range that is queried.
+
+    events = EventIndex.from_client(client)
+    events.attach(client)
+    events.this_week(calendar_id, "1372-3-4")
+"""
+
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union, Iterator
+
+import pykanka.bulk
+from pykanka.dates import CalendarEngine, CalendarDate, AnyDate
+from pykanka.exceptions import *
+
+FOREVER = 2 ** 62           # end ordinal of recurring events without recurring_until
+
+RECURRING_PERIODS = ("year", "month")
+
+
+@dataclass
+class Occurrence:
+    event_id:       int
+    entity_id:      int
+    calendar_id:    int
+    start:          int         # day ordinal of the first day
+    end:            int         # day ordinal of the last day
+    date:           CalendarDate
+    name:           Optional[str] = None
+    recurring:      bool = False
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed integer intervals. Each node keeps the intervals containing its center,
+    sorted by start and by end, so a query visits O(log n) nodes and slices out the overlapping intervals of each. Small
+    subtrees are kept as plain lists.
+    """
+
+    leaf_size = 16          # fewer intervals than this are scanned rather than split further
+
+    def __init__(self, intervals: Iterable[Tuple[int, int, Any]]):
+        """:param intervals: (start, end, item) with start <= end"""
+        self._root = self._build(sorted(intervals, key=lambda interval: interval[0]))
+
+    def _build(self, intervals: List[Tuple[int, int, Any]]) -> Optional[tuple]:
+        """:param intervals: sorted by start, which the partitions below keep, so nothing is sorted by start twice"""
+        if not intervals:
+            return None
+        if len(intervals) <= self.leaf_size:
+            return (intervals,)
+        middle = len(intervals) // 2
+        center = intervals[middle][0]
+        split = middle + 1
+        while split < len(intervals) and intervals[split][0] == center:
+            split += 1
+
+        right = intervals[split:]                           # starts after center
+        left = [interval for interval in intervals[:split] if interval[1] < center]
+        here = [interval for interval in intervals[:split] if interval[1] >= center]
+
+        by_end = sorted(here, key=lambda interval: -interval[1])
+        return (center, [interval[0] for interval in here], here, [-interval[1] for interval in by_end], by_end,
+                self._build(left), self._build(right))
+
+    def overlapping(self, low: int, high: int) -> List[Any]:
+        """Items of the intervals sharing at least one point with [low, high]"""
+        found = list()
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if len(node) == 1:
+                found.extend(interval[2] for interval in node[0] if interval[0] <= high and interval[1] >= low)
+                continue
+            center, starts, by_start, negative_ends, by_end, left, right = node
+            if high < center:                   # everything here ends at or after center, so it's enough to start in time
+                found.extend(interval[2] for interval in by_start[:bisect_right(starts, high)])
+                stack.append(left)
+            elif low > center:                  # everything here starts at or before center, so it's enough to end in time
+                found.extend(interval[2] for interval in by_end[:bisect_right(negative_ends, -low)])
+                stack.append(right)
+            else:
+                found.extend(interval[2] for interval in by_start)
+                stack.append(left)
+                stack.append(right)
+        return found
+
+
+@dataclass
+class _Event:
+    id:             int
+    entity_id:      int
+    calendar_id:    int
+    date:           CalendarDate
+    start:          int
+    length:         int
+    periodicity:    Optional[str]
+    until:          Optional[int]   # last year of a recurring event
+    name:           Optional[str]
+
+
+class EventIndex:
+    def __init__(self, calendars: Dict[int, CalendarEngine] = None):
+        """
+        :param calendars: CalendarEngine per calendar id. Events of other calendars are skipped.
+        """
+        self.calendars: Dict[int, CalendarEngine] = dict(calendars or dict())
+        self._events: Dict[int, _Event] = dict()                    # event id -> event
+        self._by_calendar: Dict[int, Dict[int, _Event]] = dict()    # calendar id -> event id -> event
+        self._trees: Dict[int, IntervalTree] = dict()               # built lazily, dropped when a calendar's events change
+        self._lock = threading.RLock()
+
+    # --- loading ---
+
+    @classmethod
+    def from_events(cls, calendars: Dict[int, CalendarEngine], events: Iterable[Dict[str, Any]]) -> "EventIndex":
+        """Builds the index from EntityEvent payloads"""
+        index = cls(calendars)
+        for event in events:
+            index._store(event)
+        return index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "EventIndex":
+        """
+        Builds the index from export records that include the "entity_events" subentries. Calendar records provide the
+        calendars, so they have to be part of the records as well.
+        """
+        calendars, events = dict(), list()
+        for record in records:
+            if record.get("type") == "calendar":
+                calendars[record["child_id"]] = CalendarEngine.from_data(record.get("child") or dict())
+            events.extend((record.get("subentries") or dict()).get("entity_events", []))
+        return cls.from_events(calendars, events)
+
+    @classmethod
+    def from_client(cls, client: "pykanka.KankaClient", max_workers: int = 8) -> "EventIndex":
+        """
+        Loads every calendar, then the events of every entity. There is no campaign-wide event listing, so this costs
+        one request per entity, max_workers of them at a time.
+        """
+        campaign_url = client.campaign_base_url
+        calendars = {calendar["id"]: CalendarEngine.from_data(calendar)
+                     for calendar in pykanka.bulk.iter_listing(client, f"{campaign_url}calendars", max_workers=4)}
+        entity_ids = (entity["id"] for entity in pykanka.bulk.iter_listing(client, f"{campaign_url}entities", max_workers=4))
+        events = (event for _, subentries in pykanka.bulk.fetch_subentries(client, entity_ids, ["entity_events"], max_workers=max_workers)
+                  for event in subentries["entity_events"])
+        return cls.from_events(calendars, events)
+
+    def attach(self, client: "pykanka.KankaClient"):
+        """Keeps the index current with event and calendar writes made through client"""
+        client.add_write_listener(self.on_write)
+
+    def detach(self, client: "pykanka.KankaClient"):
+        client.remove_write_listener(self.on_write)
+
+    def on_write(self, event: "pykanka.events.WriteEvent"):
+        if event.subentry_endpoint == "entity_events":
+            if event.method == "delete":
+                if len(event.path) > 3:
+                    self.remove(int(event.path[3]))
+            elif event.data:
+                self.add(event.data)
+        elif event.type_name == "calendar" and event.method != "delete" and event.data:
+            self.set_calendar(event.data["id"], CalendarEngine.from_data(event.data))
+
+    # --- updates ---
+
+    def add(self, event: Dict[str, Any]):
+        """Adds or replaces an event, given as an EntityEvent payload"""
+        with self._lock:
+            self.remove(event["id"])
+            self._store(event)
+
+    def remove(self, event_id: int):
+        with self._lock:
+            stored = self._events.pop(event_id, None)
+            if stored is not None:
+                del self._by_calendar[stored.calendar_id][event_id]
+                self._trees.pop(stored.calendar_id, None)
+
+    def set_calendar(self, calendar_id: int, engine: CalendarEngine):
+        """Adds or replaces a calendar. Its events are converted again, as months or leap years may have changed."""
+        with self._lock:
+            self.calendars[calendar_id] = engine
+            events = list(self._by_calendar.pop(calendar_id, dict()).values())
+            self._trees.pop(calendar_id, None)
+            for stored in events:
+                del self._events[stored.id]
+                self._store(dict(id=stored.id, entity_id=stored.entity_id, calendar_id=calendar_id, year=stored.date.year,
+                                 month=stored.date.month, day=stored.date.day, length=stored.length,
+                                 recurring_periodicity=stored.periodicity, recurring_until=stored.until, name=stored.name))
+
+    def _store(self, event: Dict[str, Any]):
+        engine = self.calendars.get(event.get("calendar_id"))
+        if engine is None:
+            return
+        try:
+            date = engine.validate(CalendarDate(int(event["year"]), int(event["month"]), int(event["day"])))
+        except (CalendarError, KeyError, TypeError, ValueError):
+            return                          # dates the calendar can't hold, e.g. after its months were changed
+
+        periodicity = event.get("recurring_periodicity") or None
+        stored = _Event(id=event["id"], entity_id=event.get("entity_id"), calendar_id=event["calendar_id"], date=date,
+                        start=engine.to_ordinal(date), length=max(int(event.get("length") or 1), 1),
+                        periodicity=periodicity if periodicity in RECURRING_PERIODS else None,
+                        until=event.get("recurring_until"), name=event.get("name") or event.get("comment"))
+        self._events[stored.id] = stored
+        self._by_calendar.setdefault(stored.calendar_id, dict())[stored.id] = stored
+        self._trees.pop(stored.calendar_id, None)
+
+    def _tree(self, calendar_id: int) -> IntervalTree:
+        tree = self._trees.get(calendar_id)
+        if tree is None:
+            engine = self.calendars[calendar_id]
+            intervals = list()
+            for stored in self._by_calendar.get(calendar_id, dict()).values():
+                end = stored.start + stored.length - 1
+                if stored.periodicity and stored.until is None:
+                    end = FOREVER
+                elif stored.periodicity and stored.until >= stored.date.year:      # up to the last day the last occurrence can reach
+                    end = engine.to_ordinal(CalendarDate(stored.until + 1, 1, 1)) + stored.length - 2
+                intervals.append((stored.start, end, stored))
+            tree = self._trees[calendar_id] = IntervalTree(intervals)
+        return tree
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def between(self, calendar_id: int, start: Union[AnyDate, int], end: Union[AnyDate, int]) -> List[Occurrence]:
+        """
+        Occurrences overlapping the days from start to end, both included, sorted by start.
+
+        :param calendar_id: Calendar to look at
+        :param start: First day, as a date or a day ordinal
+        :param end: Last day, as a date or a day ordinal
+        """
+        with self._lock:
+            if calendar_id not in self.calendars:
+                raise CalendarError(f"Calendar {calendar_id} isn't in the index")
+            engine = self.calendars[calendar_id]
+            low = start if isinstance(start, int) else engine.to_ordinal(start)
+            high = end if isinstance(end, int) else engine.to_ordinal(end)
+
+            occurrences = list()
+            first_months: Dict[int, Tuple[int, int]] = dict()     # event length -> first month an occurrence can start in
+            last = engine.from_ordinal(high)
+            for stored in self._tree(calendar_id).overlapping(low, high):
+                if stored.periodicity:
+                    first = first_months.get(stored.length)
+                    if first is None:
+                        first_day = engine.from_ordinal(low - stored.length + 1)
+                        first = first_months[stored.length] = (first_day.year, first_day.month)
+                    occurrences.extend(self._expand(engine, stored, first, (last.year, last.month), low, high))
+                else:
+                    occurrences.append(self._occurrence(stored, stored.start, stored.date))
+            occurrences.sort(key=lambda occurrence: (occurrence.start, occurrence.event_id))
+            return occurrences
+
+    def on(self, calendar_id: int, date: Union[AnyDate, int]) -> List[Occurrence]:
+        return self.between(calendar_id, date, date)
+
+    def this_week(self, calendar_id: int, date: AnyDate) -> List[Occurrence]:
+        """Occurrences in the week around date, from its first weekday to its last. Days of intercalary months are a week of their own."""
+        engine = self.calendars[calendar_id]
+        ordinal = engine.to_ordinal(date)
+        weekday = engine.weekday_index(date)
+        if weekday is None:
+            return self.on(calendar_id, ordinal)
+        return self.between(calendar_id, ordinal - weekday, ordinal - weekday + len(engine.weekdays) - 1)
+
+    def of_entity(self, entity_id: int) -> List[int]:
+        """Ids of the events of an entity"""
+        return [stored.id for stored in self._events.values() if stored.entity_id == entity_id]
+
+    def _expand(self, engine: CalendarEngine, stored: _Event, first: Tuple[int, int], last: Tuple[int, int], low: int,
+                high: int) -> Iterator[Occurrence]:
+        """Occurrences of a recurring event that overlap [low, high], starting between the months first and last"""
+        year, month = max(first, (stored.date.year, stored.date.month))
+        if stored.periodicity == "year":
+            if month > stored.date.month:
+                year += 1
+            month = stored.date.month
+        if stored.until is not None:
+            last = min(last, (stored.until, len(engine.months)))
+
+        while (year, month) <= last:
+            day = min(stored.date.day, engine.month_length(year, month))     # e.g. the 30th in a shorter month
+            if day >= 1:
+                start = engine.month_start(year, month) + day - 1
+                if low <= start + stored.length - 1 and start <= high:
+                    yield self._occurrence(stored, start, CalendarDate(year, month, day))
+
+            if stored.periodicity == "year":
+                year += 1
+            elif month == len(engine.months):
+                year, month = year + 1, 1
+            else:
+                month += 1
+
+    @staticmethod
+    def _occurrence(stored: _Event, start: int, date: CalendarDate) -> Occurrence:
+        return Occurrence(event_id=stored.id, entity_id=stored.entity_id, calendar_id=stored.calendar_id, start=start,
+                          end=start + stored.length - 1, date=date, name=stored.name, recurring=bool(stored.periodicity))
@@ -0,0 +1,275 @@
+"""
+Copying entities from one campaign into another.
+
+Ids are only meaningful within their campaign, so every reference is translated while copying: child fields such as
+location_id or tags point at child ids of the referenced type, while relation targets and map marker entities point
+at entity ids. Mentions such as [character:12] in entries and entity notes name entity ids as well. Entities are created
+in dependency order, one level at a time with all posts of a level sent concurrently. References that form a cycle,
+and mentions of entities created later, are left out of the first post and patched in afterwards.
+
+Tags are copied through the tags field of the child, which creates the entity tags, so the entity_tags subentries are
+skipped. Mirrored relations are copied as two separate relations: the API doesn't accept mirror_id, so the link
+between the two can't be recreated.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Iterable, Union, Tuple, Optional, Set
+
+import pykanka.child_types
+import pykanka.entity_subentries
+import pykanka.exporter
+
+# child fields holding the child id of another entity, and the type they point at
+reference_fields = dict(
+    parent_location_id="location",
+    location_id="location",
+    family_id="family",
+    race_id="race",
+    organisation_id="organisation",
+    character_id="character",
+    timeline_id="timeline",
+    note_id="note",
+    map_id="map",
+    tag_id="tag",
+    quest_id="quest",
+    journal_id="journal",
+    event_id="event",
+    ability_id="ability",
+)
+
+# subentry fields holding a child id, per endpoint
+_subentry_reference_fields = dict(
+    inventory=dict(item_id="item"),
+    entity_abilities=dict(ability_id="ability"),
+    entity_events=dict(calendar_id="calendar"),
+)
+
+_Node = Tuple[str, int]         # (type, child id in the source campaign)
+
+# raw mentions such as [character:12] or [location:7|the old mill], which name entity ids
+_mention = re.compile(r"\[(entity|" + "|".join(pykanka.child_types.child_type_dictionary) + r"):(\d+)(\|[^\]]*)?\]")
+
+_skipped_endpoints = {"entity_files", "entity_tags"}    # files need uploads, entity tags come with the child's tags
+
+
+@dataclass
+class CopyResult:
+    entities:   Dict[int, int] = field(default_factory=dict)                # source entity id -> target entity id
+    children:   Dict[str, Dict[int, int]] = field(default_factory=dict)     # type -> source child id -> target child id
+    subentries: int = 0
+    failures:   List["pykanka.batch.BatchOperation"] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def child_id(self, type_name: str, source_child_id: int) -> Optional[int]:
+        return self.children.get(type_name, dict()).get(source_child_id)
+
+
+def copy_campaign(source: "pykanka.KankaClient", target: "pykanka.KankaClient", types: Iterable[str] = None,
+                  subentries: Union[bool, Iterable[str]] = True, max_workers: int = 8) -> CopyResult:
+    """
+    Copies entities, and optionally their subentries, from the source campaign into the target campaign.
+    References to entities that aren't copied are dropped, mentions of them are replaced by their label.
+
+    :param source: KankaClient of the campaign to copy from
+    :param target: KankaClient of the campaign to copy into
+    :param types: Keys of child_type_dictionary to copy, all types if None
+    :param subentries: True for all subentries, or an iterable of subentry endpoints. Entity files are never copied.
+    :param max_workers: Maximum number of requests in flight at once
+    :return: CopyResult with the id mapping from source to target
+    """
+    records = {(record["type"], record["child_id"]): record
+               for record in pykanka.exporter.iter_records(source, types, subentries=subentries, max_workers=max_workers)}
+    result = CopyResult()
+    copied = {record["id"] for record in records.values()}
+
+    dependencies = {node: _references(record["child"], records) for node, record in records.items()}
+    deferred = dict()
+
+    for level in _levels(dependencies):
+        with target.batch(max_workers=max_workers) as batch:
+            posts = list()
+            for node in level:
+                payload, missing = _translate_child(records[node]["child"], records, copied, result)
+                if missing:
+                    deferred[node] = missing
+                cls = pykanka.child_types.child_type_dictionary[node[0]]
+                posts.append((node, cls.from_json(target, payload).post()))
+
+        for (type_name, child_id), op in posts:
+            if op.ok and op.data:
+                result.children.setdefault(type_name, dict())[child_id] = op.data["id"]
+                result.entities[records[(type_name, child_id)]["id"]] = op.data["entity_id"]
+            else:
+                result.failures.append(op)
+
+    with target.batch(max_workers=max_workers) as batch:       # second pass for cycles and mentions of later entities
+        for node, fields in deferred.items():
+            new_child_id = result.child_id(*node)
+            if new_child_id is None:
+                continue
+            payload, _ = _translate_child(records[node]["child"], records, copied, result)
+            payload["id"] = new_child_id
+            cls = pykanka.child_types.child_type_dictionary[node[0]]
+            cls.from_json(target, payload).patch(**{name: payload[name] for name in fields if payload.get(name) is not None})
+    result.failures.extend(batch.errors)
+
+    with target.batch(max_workers=max_workers) as batch:
+        for record in records.values():
+            new_entity_id = result.entities.get(record["id"])
+            if new_entity_id is None:
+                continue
+            for endpoint, entries in (record.get("subentries") or dict()).items():
+                for entry in entries:
+                    if _copy_subentry(target, endpoint, entry, record, new_entity_id, copied, result):
+                        result.subentries += 1
+    result.failures.extend(batch.errors)
+    result.subentries -= len(batch.errors)
+
+    return result
+
+
+def _references(child: Dict[str, Any], records: Dict[_Node, Dict[str, Any]]) -> Set[_Node]:
+    """Nodes among the copied records that a child refers to"""
+    found = set()
+    for name, type_name in reference_fields.items():
+        if (type_name, child.get(name)) in records:
+            found.add((type_name, child[name]))
+    for tag_id in child.get("tags") or []:
+        if ("tag", tag_id) in records:
+            found.add(("tag", tag_id))
+    return found
+
+
+def _levels(dependencies: Dict[_Node, Set[_Node]]) -> List[List[_Node]]:
+    """
+    Groups nodes into levels that only depend on earlier levels. If the remaining nodes all wait on each other,
+    the one with the fewest open references and the most nodes waiting on it is created next, and its open references
+    are deferred to the second pass.
+    """
+    remaining = {node: set(deps) - {node} for node, deps in dependencies.items()}
+    levels = list()
+
+    while remaining:
+        level = [node for node, deps in remaining.items() if not deps]
+        if not level:
+            waiting = dict()                # only cycles and nodes depending on them are left
+            for deps in remaining.values():
+                for dep in deps:
+                    waiting[dep] = waiting.get(dep, 0) + 1
+            level = [min(remaining, key=lambda node: (len(remaining[node]), -waiting.get(node, 0), node))]
+
+        levels.append(sorted(level))
+        for node in level:
+            remaining.pop(node)
+        done = set(level)
+        for deps in remaining.values():
+            deps -= done
+
+    return levels
+
+
+def _translate(value, type_name: str, result: CopyResult):
+    if isinstance(value, list):
+        translated = [result.child_id(type_name, item) for item in value]
+        return [item for item in translated if item is not None]
+    return result.child_id(type_name, value)
+
+
+def _translate_mentions(text: Optional[str], copied: Set[int], result: CopyResult) -> Tuple[Optional[str], bool]:
+    """
+    Returns text with the entity ids of its raw mentions translated, and whether it mentions copied entities that
+    don't exist in the target yet. Mentions that can't be translated are replaced by their label, if they have one.
+    """
+    if not text or "[" not in text:
+        return text, False
+    pending = False
+
+    def replace(match):
+        nonlocal pending
+        translated = result.entities.get(int(match.group(2)))
+        if translated is not None:
+            return f"[{match.group(1)}:{translated}{match.group(3) or ''}]"
+        pending = pending or int(match.group(2)) in copied
+        return (match.group(3) or "|")[1:]
+
+    return _mention.sub(replace, text), pending
+
+
+def _translate_child(child: Dict[str, Any], records: Dict[_Node, Dict[str, Any]], copied: Set[int],
+                     result: CopyResult) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Returns the child payload with references translated to target ids, and the references to copied entities
+    that don't exist in the target yet.
+    """
+    payload = dict(child)
+    missing = dict()
+
+    for name, type_name in reference_fields.items():
+        if payload.get(name) is None:
+            continue
+        translated = result.child_id(type_name, payload[name])
+        if translated is None and (type_name, payload[name]) in records:
+            missing[name] = payload[name]
+        payload[name] = translated
+
+    if payload.get("tags"):
+        untranslated = [tag_id for tag_id in payload["tags"] if result.child_id("tag", tag_id) is None and ("tag", tag_id) in records]
+        if untranslated:
+            missing["tags"] = payload["tags"]
+        payload["tags"] = _translate(payload["tags"], "tag", result)
+
+    if payload.get("entry"):
+        payload["entry"], pending = _translate_mentions(payload["entry"], copied, result)
+        if pending:
+            missing["entry"] = child["entry"]
+
+    if "center_marker_id" in payload:
+        payload["center_marker_id"] = None              # markers are recreated with new ids
+    return payload, missing
+
+
+def _copy_subentry(target: "pykanka.KankaClient", endpoint: str, entry: Dict[str, Any], record: Dict[str, Any],
+                   new_entity_id: int, copied: Set[int], result: CopyResult) -> bool:
+    """Queues the post of one subentry. Returns False if it can't be copied because its reference wasn't copied."""
+    if endpoint == "map_markers":
+        values = {key: value for key, value in entry.items() if key not in {"id", "map_id", "created_at", "updated_at",
+                                                                           "created_by", "updated_by"}}
+        if values.get("entity_id") is not None:
+            values["entity_id"] = result.entities.get(values["entity_id"])
+            if values["entity_id"] is None:
+                values.pop("entity_id")
+        target.request_post(f"{target.campaign_base_url}maps/{result.child_id('map', record['child_id'])}/map_markers",
+                            data={key: value for key, value in values.items() if value is not None})
+        return True
+
+    if endpoint in _skipped_endpoints or endpoint not in pykanka.entity_subentries.subentry_type_dictionary:
+        return False
+
+    cls = pykanka.entity_subentries.subentry_type_dictionary[endpoint]
+    values = {key: value for key, value in entry.items() if key in cls._possible and value is not None}
+    if "entry" in values:
+        values["entry"], _ = _translate_mentions(values["entry"], copied, result)
+
+    for name, type_name in _subentry_reference_fields.get(endpoint, dict()).items():
+        if name in values:
+            values[name] = result.child_id(type_name, values[name])
+            if values[name] is None:
+                if endpoint == "inventory" and entry.get("name"):
+                    values.pop(name)        # inventory entries can stand on their own with just a name
+                else:
+                    return False
+
+    if cls is pykanka.entity_subentries.Relation:
+        values["owner_id"] = new_entity_id
+        values["target_id"] = result.entities.get(entry.get("target_id"))
+        if values["target_id"] is None:
+            return False
+    else:
+        values["entity_id"] = new_entity_id
+
+    cls(_client=target, **values).post()
+    return True
@@ -9,5 +9,9 @@ setup(
     description="A wrapper for the kanka.io API, currently providing basic get/patch/post functionality for most entity classes",
     author="Spectre",
     packages=["pykanka"],
-    install_requires=["requests", "tenacity"]
+    install_requires=["requests", "tenacity"],
+    extras_require={
+        "numpy": ["numpy"],
+        "arrow": ["pyarrow"],
+    }
 )
@@ -0,0 +1,388 @@
+"""
+An in-memory Kanka campaign for tests that don't need recorded cassettes.
+
+FakeCampaign answers the requests a KankaClient sends: child and entity listings (paginated, with lastSync and
+filter parameters), single children and entities, entity subentries, the campaign's relations, map markers, search,
+and posts, patches and deletes of all of them. It replaces requests.Session.request while patched, so everything above
+it, including KankaClient._request and the write listeners, runs as it would against the API.
+
+    campaign = FakeCampaign()
+    guard = campaign.add("character", name="Guard", location_id=3)
+    with campaign.patch():
+        client = KankaClient("token", campaign.campaign_id)
+        ...
+    campaign.requests_to("characters")
+"""
+
+import json
+import threading
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Tuple, Optional
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs, urlencode, unquote
+
+import requests
+
+from pykanka import KankaClient
+from pykanka.child_types import child_type_dictionary
+
+API_URL = "https://kanka.io/api/1.0/campaigns/"
+
+_endpoint_types = {cls.endpoint: type_name for type_name, cls in child_type_dictionary.items()}
+
+
+def timestamp(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def make_response(status: int, payload: Any = None, url: str = "") -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = {200: "OK", 201: "Created", 204: "No Content", 404: "Not Found"}.get(status, "Error")
+    response.url = url
+    response._content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+class FakeCampaign:
+    def __init__(self, campaign_id: int = 1, per_page: int = 3):
+        """
+        :param campaign_id: Id the client has to use
+        :param per_page: Page size of every listing, small so that tests walk several pages
+        """
+        self.campaign_id = campaign_id
+        self.per_page = per_page
+        self.base_url = f"{API_URL}{campaign_id}/"
+        self.now = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+        self.entities: Dict[int, Dict[str, Any]] = dict()                  # entity id -> {"type": ..., "child": ...}
+        self.subentries: Dict[Tuple[int, str], List[Dict[str, Any]]] = dict()
+        self.map_markers: Dict[int, List[Dict[str, Any]]] = dict()          # map child id -> markers
+        self.requests: List[Tuple[str, str, Dict[str, Any]]] = list()       # (method, url, keyword arguments)
+
+        self._failures: List[List] = list()                                 # [url part, status, remaining]
+        self._next_child_id: Dict[str, int] = dict()
+        self._next_entity_id = 1
+        self._next_subentry_id = 1
+        self._lock = threading.RLock()
+
+    # --- setting up ---
+
+    def tick(self, seconds: float = 1.):
+        self.now += timedelta(seconds=seconds)
+
+    def add(self, type_name: str, **fields) -> Dict[str, Any]:
+        """Creates an entity of a type and returns a copy of its child payload. Child fields are taken from fields."""
+        with self._lock:
+            self.tick()
+            child_id = fields.pop("id", None) or self._next_child_id.get(type_name, 1)
+            self._next_child_id[type_name] = max(self._next_child_id.get(type_name, 1), child_id + 1)
+            entity_id = fields.pop("entity_id", None) or self._next_entity_id
+            self._next_entity_id = max(self._next_entity_id, entity_id + 1)
+
+            child = dict(name=None, entry=None, is_private=False, tags=[], created_at=timestamp(self.now))
+            child.update(fields)
+            child.update(id=child_id, entity_id=entity_id, updated_at=timestamp(self.now))
+            self.entities[entity_id] = dict(type=type_name, child=child)
+
+            tags = child["tags"] or []
+            child["tags"] = []
+            for tag_id in tags:
+                self._add_entity_tag(entity_id, tag_id)
+            return dict(child)
+
+    def add_subentry(self, entity_id: int, endpoint: str, **fields) -> Dict[str, Any]:
+        """Adds a subentry such as an attribute (endpoint "attributes") to an entity and returns a copy of it"""
+        with self._lock:
+            if endpoint == "entity_tags":
+                return dict(self._add_entity_tag(entity_id, fields["tag_id"]))
+            return dict(self._add_subentry(entity_id, endpoint, fields))
+
+    def add_map_marker(self, map_id: int, **fields) -> Dict[str, Any]:
+        with self._lock:
+            marker = dict(fields, id=self._subentry_id(), map_id=map_id)
+            self.map_markers.setdefault(map_id, []).append(marker)
+            return dict(marker)
+
+    def update(self, entity_id: int, **fields) -> Dict[str, Any]:
+        """Changes an entity's child as if it was edited in the browser, moving its updated_at forward"""
+        with self._lock:
+            self.tick()
+            child = self.entities[entity_id]["child"]
+            child.update(fields, updated_at=timestamp(self.now))
+            return dict(child)
+
+    def remove(self, entity_id: int):
+        """Deletes an entity and its subentries"""
+        with self._lock:
+            self.entities.pop(entity_id, None)
+            for key in [key for key in self.subentries if key[0] == entity_id]:
+                del self.subentries[key]
+
+    def child(self, type_name: str, child_id: int) -> Optional[Dict[str, Any]]:
+        for entity in self.entities.values():
+            if entity["type"] == type_name and entity["child"]["id"] == child_id:
+                return entity["child"]
+        return None
+
+    def children(self, type_name: str) -> List[Dict[str, Any]]:
+        return [entity["child"] for _, entity in sorted(self.entities.items()) if entity["type"] == type_name]
+
+    def fail(self, url_part: str, status: int = 500, times: int = 1):
+        """Makes the next `times` requests whose url contains url_part answer with status"""
+        with self._lock:
+            self._failures.append([url_part, status, times])
+
+    def requests_to(self, path: str, method: str = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Requests whose path relative to the campaign starts with path, e.g. "characters" or "entities/4/attributes" """
+        return [request for request in self.requests
+                if urlsplit(request[1]).path[len(urlsplit(self.base_url).path):].startswith(path)
+                and (method is None or request[0] == method)]
+
+    @contextmanager
+    def patch(self, *others: "FakeCampaign"):
+        """Routes every request made through requests.Session to this campaign, or to one of others by campaign url"""
+        def request(session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+            campaign = next((other for other in others if url.startswith(other.base_url)), self)
+            return campaign.request(method, url, **kwargs)
+
+        with mock.patch.object(requests.Session, "request", request):
+            yield self
+
+    # --- answering requests ---
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        with self._lock:
+            self.requests.append((method, url, kwargs))
+            for failure in self._failures:
+                if failure[0] in url and failure[2] > 0:
+                    failure[2] -= 1
+                    return make_response(failure[1], dict(message="failure"), url)
+
+            if not url.startswith(self.base_url):
+                return make_response(404, dict(message=f"unknown campaign in {url}"), url)
+
+            parts = urlsplit(url)
+            path = [unquote(segment) for segment in parts.path[len(urlsplit(self.base_url).path):].split("/") if segment]
+            params = parse_qs(parts.query)
+            payload = dict(kwargs.get("data") or kwargs.get("json") or dict())
+
+            handler = getattr(self, f"_{method.lower()}", None)
+            result = handler(path, params, payload) if handler else None
+            if result is None:
+                return make_response(404, dict(message=f"no route for {method} {url}"), url)
+            status, content = result
+            return make_response(status, content, url)
+
+    def _get(self, path: List[str], params: Dict[str, List[str]], payload) -> Optional[Tuple[int, Any]]:
+        if path[:1] == ["search"] and len(path) == 2:
+            term = path[1].lower()
+            hits = [dict(id=entity["child"]["id"], entity_id=entity_id, name=entity["child"]["name"], type=entity["type"],
+                         is_private=entity["child"].get("is_private"), url=f"{self.base_url}entities/{entity_id}")
+                    for entity_id, entity in sorted(self.entities.items()) if term in (entity["child"]["name"] or "").lower()]
+            return 200, dict(data=hits)
+
+        if path == ["relations"]:
+            return self._page(path, params, [relation for (_, endpoint), entries in sorted(self.subentries.items())
+                                             if endpoint == "relations" for relation in entries])
+
+        if path[:1] == ["entities"]:
+            if len(path) == 1:
+                return self._page(path, params, [self._entity_entry(entity_id) for entity_id in sorted(self.entities)])
+            entity_id = int(path[1])
+            if entity_id not in self.entities:
+                return 404, dict(message="entity not found")
+            if len(path) == 2:
+                return 200, dict(data=dict(self._entity_entry(entity_id), child=dict(self.entities[entity_id]["child"])))
+            entries = self._subentry_list(entity_id, path[2])
+            if len(path) == 3:
+                return self._page(path, params, entries)
+            found = [entry for entry in entries if entry["id"] == int(path[3])]
+            return (200, dict(data=found[0])) if found else (404, dict(message="subentry not found"))
+
+        type_name = _endpoint_types.get(path[0]) if path else None
+        if type_name is None:
+            return None
+        if len(path) == 1:
+            return self._page(path, params, [dict(child) for child in self.children(type_name)])
+        child = self.child(type_name, int(path[1]))
+        if child is None:
+            return 404, dict(message="not found")
+        if len(path) == 2:
+            return 200, dict(data=dict(child))
+        if path[2] == "map_markers":
+            markers = self.map_markers.get(child["id"], [])
+            if len(path) == 3:
+                return self._page(path, params, markers)
+            found = [marker for marker in markers if marker["id"] == int(path[3])]
+            return (200, dict(data=found[0])) if found else (404, dict(message="marker not found"))
+        return None
+
+    def _post(self, path: List[str], params, payload: Dict[str, Any]) -> Optional[Tuple[int, Any]]:
+        self.tick()
+        if path[:1] == ["entities"] and len(path) == 3:
+            entity_id = int(path[1])
+            if entity_id not in self.entities:
+                return 404, dict(message="entity not found")
+            if path[2] == "entity_tags":
+                return 201, dict(data=self._add_entity_tag(entity_id, int(payload["tag_id"])))
+            return 201, dict(data=self._add_subentry(entity_id, path[2], payload))
+
+        type_name = _endpoint_types.get(path[0]) if path else None
+        if type_name is None:
+            return None
+        if len(path) == 3 and path[2] == "map_markers":
+            marker = dict(payload, id=self._subentry_id(), map_id=int(path[1]))
+            self.map_markers.setdefault(int(path[1]), []).append(marker)
+            return 201, dict(data=marker)
+        if len(path) != 1:
+            return None
+        if not payload.get("name"):
+            return 422, dict(message="The name field is required.")
+        return 201, dict(data=self.add(type_name, **payload))
+
+    def _patch(self, path: List[str], params, payload: Dict[str, Any]) -> Optional[Tuple[int, Any]]:
+        self.tick()
+        if path[:1] == ["entities"] and len(path) == 4:
+            entries = self._subentry_list(int(path[1]), path[2])
+            for entry in entries:
+                if entry["id"] == int(path[3]):
+                    entry.update(payload, updated_at=timestamp(self.now))
+                    return 200, dict(data=dict(entry))
+            return 404, dict(message="subentry not found")
+
+        type_name = _endpoint_types.get(path[0]) if path else None
+        if type_name is None or len(path) < 2:
+            return None
+        child = self.child(type_name, int(path[1]))
+        if child is None:
+            return 404, dict(message="not found")
+        if len(path) == 4 and path[2] == "map_markers":
+            for marker in self.map_markers.get(child["id"], []):
+                if marker["id"] == int(path[3]):
+                    marker.update(payload)
+                    return 200, dict(data=dict(marker))
+            return 404, dict(message="marker not found")
+        return 200, dict(data=self.update(child["entity_id"], **payload))
+
+    _put = _patch
+
+    def _delete(self, path: List[str], params, payload) -> Optional[Tuple[int, Any]]:
+        if path[:1] == ["entities"]:
+            entity_id = int(path[1])
+            if len(path) == 2:
+                if entity_id not in self.entities:
+                    return 404, dict(message="entity not found")
+                self.remove(entity_id)
+                return 204, None
+            entries = self._subentry_list(entity_id, path[2])
+            for entry in list(entries):
+                if entry["id"] == int(path[3]):
+                    entries.remove(entry)
+                    if path[2] == "entity_tags":
+                        self.entities[entity_id]["child"]["tags"].remove(entry["tag_id"])
+                    return 204, None
+            return 404, dict(message="subentry not found")
+
+        type_name = _endpoint_types.get(path[0]) if path else None
+        if type_name is None or len(path) < 2:
+            return None
+        child = self.child(type_name, int(path[1]))
+        if child is None:
+            return 404, dict(message="not found")
+        if len(path) == 4 and path[2] == "map_markers":
+            markers = self.map_markers.get(child["id"], [])
+            self.map_markers[child["id"]] = [marker for marker in markers if marker["id"] != int(path[3])]
+            return 204, None
+        self.remove(child["entity_id"])
+        return 204, None
+
+    # --- helpers ---
+
+    def _entity_entry(self, entity_id: int) -> Dict[str, Any]:
+        entity = self.entities[entity_id]
+        child = entity["child"]
+        return dict(id=entity_id, name=child["name"], type=entity["type"], child_id=child["id"], campaign_id=self.campaign_id,
+                    is_private=child.get("is_private"), tags=list(child.get("tags") or []),
+                    created_at=child.get("created_at"), updated_at=child["updated_at"])
+
+    def _subentry_id(self) -> int:
+        subentry_id = self._next_subentry_id
+        self._next_subentry_id += 1
+        return subentry_id
+
+    def _subentry_list(self, entity_id: int, endpoint: str) -> List[Dict[str, Any]]:
+        return self.subentries.setdefault((entity_id, endpoint), [])
+
+    def _add_subentry(self, entity_id: int, endpoint: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        owner = dict(owner_id=entity_id) if endpoint == "relations" else dict(entity_id=entity_id)
+        entry = dict(fields, id=self._subentry_id(), created_at=timestamp(self.now), updated_at=timestamp(self.now), **owner)
+        self._subentry_list(entity_id, endpoint).append(entry)
+        return entry
+
+    def _add_entity_tag(self, entity_id: int, tag_id: int) -> Dict[str, Any]:
+        """Entity tags and the tags list of the child are two views of the same thing, as in Kanka"""
+        entry = self._add_subentry(entity_id, "entity_tags", dict(tag_id=tag_id))
+        self.entities[entity_id]["child"]["tags"].append(tag_id)
+        return entry
+
+    def _page(self, path: List[str], params: Dict[str, List[str]], entries: List[Dict[str, Any]]) -> Tuple[int, Any]:
+        if "lastSync" in params:
+            since = _parse_timestamp(params["lastSync"][0])
+            entries = [entry for entry in entries if entry.get("updated_at") and _parse_timestamp(entry["updated_at"]) >= since]
+
+        for key, values in params.items():
+            if key in ("page", "lastSync"):
+                continue
+            if key == "tags[]":
+                wanted = {int(value) for value in values}
+                entries = [entry for entry in entries if wanted.issubset(entry.get("tags") or [])]
+            elif key == "name":         # lenient like Kanka: matches substrings
+                entries = [entry for entry in entries if values[0].lower() in (entry.get("name") or "").lower()]
+            else:
+                entries = [entry for entry in entries if _query_value(entry.get(key)) == values[0]]
+
+        page = int(params.get("page", ["1"])[0])
+        last_page = max(1, -(-len(entries) // self.per_page))
+        start = (page - 1) * self.per_page
+        data = [dict(entry) for entry in entries[start:start + self.per_page]]
+
+        url = f"{self.base_url}{'/'.join(path)}"
+        query = {key: values[0] if len(values) == 1 else values for key, values in params.items() if key != "page"}
+
+        def page_url(number):
+            return f"{url}?{urlencode(dict(query, page=number), doseq=True)}"
+
+        return 200, dict(
+            data=data,
+            links=dict(first=page_url(1), last=page_url(last_page), prev=page_url(page - 1) if page > 1 else None,
+                       next=page_url(page + 1) if page < last_page else None),
+            meta=dict(current_page=page, per_page=self.per_page, last_page=last_page, total=len(entries),
+                      path=url, **{"from": start + 1 if data else None, "to": start + len(data) if data else None}),
+        )
+
+
+def _query_value(value) -> str:
+    """How a field value looks as a query parameter"""
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+class FakeCampaignTest(unittest.TestCase):
+    """Base class for tests against a FakeCampaign: self.client sends every request to self.campaign."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.campaign = FakeCampaign()
+        patcher = self.campaign.patch()
+        patcher.__enter__()
+        self.addCleanup(patcher.__exit__, None, None, None)
+        self.client = KankaClient("token", self.campaign.campaign_id, cache_duration=0)
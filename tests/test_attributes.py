@@ -0,0 +1,98 @@
+import importlib.util
+import math
+import unittest
+
+from pykanka.attributes import AttributeMatrix, parse_number
+from pykanka.exceptions import WrongParametersPassedToEntity
+from library.fake_campaign import FakeCampaignTest
+
+
+def attribute(name, value, default_order=0, type=None):
+    return dict(name=name, value=value, default_order=default_order, type=type)
+
+
+ATTRIBUTES = [
+    (1, [attribute("STR", "14"), attribute("HP", "30"), attribute("Attack", "1d6+2")]),
+    (2, [attribute("STR", "+8"), attribute("HP", "45", default_order=2), attribute("HP", "12", default_order=1)]),
+    (3, [attribute("Stats", None, type="section"), attribute("DEX", "-0.5"), attribute("HP", "")]),
+]
+
+
+class TestParseNumber(unittest.TestCase):
+    def test_numbers(self):
+        self.assertEqual([parse_number(value) for value in ("14", " +2 ", "-0.5", ".5", "1e3", 7, True)],
+                         [14., 2., -.5, .5, 1000., 7., 1.])
+        self.assertEqual([parse_number(value) for value in ("1d6", "", "12 gp", None, [1])], [None] * 5)
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "needs numpy")
+class TestAttributeMatrix(unittest.TestCase):
+    def setUp(self) -> None:
+        self.matrix = AttributeMatrix.from_attributes(ATTRIBUTES)
+
+    def test_pivot(self):
+        self.assertEqual(self.matrix.names, ["STR", "HP", "Attack", "DEX"])
+        self.assertEqual(self.matrix.shape, (3, 4))
+        self.assertEqual(self.matrix.row(2), dict(STR=8., HP=12.))          # the first HP in default_order
+        self.assertEqual(self.matrix.present("HP").tolist(), [True, True, False])
+        self.assertTrue(math.isnan(self.matrix.column("STR")[2]))
+        self.assertEqual(self.matrix.get(3, "HP", default=-1.), -1.)
+        self.assertEqual(self.matrix.text(1, "Attack"), "1d6+2")
+        self.assertIsNone(self.matrix.text(3, "HP"))
+
+    def test_fixed_names(self):
+        matrix = AttributeMatrix.from_attributes(ATTRIBUTES, names=["HP", "Missing"])
+
+        self.assertEqual(matrix.names, ["HP", "Missing"])
+        self.assertEqual(matrix.column("HP")[:2].tolist(), [30., 12.])
+        self.assertFalse(matrix.present("Missing").any())
+
+    def test_queries(self):
+        self.assertEqual(self.matrix.entities(self.matrix.column("HP") > 20), [1])
+        self.assertEqual(self.matrix.rank("HP"), [(1, 30.), (2, 12.)])
+        self.assertEqual(self.matrix.rank("STR", descending=False, limit=1), [(2, 8.)])
+        self.assertAlmostEqual(float(self.matrix.masked().mean(axis=0)[0]), 11.)
+
+        summary = self.matrix.summary()
+        self.assertEqual((summary["STR"]["count"], summary["STR"]["min"], summary["STR"]["median"]), (2., 8., 11.))
+        self.assertTrue(math.isnan(summary["Attack"]["mean"]))
+
+    def test_subset(self):
+        subset = self.matrix.subset(self.matrix.present("STR"), names=["Attack", "STR"])
+
+        self.assertEqual(subset.entity_ids.tolist(), [1, 2])
+        self.assertEqual(subset.row(1), dict(STR=14.))
+        self.assertEqual(subset.text(1, "Attack"), "1d6+2")
+
+    def test_unknown_rows_and_columns(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.matrix.column("CHA")
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.matrix.row(99)
+
+    def test_records(self):
+        matrix = AttributeMatrix.from_records([dict(id=1, subentries=dict(attributes=[attribute("HP", "3")])),
+                                               dict(id=2, subentries=dict(relations=[]))])
+
+        self.assertEqual(matrix.entity_ids.tolist(), [1])
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "needs numpy")
+class TestAttributeMatrixClient(FakeCampaignTest):
+    def test_loads_every_entity_of_a_type(self):
+        ids = [self.campaign.add("character", name=name)["entity_id"] for name in ("Anna", "Bert", "Carl", "Dora")]
+        for entity_id, hp in zip(ids, ("10", "25", "d4", "7")):
+            self.campaign.add_subentry(entity_id, "attributes", name="HP", value=hp, default_order=0)
+        self.campaign.add("location", name="Mill")
+
+        matrix = AttributeMatrix.from_client(self.client, type_name="character", names=["HP"])
+
+        self.assertEqual(matrix.entity_ids.tolist(), ids)
+        self.assertEqual(matrix.rank("HP", limit=2), [(ids[1], 25.), (ids[0], 10.)])
+        self.assertEqual(AttributeMatrix.from_client(self.client, entity_ids=ids[2:]).text(ids[2], "HP"), "d4")
+        with self.assertRaises(WrongParametersPassedToEntity):
+            AttributeMatrix.from_client(self.client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from pykanka.batch import BatchOperation
+from pykanka.child_types import Character
+from pykanka.exceptions import BatchError
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestBatch(FakeCampaignTest):
+    def test_writes_are_queued_until_the_block_ends(self):
+        guard = Character.from_json(self.client, self.campaign.add("character", name="Guard"))
+
+        with self.client.batch() as batch:
+            operation = guard.patch(name="Captain")
+            self.assertIsInstance(operation, BatchOperation)
+            self.assertEqual(self.campaign.requests_to("characters", method="patch"), [])
+
+        self.assertTrue(operation.ok)
+        self.assertEqual(operation.data["name"], "Captain")
+        self.assertEqual(self.campaign.child("character", guard.data.id)["name"], "Captain")
+        self.assertEqual(batch.errors, [])
+
+    def test_patches_to_the_same_url_are_merged(self):
+        guard = Character.from_json(self.client, self.campaign.add("character", name="Guard"))
+
+        with self.client.batch() as batch:
+            first = guard.patch(name="Captain")
+            second = guard.patch(name="Captain", title="of the watch")
+
+        self.assertEqual(len(self.campaign.requests_to("characters", method="patch")), 1)
+        self.assertTrue(second.coalesced)
+        self.assertIs(second.response, first.response)
+        self.assertEqual(self.campaign.child("character", guard.data.id)["title"], "of the watch")
+        self.assertEqual(len(batch.results), 2)
+
+    def test_posts_are_sent_before_patches_and_deletes(self):
+        doomed = Character.from_json(self.client, self.campaign.add("character", name="Doomed"))
+        guard = Character.from_json(self.client, self.campaign.add("character", name="Guard"))
+
+        with self.client.batch():
+            doomed.delete()
+            guard.patch(name="Captain")
+            Character(self.client).post(name="Recruit")
+
+        methods = [method for method, _, _ in self.campaign.requests_to("characters")]
+        self.assertEqual(methods, ["post", "patch", "delete"])
+
+    def test_failures_are_collected_or_raised(self):
+        guard = Character.from_json(self.client, self.campaign.add("character", name="Guard"))
+        self.campaign.fail(f"characters/{guard.data.id}", status=422)
+
+        with self.client.batch() as batch:
+            failing = guard.patch(name="Captain")
+        self.assertFalse(failing.ok)
+        self.assertEqual(batch.errors, [failing])
+
+        self.campaign.fail(f"characters/{guard.data.id}", status=422)
+        with self.assertRaises(BatchError):
+            with self.client.batch(raise_on_error=True):
+                guard.patch(name="Captain")
+
+    def test_only_one_batch_at_a_time(self):
+        with self.client.batch():
+            with self.assertRaises(BatchError):
+                self.client.batch().__enter__()
+
+
+if __name__ == '__main__':
+    unittest.main()
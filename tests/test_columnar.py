@@ -0,0 +1,87 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from pykanka.columnar import write_tables, read_table, FORMATS
+from pykanka.exceptions import WrongParametersPassedToEntity
+from library.fake_campaign import FakeCampaignTest
+
+RECORDS = [
+    dict(id=1, type="character", child_id=10, child=dict(id=10, name="Anna", age="31", is_dead=0, tags=[4, 5],
+                                                        updated_at="2021-01-02T03:04:05.000000Z"),
+         subentries=dict(attributes=[dict(id=100, name="Strength", value=12), dict(id=101, name="Notes", value=None)])),
+    dict(id=2, type="character", child_id=11, child=dict(id=11, name="Bert", age="unknown", tags=[dict(id=6)])),
+    dict(id=3, type="location", child_id=20, child=dict(id=20, name="Mill"),
+         subentries=dict(unknown_endpoint=[dict(id=1)])),
+    dict(id=4, type="character", child_id=12, child=dict(id=12, name="Carl")),
+]
+
+
+def column(path, name):
+    # per column, as to_pydict() would convert the UTC timestamps, which needs pytz or zoneinfo
+    return read_table(path).column(name).to_pylist()
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+class TestColumnar(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip(self):
+        for format in FORMATS:
+            with self.subTest(format=format):
+                directory = os.path.join(self.directory, format)
+
+                rows = write_tables(RECORDS, directory, format=format, batch_size=2)
+
+                self.assertEqual(rows, dict(character=3, attributes=2, location=1))
+                characters = os.path.join(directory, f"character{FORMATS[format]}")
+                self.assertEqual(column(characters, "name"), ["Anna", "Bert", "Carl"])
+                self.assertEqual(column(characters, "entity_id"), [1, 2, 4])
+                self.assertEqual(column(characters, "age"), [31, None, None])
+                self.assertEqual(column(characters, "is_dead"), [False, None, None])
+                self.assertEqual(column(characters, "tags"), [[4, 5], [6], None])
+                updated_at = read_table(characters).column("updated_at")
+                self.assertEqual(str(updated_at.type), "timestamp[us, tz=UTC]")
+                self.assertEqual(updated_at.cast("int64").to_pylist()[0],
+                                 int(datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc).timestamp()) * 1000000)
+
+                attributes = os.path.join(directory, f"attributes{FORMATS[format]}")
+                self.assertEqual(column(attributes, "entity_id"), [1, 1])
+                self.assertEqual(column(attributes, "value"), ["12", None])
+
+    def test_unknown_format(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            write_tables(RECORDS, self.directory, format="csv")
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+class TestColumnarExport(FakeCampaignTest):
+    def test_export_writes_one_table_per_type_and_endpoint(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        anna = self.campaign.add("character", name="Anna", age=31)
+        self.campaign.add("character", name="Bert")
+        self.campaign.add("location", name="Mill")
+        self.campaign.add_subentry(anna["entity_id"], "attributes", name="Strength", value="12")
+
+        progress = self.client.export(directory.name, types=["character", "location"], subentries=["attributes"], format="arrow")
+
+        self.assertEqual(sorted(os.listdir(directory.name)), ["attributes.arrow", "character.arrow", "location.arrow"])
+        self.assertEqual(progress.entities, 3)
+        self.assertEqual(progress.bytes_written, sum(os.path.getsize(os.path.join(directory.name, name))
+                                                     for name in os.listdir(directory.name)))
+        self.assertEqual(sorted(column(os.path.join(directory.name, "character.arrow"), "name")), ["Anna", "Bert"])
+        self.assertEqual(column(os.path.join(directory.name, "attributes.arrow"), "entity_id"), [anna["entity_id"]])
+
+    def test_tables_cant_be_compressed(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.client.export(tempfile.gettempdir(), format="parquet", compression="gzip")
+
+
+if __name__ == '__main__':
+    unittest.main()
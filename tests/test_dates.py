@@ -0,0 +1,102 @@
+import importlib.util
+import unittest
+
+from pykanka.dates import CalendarEngine, CalendarDate, Month
+from pykanka.exceptions import CalendarError
+
+# the calendar payload of TestCalendar in tests.py
+CALENDAR = {
+    "name": "Georgian Calendar",
+    "date": "311-2-3",
+    "months": [
+        {"name": "January", "length": 31, "type": "standard"},
+        {"name": "February", "length": 5, "type": "intercalary"},
+    ],
+    "start_offset": 0,
+    "weekdays": ["Sul", "Mol", "Zol", "Wir", "Zor", "Far", "Sar"],
+    "years": {"299": "Year of Blood and Fire", "300": "Year of Water and Bone"},
+    "seasons": [{"name": "Spring", "month": 1, "day": 1}, {"name": "Summer", "month": 4, "day": 1}],
+    "moons": [{"name": "Zarantyr", "fullmoon": "13", "offset": 0, "colour": "aqua"},
+              {"name": "Olarune", "fullmoon": "17", "offset": 0, "colour": "brown"}],
+    "suffix": "BC",
+    "has_leap_year": True,
+    "leap_year_amount": 4,
+    "leap_year_month": 2,
+    "leap_year_offset": 3,
+    "leap_year_start": 233,
+}
+
+
+class TestCalendarEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = CalendarEngine.from_data(CALENDAR)
+
+    def test_leap_years_from_the_payload(self):
+        self.assertEqual((self.engine.leap_every, self.engine.leap_days), (3, 4))
+        self.assertEqual([year for year in range(230, 240) if self.engine.is_leap(year)], [233, 236, 239])
+        self.assertEqual((self.engine.year_length(236), self.engine.year_length(235)), (40, 36))
+        self.assertEqual(self.engine.month_length(236, 2), 9)
+        self.assertEqual(self.engine.days_between("233-1-1", "234-1-1"), 40)
+        self.assertEqual(self.engine.days_between("234-1-1", "235-1-1"), 36)
+
+    def test_ordinals(self):
+        self.assertEqual(self.engine.to_ordinal("0-1-1"), 0)
+        self.assertEqual(self.engine.to_ordinal("-1-2-5"), -1)
+        self.assertEqual(self.engine.add_days("235-2-5", 1), CalendarDate(236, 1, 1))
+        self.assertEqual(self.engine.add_days("236-2-5", 1), CalendarDate(236, 2, 6))
+        for ordinal in range(-200, 12000, 7):
+            self.assertEqual(self.engine.to_ordinal(self.engine.from_ordinal(ordinal)), ordinal)
+
+    def test_invalid_dates(self):
+        self.engine.validate("236-2-9")
+        with self.assertRaises(CalendarError):
+            self.engine.validate("235-2-6")
+        with self.assertRaises(CalendarError):
+            self.engine.validate("235-3-1")
+        with self.assertRaises(CalendarError):
+            CalendarDate.parse("the third of January")
+
+    def test_weekdays_skip_intercalary_days(self):
+        self.assertEqual(self.engine.weekday("0-1-2"), "Mol")
+        self.assertEqual(self.engine.weekday("1-1-1"), "Wir")
+        self.assertIsNone(self.engine.weekday("233-2-1"))
+        self.assertEqual((self.engine.weekday("233-1-1"), self.engine.weekday("234-1-1")), ("Sar", "Zol"))
+
+    def test_moons_seasons_and_names(self):
+        self.assertEqual([phase.label for phase in self.engine.moon_phases(0)], ["full", "full"])
+        self.assertEqual(self.engine.moon_phases(7)[0].label, "new")
+        self.assertEqual(self.engine.season("300-1-5").name, "Spring")
+        self.assertEqual(self.engine.format("299-1-3"), "3 January Year of Blood and Fire")
+        self.assertEqual(self.engine.format("301-1-3"), "3 January 301")
+
+    def test_flat_post_fields(self):
+        engine = CalendarEngine.from_data(dict(month_name=["One", "Two"], month_length=[10, 2], month_type=["standard", "intercalary"],
+                                               weekday=["A", "B"], has_leap_year=True, leap_year_offset=2, leap_year_amount=1,
+                                               leap_year_month=2))
+
+        self.assertEqual(engine.months, [Month("One", 10), Month("Two", 2, intercalary=True)])
+        self.assertEqual((engine.year_length(0), engine.year_length(1)), (13, 12))
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "needs numpy")
+class TestCalendarArrays(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = CalendarEngine.from_data(CALENDAR)
+        self.dates = [CalendarDate(-3, 1, 1), CalendarDate(0, 1, 31), CalendarDate(233, 2, 9), CalendarDate(400, 2, 5)]
+
+    def test_arrays_agree_with_scalars(self):
+        ordinals = self.engine.ordinals_of(self.dates)
+
+        self.assertEqual(ordinals.tolist(), [self.engine.to_ordinal(date) for date in self.dates])
+        years, months, days = self.engine.from_ordinals(ordinals)
+        self.assertEqual([CalendarDate(*date) for date in zip(years.tolist(), months.tolist(), days.tolist())], self.dates)
+        self.assertEqual(self.engine.weekday_indices(ordinals).tolist(),
+                         [-1 if index is None else index for index in map(self.engine.weekday_index, self.dates)])
+
+    def test_invalid_days_are_rejected(self):
+        with self.assertRaises(CalendarError):
+            self.engine.to_ordinals([235], [2], [6])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from pykanka import KankaClient
+from pykanka.diff import diff, diff_records
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.exporter import export
+from library.fake_campaign import FakeCampaign, FakeCampaignTest
+
+
+class TestDiff(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.guard = self.campaign.add("character", name="Guard", title="Sergeant")
+        self.thief = self.campaign.add("character", name="Thief")
+        self.harbour = self.campaign.add("location", name="Harbour")
+        self.hp = self.campaign.add_subentry(self.guard["entity_id"], "attributes", name="HP", value="12")
+
+    def snapshot(self, name) -> str:
+        path = os.path.join(self.directory, name)
+        export(self.client, path, types=["character", "location"], subentries=["attributes"], format="snapshot")
+        return path
+
+    def test_changes_are_classified(self):
+        before = self.snapshot("before.snap")
+        self.campaign.update(self.guard["entity_id"], title="Captain")
+        self.campaign.subentries[(self.guard["entity_id"], "attributes")][0]["value"] = "15"
+        self.campaign.remove(self.thief["entity_id"])
+        self.campaign.add("character", name="Recruit")
+
+        changeset = diff(before, self.snapshot("after.snap"))
+
+        self.assertEqual(changeset.summary(), dict(created=1, modified=1, deleted=1, unchanged=1))
+        self.assertEqual(changeset.created[0].name, "Recruit")
+        self.assertEqual(changeset.deleted[0].name, "Thief")
+        modified = changeset.modified[0]
+        self.assertEqual(modified.fields, {"title": ("Sergeant", "Captain")})
+        self.assertEqual([(old["value"], new["value"]) for old, new in modified.subentries["attributes"].changed], [("12", "15")])
+
+    def test_identical_states_have_no_changes(self):
+        export(self.client, os.path.join(self.directory, "campaign.ndjson"), types=["character", "location"])
+
+        changeset = diff(self.snapshot("campaign.snap"), os.path.join(self.directory, "campaign.ndjson"))
+
+        self.assertFalse(changeset)
+        self.assertEqual(changeset.unchanged, 3)
+        with self.assertRaises(WrongParametersPassedToEntity):
+            diff(self.snapshot("campaign.snap"), self.snapshot("campaign.snap"), key="uuid")
+
+    def test_apply_restores_the_old_state(self):
+        before = self.snapshot("before.snap")
+        self.campaign.update(self.guard["entity_id"], title="Captain")
+        self.campaign.subentries[(self.guard["entity_id"], "attributes")].clear()
+        self.campaign.remove(self.thief["entity_id"])
+        self.campaign.add("character", name="Recruit")
+
+        operations = diff(self.snapshot("after.snap"), before).apply(self.client)
+
+        self.assertEqual([op for op in operations if not op.ok], [])
+        self.assertEqual(sorted(child["name"] for child in self.campaign.children("character")), ["Guard", "Thief"])
+        self.assertEqual(self.campaign.child("character", self.guard["id"])["title"], "Sergeant")
+        self.assertEqual([entry["value"] for entry in self.campaign.subentries[(self.guard["entity_id"], "attributes")]], ["12"])
+
+    def test_campaigns_are_matched_by_name(self):
+        other = FakeCampaign(campaign_id=2)
+        other.add("location", name="Harbour")
+        other.add("character", name="Guard", title="Sergeant", entity_id=30)
+        other.add("character", name="Smuggler")
+        with self.campaign.patch(other):
+            export(KankaClient("token", 2, cache_duration=0), os.path.join(self.directory, "other.ndjson"),
+                   types=["character", "location"])
+
+        changeset = diff(self.snapshot("campaign.snap"), os.path.join(self.directory, "other.ndjson"), key="name")
+
+        self.assertEqual(changeset.summary(), dict(created=1, modified=0, deleted=1, unchanged=2))
+        self.assertEqual((changeset.created[0].name, changeset.deleted[0].name), ("Smuggler", "Thief"))
+
+    def test_subentries_only_compared_when_both_sides_have_them(self):
+        old = dict(type="character", child=dict(name="Guard"), subentries=dict(attributes=[dict(id=1, name="HP", value="1")]))
+        new = dict(type="character", child=dict(name="Guard"))
+
+        self.assertEqual(diff_records(old, new).subentries, dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
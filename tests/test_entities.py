@@ -0,0 +1,18 @@
+import unittest
+
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestEntity(FakeCampaignTest):
+    def test_child_is_built_from_the_entity_response(self):
+        guard = self.campaign.add("character", name="Guard", title="Sergeant")
+
+        entity = self.client.get_entity(guard["entity_id"])
+
+        self.assertEqual(entity.child.data.title, "Sergeant")
+        self.assertEqual(len(self.campaign.requests), 1)
+        self.assertEqual(self.campaign.requests_to("characters"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
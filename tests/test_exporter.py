@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+import pykanka.ndjson
+from pykanka.entities import Entity
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.exporter import export, iter_records, record_to_entity
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestExporter(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.harbour = self.campaign.add("location", name="Hafen")
+        for name in ("Jörg", "Zoë", "Åsa", "Ōtomo"):
+            self.campaign.add("character", name=name, location_id=self.harbour["id"])
+
+    def test_records_hold_the_child_and_entity_fields(self):
+        records = list(iter_records(self.client, types=["character", "location"]))
+
+        self.assertEqual([record["name"] for record in records], ["Jörg", "Zoë", "Åsa", "Ōtomo", "Hafen"])
+        hafen = records[-1]
+        self.assertEqual((hafen["id"], hafen["child_id"], hafen["type"]), (self.harbour["entity_id"], self.harbour["id"], "location"))
+        self.assertEqual(hafen["child"]["name"], "Hafen")
+
+        entity = record_to_entity(self.client, hafen)
+        self.assertIsInstance(entity, Entity)
+        self.assertEqual(entity.child.data.name, "Hafen")
+        self.assertEqual(self.campaign.requests_to("entities"), [])
+
+    def test_bytes_written_counts_bytes_not_characters(self):
+        path = os.path.join(self.directory, "campaign.ndjson")
+
+        progress = export(self.client, path, types=["character", "location"])
+
+        self.assertEqual(progress.entities, 5)
+        self.assertEqual(progress.bytes_written, os.path.getsize(path))
+        with open(path, encoding="utf-8") as f:
+            self.assertLess(len(f.read()), progress.bytes_written)
+
+    def test_compressed_export_reads_back(self):
+        path = os.path.join(self.directory, "campaign.ndjson.gz")
+        reported = []
+
+        progress = export(self.client, path, types=["character"], on_progress=lambda p: reported.append(p.entities))
+
+        self.assertEqual(progress.bytes_written, os.path.getsize(path))
+        self.assertEqual([record["name"] for _, record in pykanka.ndjson.iter_records(path)], ["Jörg", "Zoë", "Åsa", "Ōtomo"])
+        self.assertEqual(reported[-1], 4)
+
+    def test_progress_counts_compressed_bytes_throughout(self):
+        for number in range(30):
+            self.campaign.add("character", name=f"Guard {number}", entry="<p>Watches the gate</p>")
+        path = os.path.join(self.directory, "campaign.ndjson.gz")
+        reported = []
+
+        progress = export(self.client, path, types=["character"], on_progress=lambda p: reported.append(p.bytes_written))
+
+        self.assertGreater(len(reported), 2)
+        self.assertEqual(reported, sorted(reported))
+        self.assertLessEqual(reported[-1], os.path.getsize(path))
+        self.assertEqual(progress.bytes_written, os.path.getsize(path))
+
+    def test_subentries_are_attached(self):
+        hafen_entity = self.harbour["entity_id"]
+        self.campaign.add_subentry(hafen_entity, "attributes", name="Population", value="1200")
+        world = self.campaign.add("map", name="World")
+        self.campaign.add_map_marker(world["id"], name="Hafen", latitude=1, longitude=2)
+
+        records = {record["name"]: record for record in
+                   iter_records(self.client, types=["location", "map"], subentries=["attributes", "map_markers"])}
+
+        self.assertEqual(records["Hafen"]["subentries"]["attributes"][0]["value"], "1200")
+        self.assertEqual(records["World"]["subentries"]["map_markers"][0]["name"], "Hafen")
+        self.assertNotIn("map_markers", records["Hafen"]["subentries"])
+
+    def test_invalid_options_are_rejected(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            export(self.client, os.path.join(self.directory, "x"), format="csv")
+        with self.assertRaises(WrongParametersPassedToEntity):
+            list(iter_records(self.client, types=["character"], subentries=["nonsense"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from urllib.parse import urlsplit, parse_qs
+
+from pykanka.child_types import Character
+from pykanka.filters import split_filters, matches, project, HEAVY_FIELDS
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestFilters(unittest.TestCase):
+    def test_supported_filters_become_query_parameters(self):
+        params, client_only = split_filters(Character, dict(is_dead=False, location_id=12, tags=[3, 4], name="Guard",
+                                                            title="Captain", age=lambda age: age > 30))
+
+        self.assertEqual(params, {"is_dead": 0, "location_id": 12, "tags[]": [3, 4], "name": "Guard"})
+        self.assertEqual(set(client_only), {"title", "age"})
+
+    def test_matching(self):
+        entry = dict(name="Guard", tags=[1, 2, 3], age=40, location_id=None)
+
+        self.assertTrue(matches(entry, dict(name="Guard", tags=[1, 3], age=lambda age: age > 30)))
+        self.assertTrue(matches(entry, dict(tags=2, location_id=None)))
+        self.assertFalse(matches(entry, dict(tags=[1, 4])))
+        self.assertFalse(matches(entry, dict(name="Guardian")))
+
+    def test_projection(self):
+        self.assertEqual(project(dict(name="Guard", entry="<p>long</p>", entry_parsed="<p>long</p>"), HEAVY_FIELDS),
+                         dict(name="Guard"))
+
+
+class TestFilteredListings(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.campaign.add("character", name="Guard", is_dead=False, location_id=1, title="Sergeant", entry="<p>long</p>")
+        self.campaign.add("character", name="Guardian", is_dead=False, location_id=1, title="Captain")
+        self.campaign.add("character", name="Ghost", is_dead=True, location_id=1)
+        self.campaign.add("character", name="Guard", is_dead=False, location_id=2)
+
+    def test_filters_are_pushed_down_and_checked_exactly(self):
+        found = list(self.client.all_characters(name="Guard", is_dead=False, location_id=1))
+
+        self.assertEqual([(c.data.name, c.data.title) for c in found], [("Guard", "Sergeant")])
+        query = parse_qs(urlsplit(self.campaign.requests_to("characters")[0][1]).query)
+        self.assertEqual(query, {"name": ["Guard"], "is_dead": ["0"], "location_id": ["1"]})
+
+    def test_client_side_filters(self):
+        found = list(self.client.all_characters(title=lambda title: title is not None and title.startswith("Capt")))
+        self.assertEqual([c.data.name for c in found], ["Guardian"])
+
+    def test_excluded_fields_are_dropped(self):
+        guard = next(iter(self.client.all_characters(name="Guard", exclude=HEAVY_FIELDS)))
+        self.assertIsNone(guard.data.entry)
+        self.assertEqual(next(iter(self.client.all_characters(name="Guard"))).data.entry, "<p>long</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()
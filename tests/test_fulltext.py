@@ -0,0 +1,85 @@
+import unittest
+
+from pykanka.fulltext import FullTextIndex, tokenize
+from pykanka.sync import sync
+from library.fake_campaign import FakeCampaignTest
+
+
+def record(entity_id, name, type_name="character", entry=None, **subentries):
+    content = dict(id=entity_id, name=name, type=type_name, child_id=entity_id * 10, child=dict(name=name, entry=entry))
+    if subentries:
+        content["subentries"] = subentries
+    return content
+
+
+class TestFullTextIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = FullTextIndex.from_records([
+            record(1, "Red Dragon", entry="<p>A dragon living in the <b>mountains</b></p>"),
+            record(2, "Mountain Pass", "location", entry="<p>Where the dragon was last seen</p>"),
+            record(3, "Éléonore", entry="<p>Knight &amp; dragon slayer</p>",
+                   attributes=[dict(name="Weapon", value="Lance")], entity_notes=[dict(name="Secret", entry="<i>afraid of heights</i>")]),
+            record(4, "Village", "location", entry="<p>Nothing to see</p>"),
+        ])
+
+    def ids(self, hits):
+        return [hit.entity_id for hit in hits]
+
+    def test_tokenizing_folds_case_and_diacritics(self):
+        self.assertEqual(tokenize("Éléonore's LANCE"), ["eleonore", "s", "lance"])
+
+    def test_names_rank_above_text(self):
+        hits = self.index.search("dragon", prefix=False)
+
+        self.assertEqual(self.ids(hits)[0], 1)
+        self.assertEqual(set(self.ids(hits)), {1, 2, 3})
+        self.assertEqual((hits[0].name, hits[0].type, hits[0].child_id), ("Red Dragon", "character", 10))
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(self.ids(self.index.search("mount")), [2, 1])
+        self.assertEqual(self.index.search("mount", prefix=False), [])
+        self.assertEqual(self.ids(self.index.search("dragon eleo"))[0], 3)      # any word matches, both rank highest
+
+    def test_text_sources(self):
+        self.assertEqual(self.ids(self.index.search("eleonore")), [3])
+        self.assertEqual(self.ids(self.index.search("lance")), [3])
+        self.assertEqual(self.ids(self.index.search("heights")), [3])
+        self.assertEqual(self.index.search("amp"), [])          # entities are unescaped, tags stripped
+        self.assertEqual(self.index.search("b"), [])
+
+    def test_filters_and_limits(self):
+        self.assertEqual(self.ids(self.index.search("dragon", type_name="location")), [2])
+        self.assertEqual(len(self.index.search("dragon", limit=1)), 1)
+        self.assertEqual(self.index.search("   "), [])
+
+    def test_updates(self):
+        self.index.add(record(3, "Éléonore", entry="<p>Retired</p>"))
+        self.assertEqual(self.ids(self.index.search("lance")), [3])             # subentries are kept
+        self.assertNotIn(3, self.ids(self.index.search("slayer")))
+
+        self.index.remove(1)
+        self.assertNotIn(1, self.index)
+        self.assertEqual(self.ids(self.index.search("red")), [])
+        self.assertEqual(len(self.index), 3)
+
+
+class TestFullTextSync(FakeCampaignTest):
+    def test_apply_sync(self):
+        guard = self.campaign.add("character", name="Guard", entry="<p>Watches the gate</p>")
+        thief = self.campaign.add("character", name="Thief")
+        result = sync(self.client, types=["character"])
+        index = FullTextIndex()
+        index.apply_sync(result)
+        self.assertEqual([hit.entity_id for hit in index.search("gate")], [guard["entity_id"]])
+
+        self.campaign.update(guard["entity_id"], entry="<p>Sleeps</p>")
+        self.campaign.remove(thief["entity_id"])
+        index.apply_sync(sync(self.client, result.state, types=["character"]))
+
+        self.assertEqual(index.search("gate"), [])
+        self.assertEqual([hit.entity_id for hit in index.search("sleeps")], [guard["entity_id"]])
+        self.assertNotIn(thief["entity_id"], index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from pykanka.entity_subentries import Relation
+from pykanka.graph import RelationGraph, Edge, attitude_cost, OUT, IN
+from library.fake_campaign import FakeCampaignTest
+
+
+def relation(relation_id, owner_id, target_id, attitude=0):
+    return dict(id=relation_id, owner_id=owner_id, target_id=target_id, attitude=attitude, relation="knows")
+
+
+RELATIONS = [relation(1, 1, 2, attitude=80), relation(2, 2, 3, attitude=80), relation(3, 3, 4, attitude=80),
+             relation(4, 1, 5, attitude=-100),
+             relation(5, 5, 4, attitude=100), relation(6, 6, 1, attitude=50)]
+
+
+class TestRelationGraph(unittest.TestCase):
+    def setUp(self) -> None:
+        self.graph = RelationGraph.from_relations(RELATIONS)
+
+    def test_neighbours(self):
+        self.assertEqual(sorted(self.graph.neighbours(1)), [2, 5, 6])
+        self.assertEqual(sorted(self.graph.neighbours(1, direction=OUT)), [2, 5])
+        self.assertEqual(self.graph.neighbours(1, direction=IN), [6])
+        self.assertEqual(sorted(self.graph.neighbours(1, min_attitude=0)), [2, 6])
+        self.assertEqual(self.graph.neighbours(1, max_attitude=-1), [5])
+        self.assertEqual(self.graph.neighbours(99), [])
+        self.assertEqual({edge.id for edge in self.graph.relations_of(5)}, {4, 5})
+
+    def test_within(self):
+        self.assertEqual(self.graph.within(1, hops=1), {2: 1, 5: 1, 6: 1})
+        self.assertEqual(self.graph.within(1, hops=2, direction=OUT), {2: 1, 5: 1, 3: 2, 4: 2})
+        self.assertEqual(self.graph.within(1, hops=3, min_attitude=0), {2: 1, 6: 1, 3: 2, 4: 3})
+
+    def test_shortest_paths(self):
+        self.assertEqual(self.graph.shortest_path(1, 4), [1, 5, 4])
+        self.assertEqual(self.graph.shortest_path(1, 4, cost=attitude_cost), [1, 2, 3, 4])
+        self.assertEqual(self.graph.shortest_path(4, 1, direction=OUT), None)
+        self.assertEqual(self.graph.shortest_path(4, 6, direction=IN), [4, 5, 1, 6])
+        self.assertEqual(self.graph.shortest_path(3, 3), [3])
+
+    def test_centrality(self):
+        self.assertEqual(self.graph.degree(1), 3)
+        self.assertEqual(self.graph.most_connected(1), [(1, 3)])
+        self.assertAlmostEqual(self.graph.degree_centrality()[4], 2 / 5)
+        self.assertAlmostEqual(self.graph.closeness(6, direction=OUT), 5 / (1 + 2 + 2 + 3 + 3))
+        self.assertEqual(self.graph.closeness(99), 0.)
+
+    def test_changes_before_and_after_compacting_agree(self):
+        self.graph.add(relation(7, 4, 6))
+        self.graph.add(relation(2, 2, 6))               # replaces 2 -> 3
+        self.graph.remove(5)
+        self.graph.remove(99)
+
+        before = [(self.graph.neighbours(n), self.graph.degree(n), self.graph.shortest_path(3, n)) for n in range(1, 7)]
+        self.graph.compact()
+        after = [(self.graph.neighbours(n), self.graph.degree(n), self.graph.shortest_path(3, n)) for n in range(1, 7)]
+
+        self.assertEqual([sorted(b[0]) for b in before], [sorted(a[0]) for a in after])
+        self.assertEqual([b[1:] for b in before], [a[1:] for a in after])
+        self.assertEqual(sorted(self.graph.neighbours(2)), [1, 6])
+        self.assertEqual(self.graph.edge(2), Edge(id=2, owner_id=2, target_id=6, attitude=0, relation="knows"))
+        self.assertEqual(len(self.graph), 6)
+
+
+class TestRelationGraphClient(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.ids = [self.campaign.add("character", name=name)["entity_id"] for name in ("Anna", "Berta", "Carla", "Dora")]
+        for owner, target in ((0, 1), (1, 2), (2, 3), (3, 0)):
+            self.campaign.add_subentry(self.ids[owner], "relations", relation="knows", target_id=self.ids[target], attitude=10)
+
+    def test_loads_and_follows_writes(self):
+        graph = RelationGraph.from_client(self.client)
+        graph.attach(self.client)
+        self.assertEqual(len(graph), 4)
+
+        Relation(_client=self.client, owner_id=self.ids[0], target_id=self.ids[2], relation="rival", visibility="all").post()
+        self.assertEqual(graph.shortest_path(self.ids[0], self.ids[2], direction=OUT), [self.ids[0], self.ids[2]])
+
+        removed = graph.relations_of(self.ids[3], direction=OUT)[0]
+        Relation(_client=self.client, id=removed.id, owner_id=self.ids[3]).delete()
+        self.assertEqual(graph.neighbours(self.ids[3], direction=OUT), [])
+
+    def test_sync_fetches_changed_relations(self):
+        graph = RelationGraph.from_client(self.client)
+        self.campaign.now = datetime.now(timezone.utc) + timedelta(minutes=1)   # the graph marks its load with the real time
+        self.campaign.add_subentry(self.ids[3], "relations", relation="sister", target_id=self.ids[1], attitude=90)
+
+        self.assertEqual(graph.sync(self.client), 1)
+        self.assertIn(self.ids[1], graph.neighbours(self.ids[3], direction=OUT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from pykanka.child_types import Location
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.hierarchy import Hierarchy, nestable_types
+from library.fake_campaign import FakeCampaignTest
+
+
+def location(child_id, parent_id=None):
+    return dict(id=child_id, entity_id=child_id * 10, parent_location_id=parent_id)
+
+
+class TestHierarchy(unittest.TestCase):
+    def setUp(self) -> None:
+        # 1 -> 2 -> 3, 1 -> 4, 5 and 6 below a parent that isn't visible
+        self.tree = Hierarchy.from_children("location", [location(1), location(2, 1), location(3, 2), location(4, 1),
+                                                         location(5), location(6, 99)])
+
+    def test_queries(self):
+        self.assertEqual(sorted(self.tree.roots()), [1, 5, 6])
+        self.assertEqual(self.tree.descendants(1), [2, 3, 4])
+        self.assertEqual(self.tree.subtree_size(2), 2)
+        self.assertEqual((self.tree.depth(1), self.tree.depth(3)), (0, 2))
+        self.assertEqual(self.tree.ancestors(3), [2, 1])
+        self.assertEqual(self.tree.children(1), [2, 4])
+        self.assertEqual((self.tree.entity_id(3), self.tree.child_id(30)), (30, 3))
+
+    def test_is_inside_and_common_ancestor(self):
+        self.assertTrue(self.tree.is_inside(3, 1))
+        self.assertFalse(self.tree.is_inside(1, 3))
+        self.assertFalse(self.tree.is_inside(4, 2))
+        self.assertEqual(self.tree.common_ancestor(3, 4), 1)
+        self.assertEqual(self.tree.common_ancestor(3, 2), 2)
+        self.assertIsNone(self.tree.common_ancestor(3, 5))
+
+    def test_moving_a_subtree(self):
+        self.tree.set_parent(2, 5)
+
+        self.assertEqual(self.tree.descendants(5), [2, 3])
+        self.assertEqual(self.tree.descendants(1), [4])
+        self.assertEqual(self.tree.depth(3), 2)
+        self.assertTrue(self.tree.is_inside(3, 5))
+
+    def test_cycles_are_rejected(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.tree.set_parent(1, 3)
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.tree.set_parent(1, 1)
+        self.assertEqual(self.tree.descendants(1), [2, 3, 4])
+
+    def test_cycles_through_children_loaded_first_are_rejected(self):
+        tree = Hierarchy("location")
+        tree.set_parent(7, 5)                   # 5 isn't loaded yet
+
+        with self.assertRaises(WrongParametersPassedToEntity):
+            tree.set_parent(5, 7)
+        tree.set_parent(5, None)
+        self.assertEqual(tree.roots(), [5])
+        self.assertEqual(tree.descendants(5), [7])
+        self.assertTrue(tree.is_inside(7, 5))
+
+    def test_removing_makes_children_roots(self):
+        self.tree.remove(2)
+
+        self.assertNotIn(2, self.tree)
+        self.assertIn(3, self.tree.roots())
+        self.assertEqual(self.tree.descendants(1), [4])
+        self.assertIsNone(self.tree.child_id(20))
+
+    def test_records_and_types(self):
+        tree = Hierarchy.from_records("location", [dict(id=10, child_id=1, type="location", child=dict(name="Kingdom")),
+                                                   dict(id=20, child_id=2, type="location", child=dict(parent_location_id=1)),
+                                                   dict(id=30, child_id=3, type="character", child=dict())])
+
+        self.assertEqual(tree.descendants(1), [2])
+        self.assertEqual(len(tree), 2)
+        self.assertIn("location", nestable_types())
+        self.assertNotIn("character", nestable_types())
+        with self.assertRaises(WrongParametersPassedToEntity):
+            Hierarchy("character")
+
+
+class TestHierarchyClient(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.kingdom = self.campaign.add("location", name="Kingdom")
+        self.city = self.campaign.add("location", name="City", parent_location_id=self.kingdom["id"])
+        self.tavern = self.campaign.add("location", name="Tavern", parent_location_id=self.city["id"])
+
+    def test_follows_writes(self):
+        tree = Hierarchy.from_client(self.client, "location")
+        tree.attach(self.client)
+        self.assertTrue(tree.is_inside(self.tavern["id"], self.kingdom["id"]))
+
+        Location.from_json(self.client, self.tavern).patch(parent_location_id=None)
+        self.assertFalse(tree.is_inside(self.tavern["id"], self.kingdom["id"]))
+
+        Location(self.client).post(name="Harbour", parent_location_id=self.city["id"])
+        self.client.request_delete(f"{self.campaign.base_url}entities/{self.city['entity_id']}")
+        self.assertNotIn(self.city["id"], tree)
+        self.assertEqual(len(tree.roots()), 3)
+
+    def test_sync_applies_changed_parents(self):
+        tree = Hierarchy.from_client(self.client, "location")
+        self.campaign.now = datetime.now(timezone.utc) + timedelta(minutes=1)   # the hierarchy marks its load with the real time
+        self.campaign.update(self.tavern["entity_id"], parent_location_id=self.kingdom["id"])
+
+        self.assertEqual(tree.sync(self.client), 1)
+        self.assertEqual(tree.children(self.kingdom["id"]), [self.city["id"], self.tavern["id"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
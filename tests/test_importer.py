@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from pykanka.importer import import_ndjson
+from library.fake_campaign import FakeCampaignTest
+
+
+def ndjson(*records) -> io.StringIO:
+    return io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+
+
+class TestImporter(FakeCampaignTest):
+    def test_references_are_resolved_to_created_ids(self):
+        source = ndjson(
+            {"type": "location", "ref": "loc-1", "data": {"name": "Harbour"}},
+            {"type": "tag", "ref": "tag-1", "data": {"name": "Crew"}},
+            {"type": "character", "ref": "hero-1",
+             "data": {"name": "Jonathan", "location_id": {"$ref": "loc-1"}, "tags": [{"$ref": "tag-1"}]}},
+        )
+
+        result = import_ndjson(self.client, source, max_workers=3)
+
+        self.assertTrue(result.ok, result.failures)
+        self.assertEqual(result.created, 3)
+        harbour = self.campaign.children("location")[0]
+        hero = self.campaign.children("character")[0]
+        self.assertEqual(hero["location_id"], harbour["id"])
+        self.assertEqual(hero["tags"], [self.campaign.children("tag")[0]["id"]])
+        self.assertEqual(result.ids["hero-1"], (hero["id"], hero["entity_id"]))
+
+    def test_subentries_are_created_with_entity_references(self):
+        source = ndjson(
+            {"type": "character", "ref": "villain", "data": {"name": "Villain"}},
+            {"type": "character", "data": {"name": "Hero"},
+             "attributes": [{"name": "HP", "value": "42"}],
+             "relations": [{"relation": "rival", "target_id": {"$entity": "villain"}, "visibility": "all"}]},
+        )
+
+        result = import_ndjson(self.client, source)
+
+        self.assertTrue(result.ok, result.failures)
+        self.assertEqual(result.subentries, 2)
+        villain_entity, hero_entity = result.ids["villain"][1], self.campaign.children("character")[1]["entity_id"]
+        self.assertEqual(self.campaign.subentries[(hero_entity, "attributes")][0]["value"], "42")
+        relation = self.campaign.subentries[(hero_entity, "relations")][0]
+        self.assertEqual((relation["owner_id"], int(relation["target_id"])), (hero_entity, villain_entity))
+
+    def test_failures_are_reported_per_line(self):
+        source = ndjson(
+            {"type": "location", "ref": "nameless", "data": {}},
+            {"type": "character", "data": {"name": "Lost", "location_id": {"$ref": "nameless"}}},
+            {"type": "character", "data": {"name": "Orphan", "location_id": {"$ref": "missing"}}},
+            {"type": "character", "data": {"name": "Fine"}},
+        )
+
+        result = import_ndjson(self.client, source)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(sorted(failure.line for failure in result.failures), [1, 2, 3])
+        self.assertEqual([child["name"] for child in self.campaign.children("character")], ["Fine"])
+
+    def test_journal_resumes_an_interrupted_import(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        journal = os.path.join(directory.name, "import.journal")
+        records = [{"type": "character", "ref": f"c{i}", "data": {"name": f"Character {i}"}} for i in range(4)]
+
+        self.campaign.fail("characters", times=1)
+        first = import_ndjson(self.client, ndjson(*records), max_workers=1, journal=journal)
+        self.assertEqual((first.created, len(first.failures)), (3, 1))
+
+        second = import_ndjson(self.client, ndjson(*records), max_workers=1, journal=journal)
+        self.assertTrue(second.ok, second.failures)
+        self.assertEqual((second.created, second.skipped), (1, 3))
+        self.assertEqual(len(self.campaign.children("character")), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
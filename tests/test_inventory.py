@@ -0,0 +1,104 @@
+import unittest
+
+from pykanka.child_types import Item
+from pykanka.entity_subentries import EntityInventory
+from pykanka.inventory import InventoryIndex
+from library.fake_campaign import FakeCampaignTest
+
+
+def entry(inventory_id, holder, item_id=None, amount=1, name=None, is_equipped=False):
+    return dict(id=inventory_id, entity_id=holder, item_id=item_id, amount=amount, name=name, is_equipped=is_equipped)
+
+
+class TestInventoryIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # potions (item 7) and a sword (item 8), carried by entities 1, 2 and 3
+        self.index = InventoryIndex.from_entries([
+            entry(1, 1, item_id=7, amount=3), entry(2, 1, item_id=7, amount=2), entry(3, 1, item_id=8, is_equipped=True),
+            entry(4, 2, item_id=7, amount=1), entry(5, 3, name="Gold coins", amount=120), entry(6, 3),
+        ])
+
+    def test_both_directions(self):
+        self.assertEqual(self.index.holders(7), {1: 5, 2: 1})
+        self.assertEqual(self.index.items_of(1), {7: 5, 8: 1})
+        self.assertEqual(self.index.items_of(1, equipped=True), {8: 1})
+        self.assertEqual(self.index.items_of(1, equipped=False), {7: 5})
+        self.assertTrue(self.index.owns(3, "Gold coins"))
+        self.assertFalse(self.index.owns(2, 8))
+        self.assertEqual(self.index.entry_ids(1), [1, 2, 3])
+        self.assertEqual(len(self.index), 5)                # entries without item or name are skipped
+
+    def test_totals(self):
+        self.assertEqual(self.index.total(7), 6)
+        self.assertEqual(self.index.total(7, holders=[2, 3, 2]), 1)
+        self.assertEqual(self.index.totals(), {7: 6, 8: 1, "Gold coins": 120})
+        self.assertEqual(self.index.total(99), 0)
+
+    def test_updates(self):
+        self.index.add(entry(2, 1, item_id=8, amount=1))        # the second potion entry becomes a sword
+        self.index.remove(4)
+
+        self.assertEqual(self.index.holders(7), {1: 3})
+        self.assertEqual(self.index.holders(8), {1: 2})
+        self.assertEqual(self.index.totals(), {7: 3, 8: 2, "Gold coins": 120})
+
+    def test_removing_the_last_entry_of_an_item(self):
+        self.index.remove(1)
+        self.assertEqual(self.index.holders(7), {1: 2, 2: 1})
+
+        self.index.remove(2)
+        self.assertEqual(self.index.holders(7), {2: 1})
+        self.assertFalse(self.index.owns(1, 7))
+
+        self.index.remove_item(7)
+        self.assertNotIn(7, self.index.totals())
+
+    def test_holders_and_inventories(self):
+        self.index.set_inventory(3, [dict(id=9, item_id=7, amount=4)])
+        self.index.remove_holder(1)
+
+        self.assertEqual(self.index.holders(7), {2: 1, 3: 4})
+        self.assertEqual(self.index.items_of(1), {})
+        self.assertEqual(self.index.totals(), {7: 5})
+
+    def test_records(self):
+        index = InventoryIndex.from_records([dict(id=1, subentries=dict(inventory=[dict(id=1, item_id=7, amount=None)])),
+                                             dict(id=2)])
+
+        self.assertEqual(index.items_of(1), {7: 1})
+
+
+class TestInventoryClient(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.potion = self.campaign.add("item", name="Potion")
+        self.anna = self.campaign.add("character", name="Anna")
+        self.mill = self.campaign.add("location", name="Mill")
+        self.campaign.add_subentry(self.anna["entity_id"], "inventory", item_id=self.potion["id"], amount=2)
+        self.campaign.add_subentry(self.mill["entity_id"], "inventory", item_id=self.potion["id"], amount=5)
+
+    def test_loads_only_the_requested_types(self):
+        index = InventoryIndex.from_client(self.client, types=["character"])
+
+        self.assertEqual(index.holders(self.potion["id"]), {self.anna["entity_id"]: 2})
+        self.assertEqual(InventoryIndex.from_client(self.client).total(self.potion["id"]), 7)
+
+    def test_follows_writes(self):
+        index = InventoryIndex.from_client(self.client)
+        index.attach(self.client)
+
+        response = EntityInventory(_client=self.client, entity_id=self.anna["entity_id"], item_id=self.potion["id"], amount=3).post()
+        self.assertEqual(index.total(self.potion["id"], holders=[self.anna["entity_id"]]), 5)
+
+        EntityInventory(_client=self.client, id=response.json()["data"]["id"], entity_id=self.anna["entity_id"]).delete()
+        self.assertEqual(index.total(self.potion["id"], holders=[self.anna["entity_id"]]), 2)
+
+        self.client.request_delete(f"{self.campaign.base_url}entities/{self.mill['entity_id']}")
+        self.assertEqual(index.holders(self.potion["id"]), {self.anna["entity_id"]: 2})
+
+        Item.from_json(self.client, self.potion).delete()
+        self.assertEqual(index.totals(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
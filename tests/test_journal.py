@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from pykanka.child_types import Character
+from pykanka.journal import WriteJournal
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestWriteJournal(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "import.journal")
+
+    def _post_characters(self, journal, names):
+        with self.client.batch(journal=journal) as batch:
+            for name in names:
+                Character(self.client).post(name=name)
+        return batch
+
+    def test_rerun_skips_writes_that_landed(self):
+        with WriteJournal(self.path) as journal:
+            self.campaign.fail("characters", status=500)        # the first post fails, the others land
+            first = self._post_characters(journal, ["Anna", "Berta", "Carla"])
+            self.assertEqual(len(first.errors), 1)
+            self.assertEqual(journal.stats(), {"done": 2, "failed": 1})
+
+        with WriteJournal(self.path) as journal:
+            second = self._post_characters(journal, ["Anna", "Berta", "Carla"])
+            self.assertEqual(sum(op.skipped for op in second.results), 2)
+            self.assertEqual(journal.stats(), {"done": 3})
+
+        self.assertEqual(sorted(child["name"] for child in self.campaign.children("character")), ["Anna", "Berta", "Carla"])
+
+    def test_skipped_writes_return_the_journaled_data(self):
+        with WriteJournal(self.path) as journal:
+            created = self._post_characters(journal, ["Anna"]).results[0]
+        with WriteJournal(self.path) as journal:
+            skipped = self._post_characters(journal, ["Anna"]).results[0]
+
+        self.assertTrue(skipped.skipped)
+        self.assertEqual(skipped.data["entity_id"], created.data["entity_id"])
+        self.assertEqual(skipped.json()["data"]["id"], created.data["id"])
+
+    def test_identical_writes_get_their_own_keys(self):
+        with WriteJournal(self.path) as journal:
+            self._post_characters(journal, ["Twin", "Twin"])
+        self.assertEqual(len(self.campaign.children("character")), 2)
+
+        with WriteJournal(self.path) as journal:
+            self._post_characters(journal, ["Twin", "Twin", "Twin"])
+        self.assertEqual(len(self.campaign.children("character")), 3)
+
+    def test_replay_sends_unfinished_writes(self):
+        with WriteJournal(self.path) as journal:
+            self.campaign.fail("characters", status=503, times=2)
+            self._post_characters(journal, ["Anna", "Berta"])
+            self.assertEqual([entry.payload["data"]["name"] for entry in journal.unfinished()], ["Anna", "Berta"])
+
+            batch = journal.replay(self.client)
+            self.assertEqual(batch.errors, [])
+            self.assertEqual(list(journal.unfinished()), [])
+        self.assertEqual(len(self.campaign.children("character")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from pykanka import KankaClient
+from library.fake_campaign import FakeCampaignTest
+
+
+class ExpiringCache(dict):
+    """Drops an entry right after it was found, as an expiry in another thread can"""
+
+    def __contains__(self, key):
+        found = super().__contains__(key)
+        self.pop(key, None)
+        return found
+
+
+class TestResponseCache(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = KankaClient("token", self.campaign.campaign_id, cache_duration=60)
+        self.url = f"{self.campaign.base_url}characters"
+
+    def test_responses_are_reused(self):
+        first = self.client.request_get(self.url)
+
+        self.assertIs(self.client.request_get(self.url), first)
+        self.assertIsNot(self.client.request_get(self.url, refresh=True), first)
+        self.assertEqual(len(self.campaign.requests), 2)
+
+    def test_expired_responses_are_dropped(self):
+        self.client.request_get(self.url)
+        self.client._cache[self.url] = (self.client._cache[self.url][0], time.time() - 61)
+
+        self.client.request_get(self.url)
+        self.assertEqual(len(self.campaign.requests), 2)
+
+    def test_lookup_survives_concurrent_expiry(self):
+        response = self.client.request_get(self.url)
+        self.client._cache = ExpiringCache(self.client._cache)
+
+        self.assertIs(self.client.request_get(self.url), response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from pykanka.child_types import Organisation
+from pykanka.events import WriteEvent
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.membership import MembershipIndex
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestMembershipIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # guild 1 > workshop 2 > forge 3, family 7
+        self.index = MembershipIndex.from_children(
+            organisations=[dict(id=1, entity_id=10, organisation_id=None, members=[100]),
+                           dict(id=2, entity_id=20, organisation_id=1, members=[101, 102]),
+                           dict(id=3, entity_id=30, organisation_id=2, members=[103])],
+            families=[dict(id=7, entity_id=70, family_id=None, members=[101])])
+
+    def test_members(self):
+        self.assertEqual(self.index.members("organisation", 2), {101, 102})
+        self.assertEqual(self.index.members("organisation", 1, nested=True), {100, 101, 102, 103})
+        self.assertEqual(self.index.members("family", 7), {101})
+        self.assertEqual(self.index.members("organisation", 99), set())
+
+    def test_groups_of(self):
+        self.assertEqual(self.index.groups_of(101), {("organisation", 2), ("family", 7)})
+        self.assertEqual(self.index.organisations_of(103, nested=True), {1, 2, 3})
+        self.assertEqual(self.index.families_of(101), {7})
+        self.assertTrue(self.index.is_member(103, "organisation", 1, nested=True))
+        self.assertFalse(self.index.is_member(103, "organisation", 1))
+        self.assertFalse(self.index.is_member(100, "organisation", 2, nested=True))
+
+    def test_updates(self):
+        self.index.set_members("organisation", 2, [102, 104])
+        self.index.remove_group("organisation", 3)
+
+        self.assertEqual(self.index.members("organisation", 1, nested=True), {100, 102, 104})
+        self.assertEqual(self.index.groups_of(101), {("family", 7)})
+        self.assertEqual(self.index.groups_of(103), set())
+        self.assertEqual(sorted(self.index.characters()), [100, 101, 102, 104])
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.index.set_members("location", 1, [100])
+
+    def test_moving_a_group_keeps_its_members(self):
+        self.index.on_write(WriteEvent(method="patch", url="", path=["organisations", "3"], data=dict(id=3, organisation_id=None)))
+
+        self.assertEqual(self.index.members("organisation", 3), {103})
+        self.assertEqual(self.index.organisations_of(103, nested=True), {3})
+
+    def test_records(self):
+        index = MembershipIndex.from_records([dict(id=10, child_id=1, type="organisation", child=dict(members=[100])),
+                                              dict(id=11, child_id=5, type="character", child=dict(members=[1]))])
+
+        self.assertEqual(index.members("organisation", 1), {100})
+        self.assertEqual(index.characters(), [100])
+
+
+class TestMembershipClient(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.guild = self.campaign.add("organisation", name="Guild", members=[1, 2])
+        self.workshop = self.campaign.add("organisation", name="Workshop", organisation_id=self.guild["id"], members=[3])
+
+    def test_follows_writes(self):
+        index = MembershipIndex.from_client(self.client)
+        index.attach(self.client)
+        self.assertEqual(index.members("organisation", self.guild["id"], nested=True), {1, 2, 3})
+
+        Organisation.from_json(self.client, self.workshop).patch(members=[4])
+        self.assertEqual(index.organisations_of(4, nested=True), {self.guild["id"], self.workshop["id"]})
+
+        self.client.request_delete(f"{self.campaign.base_url}entities/{self.guild['entity_id']}")
+        self.assertEqual(index.organisations_of(1), set())
+        self.assertEqual(index.organisations_of(4, nested=True), {self.workshop["id"]})
+
+    def test_sync_replaces_changed_members(self):
+        index = MembershipIndex.from_client(self.client)
+        self.campaign.now = datetime.now(timezone.utc) + timedelta(minutes=1)   # the index marks its load with the real time
+        self.campaign.update(self.guild["entity_id"], members=[2])
+
+        self.assertEqual(index.sync(self.client), 1)
+        self.assertEqual(index.members("organisation", self.guild["id"]), {2})
+        self.assertEqual(index.organisations_of(1), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from pykanka import ndjson
+from pykanka.mentions import MentionIndex, Mention, parse_mentions
+from pykanka.sync import sync
+from library.fake_campaign import FakeCampaignTest
+
+
+def record(entity_id, name, entry=None, updated_at="2021-01-01T00:00:00.000000Z", notes=None, type_name="character"):
+    content = dict(id=entity_id, name=name, type=type_name, child_id=entity_id * 10, updated_at=updated_at,
+                   child=dict(name=name, entry=entry))
+    if notes is not None:
+        content["subentries"] = dict(entity_notes=notes)
+    return content
+
+
+class TestParseMentions(unittest.TestCase):
+    def test_raw_mentions_and_links(self):
+        text = ('<p>[character:12] met [location:7|the old mill] and '
+                '<a href="https://kanka.io/en/campaign/1/entities/5">Five</a> '
+                '<a href="https://kanka.io/en/w/1/characters/3?tab=notes">Three</a> [dragon:9]</p>')
+
+        self.assertEqual(list(parse_mentions(text)), [12, 7, 5, ("character", 3)])
+        self.assertEqual(list(parse_mentions(None)), [])
+
+
+class TestMentionIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = MentionIndex.from_records([
+            record(1, "Anna", entry="<p>Sister of [character:2] and [character:1]</p>"),
+            record(2, "Bert", entry="<p>Lives in [location:3|the mill]</p>",
+                   notes=[dict(id=50, entry="<p>Owes [character:1] money</p>", updated_at="2021-01-01T00:00:00.000000Z")]),
+            record(3, "Mill", type_name="location"),
+            record(4, "Carl", entry='<p><a href="https://kanka.io/en/campaign/1/characters/20">Bert</a> [character:99]</p>'),
+        ])
+
+    def test_backlinks(self):
+        self.assertEqual(self.index.referenced_by(2), [1, 4])
+        self.assertEqual(self.index.referenced_by(1), [2])
+        self.assertEqual(self.index.backlinks(1), [Mention(source_id=2, target=1, field="entity_notes", note_id=50)])
+        self.assertEqual(self.index.mentions_in(1), [Mention(source_id=1, target=2, field="entry")])     # not itself
+        self.assertEqual(self.index.resolve(("character", 20)), 2)
+
+    def test_dangling(self):
+        self.assertEqual(self.index.dangling(), [Mention(source_id=4, target=99, field="entry")])
+
+    def test_only_changed_records_are_parsed_again(self):
+        self.assertFalse(self.index.update(record(1, "Anna", entry="<p>Changed, but not according to updated_at</p>")))
+        self.assertTrue(self.index.update(record(1, "Anna", entry="<p>Alone</p>", updated_at="2021-02-01T00:00:00.000000Z")))
+
+        self.assertEqual(self.index.referenced_by(2), [4])
+
+    def test_records_without_subentries_keep_their_notes(self):
+        self.index.update(record(2, "Bert", entry="<p>Moved away</p>", updated_at="2021-02-01T00:00:00.000000Z"))
+
+        self.assertEqual(self.index.referenced_by(1), [2])
+        self.assertEqual(self.index.referenced_by(3), [])
+
+    def test_refresh_from_export(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "campaign.ndjson")
+        with open(path, "w", encoding="utf-8") as file:
+            for content in (record(1, "Anna", entry="<p>[character:4]</p>", updated_at="2021-03-01T00:00:00.000000Z"),
+                            record(2, "Bert", entry="<p>Lives in [location:3|the mill]</p>")):
+                file.write(ndjson.dumps(content) + "\n")
+
+        self.assertEqual(self.index.refresh_from_export(path, remove_missing=True), 1)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.referenced_by(4), [1])
+        self.assertEqual(sorted(mention.target for mention in self.index.dangling()), [3, 4])
+
+
+class TestMentionSync(FakeCampaignTest):
+    def test_apply_sync(self):
+        anna = self.campaign.add("character", name="Anna")
+        bert = self.campaign.add("character", name="Bert", entry=f"<p>Knows [character:{anna['entity_id']}]</p>")
+        result = sync(self.client, types=["character"])
+        index = MentionIndex()
+        index.apply_sync(result)
+        self.assertEqual(index.referenced_by(anna["entity_id"]), [bert["entity_id"]])
+
+        self.campaign.remove(bert["entity_id"])
+        index.apply_sync(sync(self.client, result.state, types=["character"]))
+
+        self.assertEqual(index.referenced_by(anna["entity_id"]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
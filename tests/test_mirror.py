@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from pykanka.exceptions import AccessingNonExistentError
+from pykanka.exporter import export
+from pykanka.mirror import CampaignMirror
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestCampaignMirror(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.country = self.campaign.add("location", name="Country")
+        self.city = self.campaign.add("location", name="City", parent_location_id=self.country["id"])
+        self.harbour = self.campaign.add("location", name="Harbour", parent_location_id=self.city["id"])
+        self.guard = self.campaign.add("character", name="Guard", location_id=self.city["id"])
+        self.campaign.add_subentry(self.guard["entity_id"], "attributes", name="HP", value="12")
+
+        self.mirror = self.loaded_mirror(":memory:")
+
+    def loaded_mirror(self, path) -> CampaignMirror:
+        export_path = os.path.join(self.directory, "campaign.ndjson.gz")
+        export(self.client, export_path, types=["character", "location"], subentries=["attributes"])
+        mirror = CampaignMirror(self.client, path)
+        self.addCleanup(mirror.close)
+        mirror.load_export(export_path)
+        return mirror
+
+    def test_reads_need_no_requests(self):
+        self.campaign.requests.clear()
+
+        self.assertEqual(len(self.mirror), 4)
+        self.assertEqual(self.mirror.get_character(self.guard["id"]).data.location_id, self.city["id"])
+        self.assertEqual(self.mirror.get_entity(self.harbour["entity_id"]).child.data.name, "Harbour")
+        self.assertEqual([entity.data.id for entity in self.mirror.find_by_name("guard")], [self.guard["entity_id"]])
+        self.assertEqual(self.mirror.subentries(self.guard["entity_id"], "attributes")[0].value, "12")
+        self.assertEqual(self.campaign.requests, [])
+
+        with self.assertRaises(AccessingNonExistentError):
+            self.mirror.get_character(99)
+
+    def test_hierarchy_queries(self):
+        self.assertEqual([child.data.name for child in self.mirror.children_of("location", self.country["id"])], ["City"])
+        self.assertEqual(sorted(child.data.name for child in self.mirror.descendants_of("location", self.country["id"])),
+                         ["City", "Harbour"])
+
+    def test_sync_applies_changes_and_deletions(self):
+        self.campaign.update(self.guard["entity_id"], name="Captain")
+        self.campaign.remove(self.harbour["entity_id"])
+        recruit = self.campaign.add("character", name="Recruit")
+
+        result = self.mirror.sync(types=["character", "location"])
+
+        self.assertEqual(result.deleted, {"location": [self.harbour["entity_id"]]})
+        self.assertEqual(self.mirror.get_character(self.guard["id"]).data.name, "Captain")
+        self.assertEqual(self.mirror.get_character(recruit["id"]).data.name, "Recruit")
+        self.assertEqual(self.mirror.children_of("location", self.city["id"]), [])
+        self.assertEqual(self.mirror.subentries(self.guard["entity_id"], "attributes")[0].value, "12")
+        self.assertIsNotNone(self.mirror.staleness("character"))
+
+    def test_state_survives_reopening(self):
+        path = os.path.join(self.directory, "campaign.sqlite")
+        self.loaded_mirror(path).close()
+        self.campaign.update(self.guard["entity_id"], name="Captain")
+
+        reopened = CampaignMirror(self.client, path)
+        self.addCleanup(reopened.close)
+        result = reopened.sync(types=["character", "location"])
+
+        self.assertFalse(result.full)
+        self.assertEqual([child.data.name for child in result.changed["character"]], ["Captain"])
+        self.assertEqual(len(reopened), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import random
+import unittest
+import warnings
+
+from pykanka.child_types import Character
+from pykanka.fulltext import fold
+from pykanka.names import NameIndex
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = NameIndex.from_records([
+            dict(id=1, name="Jonathan Green", type="character", child_id=10),
+            dict(id=2, name="Greenhill", type="location", child_id=20),
+            dict(id=3, name="Grey Tower", type="location", child_id=21),
+            dict(id=4, name="Zoë Grünwald", type="character", child_id=11),
+            dict(id=5, name="Jonas", type="character", child_id=12),
+        ])
+
+    def names(self, matches):
+        return [match.name for match in matches]
+
+    def test_prefixes_of_any_word(self):
+        self.assertEqual(self.names(self.index.prefix("gre")), ["Greenhill", "Grey Tower", "Jonathan Green"])
+        self.assertEqual(self.names(self.index.prefix("jonathan gr")), ["Jonathan Green"])
+        self.assertEqual(self.names(self.index.prefix("gru")), ["Zoë Grünwald"])
+        self.assertEqual(self.names(self.index.prefix("gre", type_name="character")), ["Jonathan Green"])
+        self.assertEqual(self.index.prefix("   "), [])
+
+    def test_fuzzy_matches_allow_typos(self):
+        matches = self.index.fuzzy("jonatan")
+        self.assertEqual((matches[0].name, matches[0].distance), ("Jonathan Green", 1))
+        self.assertEqual(self.index.fuzzy("xq"), [])                # too short for any edits
+        self.assertEqual(self.names(self.index.fuzzy("towre")), ["Grey Tower"])
+
+    def test_every_word_of_the_query_starts_a_word(self):
+        self.assertEqual(self.names(self.index.prefix("jon gr")), ["Jonathan Green"])
+        self.assertEqual(self.names(self.index.prefix("green jo")), ["Jonathan Green"])
+        self.assertEqual(self.index.complete("jon gr")[0].name, "Jonathan Green")
+        self.assertEqual(self.index.prefix("jon to"), [])
+
+    def test_typos_in_the_first_word_of_longer_names(self):
+        index = NameIndex.from_records([dict(id=1, name="Gandalf the Grey"), dict(id=2, name="Jonathan Green")])
+
+        for text, name in (("gandolf", "Gandalf the Grey"), ("gandalg", "Gandalf the Grey"), ("jonathen", "Jonathan Green")):
+            matches = index.fuzzy(text)
+            self.assertEqual([(match.name, match.distance) for match in matches], [(name, 1)], text)
+
+    def test_fuzzy_agrees_with_plain_edit_distances(self):
+        def distance(first, second):
+            row = list(range(len(second) + 1))
+            for i, first_char in enumerate(first, 1):
+                previous, row = row, [i]
+                for j, second_char in enumerate(second, 1):
+                    row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+            return row[-1]
+
+        rng = random.Random(5)
+        for _ in range(500):
+            words = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 6))) for _ in range(8)]
+            names = [" ".join(rng.sample(words, rng.randint(1, 3))) for _ in range(rng.randint(1, 8))]
+            index = NameIndex.from_records([dict(id=entity_id, name=name) for entity_id, name in enumerate(names)])
+            query = " ".join("".join(rng.choice("abc ") for _ in range(rng.randint(3, 9))).split()) or "a"
+            max_distance = min(2, len(query) // 3)
+
+            expected = dict()
+            for entity_id, name in enumerate(names):
+                name_words = fold(name).split()
+                keys = [" ".join(name_words[start:]) for start in range(len(name_words))]
+                best = min(distance(query, key[:end]) for key in keys for end in range(len(key) + 1))
+                if best <= max_distance:
+                    expected[entity_id] = best
+
+            found = {match.entity_id: match.distance for match in index.fuzzy(query, limit=100)}
+            self.assertEqual(found, expected, (query, names))
+
+    def test_complete_tops_up_with_fuzzy_matches(self):
+        matches = self.index.complete("jona", limit=3)
+        self.assertEqual([(match.name, match.distance) for match in matches][:2], [("Jonas", 0), ("Jonathan Green", 0)])
+
+        self.assertEqual(self.names(self.index.complete("greenhil", limit=3)), ["Greenhill"])
+        self.assertEqual(self.names(self.index.complete("grenhill", limit=3)), ["Greenhill"])
+
+    def test_updates(self):
+        self.index.add(2, "Old Mill", "location", 20, aliases=["Greenhill Mill"])
+        self.assertEqual(self.names(self.index.prefix("greenhill")), ["Old Mill"])
+        self.assertEqual(self.names(self.index.prefix("old")), ["Old Mill"])
+
+        self.index.remove(1)
+        self.assertEqual(self.names(self.index.prefix("jon")), ["Jonas"])
+        self.assertEqual(len(self.index), 4)
+
+
+class TestNameIndexListener(FakeCampaignTest):
+    def test_follows_writes_through_the_client(self):
+        guard = self.campaign.add("character", name="Guard")
+        index = NameIndex.from_client(self.client)
+        index.attach(self.client)
+
+        Character(self.client).post(name="Recruit")
+        Character.from_json(self.client, guard).patch(name="Captain")
+        self.assertEqual([match.name for match in index.prefix("re")], ["Recruit"])
+        self.assertEqual([match.name for match in index.prefix("ca")], ["Captain"])
+
+        recruit = index.prefix("re")[0]
+        Character.from_json(self.client, self.campaign.child("character", recruit.child_id)).delete()
+        self.client.request_delete(f"{self.campaign.base_url}entities/{guard['entity_id']}")
+        self.assertEqual(len(index), 0)
+
+        index.detach(self.client)
+        Character(self.client).post(name="Unseen")
+        self.assertEqual(len(index), 0)
+
+    def test_failing_listeners_dont_fail_the_write(self):
+        def broken(event):
+            raise RuntimeError("listener bug")
+        self.client.add_write_listener(broken)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            response = Character(self.client).post(name="Recruit")
+
+        self.assertTrue(response.ok)
+        self.assertIn("listener bug", str(caught[0].message))
+
+
+if __name__ == '__main__':
+    unittest.main()
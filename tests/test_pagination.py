@@ -0,0 +1,74 @@
+import unittest
+
+from pykanka.child_types import Character
+from pykanka.exceptions import ServerError, ResponseNotOkError
+from pykanka.pagination import Cursor, Listing
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestListing(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for i in range(7):                                  # three pages of three
+            self.campaign.add("character", name=f"Character {i}")
+        self.url = f"{self.campaign.base_url}characters"
+
+    def test_walks_every_page(self):
+        characters = list(self.client.all_characters())
+
+        self.assertEqual([c.data.name for c in characters], [f"Character {i}" for i in range(7)])
+        self.assertIsInstance(characters[0], Character)
+        self.assertEqual(len(self.campaign.requests_to("characters")), 3)
+
+    def test_resumes_from_a_stored_cursor(self):
+        listing = self.client.all_characters()
+        seen = [next(listing).data.name for _ in range(4)]
+        stored = listing.cursor.to_json()
+        self.assertEqual(Cursor.from_json(stored), Cursor(f"{self.url}?page=2", 1))
+
+        resumed = [c.data.name for c in self.client.all_characters(cursor=Cursor.from_json(stored))]
+
+        self.assertEqual(seen + resumed, [f"Character {i}" for i in range(7)])
+
+    def test_cursor_is_none_once_exhausted(self):
+        listing = Listing(self.client, self.url)
+        self.assertEqual(len(list(listing)), 7)
+        self.assertIsNone(listing.cursor)
+        self.assertEqual(list(listing), [])
+
+    def test_failing_pages_are_retried(self):
+        self.campaign.fail("page=2", status=502, times=2)
+
+        names = [entry["name"] for entry in Listing(self.client, self.url, retries=2, retry_wait=0)]
+
+        self.assertEqual(len(names), 7)
+        self.assertEqual(len(self.campaign.requests_to("characters")), 5)
+
+    def test_gives_up_after_the_retries(self):
+        self.campaign.fail("page=2", status=503, times=3)
+        listing = Listing(self.client, self.url, retries=2, retry_wait=0)
+
+        with self.assertRaises(ServerError):
+            list(listing)
+        self.assertEqual(listing.cursor, Cursor(f"{self.url}?page=2", 0))
+
+        self.assertEqual(len(list(listing)), 4)             # the cursor still points at the failed page
+
+    def test_client_errors_are_not_retried(self):
+        self.campaign.fail("characters", status=403)
+
+        with self.assertRaises(ResponseNotOkError):
+            list(Listing(self.client, self.url, retry_wait=0))
+        self.assertEqual(len(self.campaign.requests_to("characters")), 1)
+
+    def test_where_skips_entries_before_building(self):
+        built = []
+        listing = Listing(self.client, self.url, build=lambda entry: built.append(entry) or entry["name"],
+                          where=lambda entry: entry["id"] % 2 == 0)
+
+        self.assertEqual(list(listing), ["Character 1", "Character 3", "Character 5"])
+        self.assertEqual(len(built), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
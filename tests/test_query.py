@@ -0,0 +1,61 @@
+import unittest
+
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.mirror import CampaignMirror
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestQuery(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for name, age, is_dead in [("Dora", 30, False), ("Anna", None, False), ("Carl", 70, True), ("Bert", 30, False),
+                                   ("Emil", 12, False), ("Finn", 45, False), ("Gert", None, True)]:
+            self.campaign.add("character", name=name, age=age, is_dead=is_dead)
+
+    def names(self, query):
+        return [character.data.name for character in query]
+
+    def test_nothing_is_fetched_until_iterated(self):
+        query = self.client.query("character").where(is_dead=False).order_by("name")
+        self.assertEqual(self.campaign.requests, [])
+        self.assertEqual(self.names(query), ["Anna", "Bert", "Dora", "Emil", "Finn"])
+
+    def test_limit_without_order_stops_early(self):
+        self.assertEqual(self.names(self.client.query("character").limit(2)), ["Dora", "Anna"])
+        self.assertEqual(len(self.campaign.requests_to("characters")), 1)
+        self.assertEqual(self.client.query("character").where(name="Carl").first().data.age, 70)
+
+    def test_ordering(self):
+        query = self.client.query("character")
+
+        self.assertEqual(self.names(query.order_by("-age").limit(3)), ["Carl", "Finn", "Dora"])
+        self.assertEqual(self.names(query.order_by("age", "name").limit(3)), ["Emil", "Bert", "Dora"])
+        self.assertEqual(self.names(query.order_by("age", "-name")), ["Emil", "Dora", "Bert", "Finn", "Carl", "Gert", "Anna"])
+        self.assertEqual(self.names(query.order_by("-age", "name")), ["Carl", "Finn", "Bert", "Dora", "Emil", "Anna", "Gert"])
+
+    def test_queries_are_immutable(self):
+        alive = self.client.query("character").where(is_dead=False)
+        alive.where(age=30)
+        alive.limit(1)
+
+        self.assertEqual(len(alive.all()), 5)
+
+    def test_reads_from_a_synced_mirror(self):
+        mirror = CampaignMirror(self.client)
+        self.addCleanup(mirror.close)
+        mirror.sync(types=["character"])
+        self.client.mirror = mirror
+        self.campaign.requests.clear()
+
+        self.assertEqual(self.names(self.client.query("character").where(is_dead=True).order_by("name")), ["Carl", "Gert"])
+        self.assertEqual(self.campaign.requests, [])
+        self.assertEqual(len(self.client.query("character").fresh().all()), 7)
+        self.assertNotEqual(self.campaign.requests, [])
+
+    def test_unknown_types_are_rejected(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            self.client.query("dragon")
+
+
+if __name__ == '__main__':
+    unittest.main()
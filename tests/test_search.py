@@ -0,0 +1,44 @@
+import unittest
+
+from pykanka.entities import Entity
+from pykanka.pagination import Listing
+from pykanka.search import SearchResult
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestSearch(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.guard = self.campaign.add("character", name="Harbour Guard")
+        self.harbour = self.campaign.add("location", name="Harbour")
+        self.campaign.add("location", name="Market")
+
+    def test_search_yields_entities(self):
+        found = list(self.client.search("harbour"))
+
+        self.assertTrue(all(isinstance(entity, Entity) for entity in found))
+        self.assertEqual([entity.data.id for entity in found], [self.guard["entity_id"], self.harbour["entity_id"]])
+        self.assertEqual(found[0].child.data.name, "Harbour Guard")
+
+    def test_search_results_cost_no_entity_requests(self):
+        results = self.client.search_results("harbour")
+
+        self.assertIsInstance(results, Listing)
+        results = list(results)
+        self.assertEqual(results[1], SearchResult(entity_id=self.harbour["entity_id"], name="Harbour", type="location",
+                                                  child_id=self.harbour["id"], is_private=False,
+                                                  url=f"{self.campaign.base_url}entities/{self.harbour['entity_id']}"))
+        self.assertEqual(self.campaign.requests_to("entities"), [])
+
+    def test_hydrate_fetches_each_entity_once(self):
+        results = list(self.client.search_results("harbour"))
+
+        entities = self.client.hydrate(results + results[:1], max_workers=2)
+
+        self.assertEqual([entity.data.name for entity in entities], ["Harbour Guard", "Harbour", "Harbour Guard"])
+        self.assertEqual(len(self.campaign.requests_to("entities")), 2)
+        self.assertEqual(results[1].hydrate(self.client).data.type, "location")
+
+
+if __name__ == '__main__':
+    unittest.main()
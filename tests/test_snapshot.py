@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from pykanka.exceptions import WrongParametersPassedToEntity
+from pykanka.exporter import export, iter_records
+from pykanka.snapshot import Snapshot, write_snapshot, snapshot_from_export, content_digest
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestSnapshot(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.guard = self.campaign.add("character", name="Guard", title="Sergeant")
+        self.campaign.add("location", name="Harbour")
+        self.thief = self.campaign.add("character", name="Thief", entity_id=40)
+        self.records = list(iter_records(self.client, types=["character", "location"]))
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_records_are_read_by_entity_id(self):
+        self.assertEqual(write_snapshot(reversed(self.records), self.path("campaign.snap")), 3)
+
+        with Snapshot(self.path("campaign.snap"), self.client) as snapshot:
+            self.assertEqual(len(snapshot), 3)
+            self.assertEqual(list(snapshot.ids()), [1, 2, 40])
+            self.assertIn(40, snapshot)
+            self.assertNotIn(3, snapshot)
+            self.assertEqual(snapshot.record(self.guard["entity_id"])["child"]["title"], "Sergeant")
+            self.assertEqual(snapshot[40].child.data.name, "Thief")
+            self.assertIsNone(snapshot.get(3))
+            with self.assertRaises(KeyError):
+                snapshot.record(3)
+            self.assertEqual([record["name"] for record in snapshot.records()], ["Guard", "Harbour", "Thief"])
+
+    def test_digests_ignore_bookkeeping_fields(self):
+        write_snapshot(self.records, self.path("campaign.snap"))
+        guard = self.records[0]
+        moved = dict(guard, id=99, updated_at="2022-01-01T00:00:00.000000Z", child=dict(guard["child"], id=5, entity_id=99))
+        edited = dict(guard, child=dict(guard["child"], title="Captain"))
+
+        with Snapshot(self.path("campaign.snap")) as snapshot:
+            self.assertEqual(snapshot.digest(guard["id"]), content_digest(moved))
+            self.assertNotEqual(snapshot.digest(guard["id"]), content_digest(edited))
+            self.assertEqual(dict(snapshot.digests())[guard["id"]], content_digest(guard))
+
+    def test_export_formats_agree(self):
+        export(self.client, self.path("campaign.ndjson"), types=["character", "location"])
+        snapshot_from_export(self.path("campaign.ndjson"), self.path("converted.snap"))
+        progress = export(self.client, self.path("exported.snap"), types=["character", "location"], format="snapshot")
+
+        self.assertEqual(progress.bytes_written, os.path.getsize(self.path("exported.snap")))
+        with Snapshot(self.path("converted.snap")) as converted, Snapshot(self.path("exported.snap")) as exported:
+            self.assertEqual(list(converted.records()), list(exported.records()))
+
+    def test_invalid_input_is_rejected(self):
+        with self.assertRaises(WrongParametersPassedToEntity):
+            write_snapshot(self.records + self.records[:1], self.path("duplicate.snap"))
+
+        with open(self.path("campaign.ndjson"), "w") as f:
+            f.write('{"id": 1}\n' * 10)
+        with self.assertRaises(ValueError):
+            Snapshot(self.path("campaign.ndjson"))
+
+        write_snapshot(self.records, self.path("campaign.snap"))
+        with Snapshot(self.path("campaign.snap")) as snapshot:
+            with self.assertRaises(ValueError):         # entities can't be built without a client
+                snapshot[1]
+
+
+if __name__ == '__main__':
+    unittest.main()
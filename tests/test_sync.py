@@ -0,0 +1,96 @@
+import unittest
+
+from pykanka.sync import SyncState, sync
+from library.fake_campaign import FakeCampaignTest
+
+
+class TestSync(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.guard = self.campaign.add("character", name="Guard")
+        self.thief = self.campaign.add("character", name="Thief")
+        self.harbour = self.campaign.add("location", name="Harbour")
+
+    def names(self, result, type_name):
+        return sorted(child.data.name for child in result.changed.get(type_name, []))
+
+    def test_first_sync_fetches_everything(self):
+        result = sync(self.client, types=["character", "location"])
+
+        self.assertTrue(result.full)
+        self.assertEqual(self.names(result, "character"), ["Guard", "Thief"])
+        self.assertEqual(self.names(result, "location"), ["Harbour"])
+        self.assertEqual(result.state.known["character"], {self.guard["entity_id"], self.thief["entity_id"]})
+
+    def test_unchanged_campaign_costs_two_requests(self):
+        state = sync(self.client, types=["character", "location"]).state
+        self.campaign.requests.clear()
+
+        result = sync(self.client, state, types=["character", "location"])
+
+        self.assertTrue(result.empty)
+        self.assertFalse(result.full)
+        self.assertEqual(len(self.campaign.requests), 2)
+
+    def test_only_changed_entities_are_reported(self):
+        state = sync(self.client, types=["character", "location"]).state
+        self.campaign.update(self.thief["entity_id"], name="Master Thief")
+        recruit = self.campaign.add("character", name="Recruit")
+
+        result = sync(self.client, state, types=["character", "location"])
+
+        self.assertEqual(self.names(result, "character"), ["Master Thief", "Recruit"])
+        self.assertNotIn("location", result.changed)
+        self.assertIn(recruit["entity_id"], state.known["character"])
+
+    def test_deletions_are_reported(self):
+        state = sync(self.client, types=["character"]).state
+        self.campaign.remove(self.guard["entity_id"])
+
+        result = sync(self.client, state, types=["character"])
+
+        self.assertEqual(result.deleted, {"character": [self.guard["entity_id"]]})
+        self.assertNotIn(self.guard["entity_id"], state.known["character"])
+
+    def test_syncing_one_type_keeps_changes_to_others(self):
+        state = SyncState()
+        sync(self.client, state, types=["character", "location"])
+        self.campaign.update(self.harbour["entity_id"], name="Old Harbour")
+        self.campaign.update(self.guard["entity_id"], name="Captain")
+
+        characters = sync(self.client, state, types=["character"])
+        self.assertEqual(self.names(characters, "character"), ["Captain"])
+        self.assertNotIn("location", characters.changed)
+
+        locations = sync(self.client, state, types=["location"])
+        self.assertEqual(self.names(locations, "location"), ["Old Harbour"])
+
+        self.assertTrue(sync(self.client, state, types=["character", "location"]).empty)
+
+    def test_syncing_one_type_keeps_deletions_of_others(self):
+        state = sync(self.client, types=["character", "location"]).state
+        self.campaign.remove(self.harbour["entity_id"])
+
+        self.assertEqual(sync(self.client, state, types=["character"]).deleted, dict())
+        self.assertEqual(sync(self.client, state, types=["location"]).deleted, {"location": [self.harbour["entity_id"]]})
+
+    def test_a_new_type_is_walked_completely(self):
+        state = sync(self.client, types=["character"]).state
+
+        result = sync(self.client, state, types=["character", "location"])
+
+        self.assertFalse(result.full)
+        self.assertEqual(self.names(result, "location"), ["Harbour"])
+        self.assertNotIn("character", result.changed)
+
+    def test_state_round_trips_through_json(self):
+        state = sync(self.client, types=["character", "location"]).state
+        self.campaign.update(self.guard["entity_id"], name="Captain")
+
+        restored = SyncState.from_json(state.to_json())
+        self.assertEqual(restored, state)
+        self.assertEqual(self.names(sync(self.client, restored, types=["character", "location"]), "character"), ["Captain"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+from pykanka.entity_subentries import EntityTag
+from pykanka.tags import TagIndex, bits_to_ordinals, ordinals_to_bits, bit_count
+from library.fake_campaign import FakeCampaignTest
+
+
+def entity(entity_id, type_name, tags=(), child_id=None, tag_id=None):
+    return dict(id=entity_id, type=type_name, tags=list(tags), child_id=child_id or entity_id,
+                child=dict(tag_id=tag_id) if type_name == "tag" else dict())
+
+
+class TestBitmaps(unittest.TestCase):
+    def test_round_trip(self):
+        ordinals = [0, 3, 8, 9, 70, 255]
+
+        bitmap = ordinals_to_bits(ordinals, 256)
+
+        self.assertEqual(bits_to_ordinals(bitmap), ordinals)
+        self.assertEqual(bit_count(bitmap), 6)
+        self.assertEqual(bits_to_ordinals(0), [])
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # tags 1 (Heroes) > 2 (Knights), 3 (Dead)
+        self.index = TagIndex.from_records([
+            entity(100, "tag", child_id=1), entity(101, "tag", child_id=2, tag_id=1), entity(102, "tag", child_id=3),
+            entity(10, "character", tags=[1]), entity(11, "character", tags=[2, 3]), entity(12, "character", tags=[2]),
+            entity(13, "location", tags=[1]), entity(14, "character"),
+        ])
+
+    def test_select(self):
+        self.assertEqual(self.index.select(all_of=[1]), [10, 13])
+        self.assertEqual(self.index.select(all_of=[1], nested=True), [10, 11, 12, 13])
+        self.assertEqual(self.index.select(any_of=[1, 3]), [10, 11, 13])
+        self.assertEqual(self.index.select(all_of=[2], none_of=[3]), [12])
+        self.assertEqual(self.index.select(all_of=[1], nested=True, type_name="character"), [10, 11, 12])
+        self.assertEqual(self.index.select(none_of=[1], nested=True, type_name="character"), [14])
+        self.assertEqual(self.index.count(all_of=[1], nested=True), 4)
+
+    def test_updates(self):
+        self.index.set_tags(14, [3], type_name="character")
+        self.index.add_tag(13, 2)
+        self.index.remove_tag(11, 3)
+        self.index.remove_entity(10)
+
+        self.assertEqual(self.index.select(all_of=[3]), [14])
+        self.assertEqual(self.index.select(all_of=[1], nested=True), [11, 12, 13])
+        self.assertEqual(self.index.tags_of(13), {1, 2})
+        self.assertEqual(len(self.index), 7)
+
+    def test_removing_a_tag_entity_drops_the_tag(self):
+        self.index.remove_entity(101)
+
+        self.assertEqual(self.index.select(all_of=[2]), [])
+        self.assertEqual(self.index.tags_of(11), {3})
+        self.assertEqual(self.index.select(all_of=[1], nested=True), [10, 13])
+
+    def test_entity_tags_from_records(self):
+        index = TagIndex.from_records([dict(entity(10, "character", tags=[1]),
+                                            subentries=dict(entity_tags=[dict(id=7, entity_id=10, tag_id=1)]))])
+
+        index.remove_entity_tag(7)
+        index.remove_entity_tag(8)
+
+        self.assertEqual(index.tags_of(10), set())
+
+
+class TestTagIndexClient(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.heroes = self.campaign.add("tag", name="Heroes")
+        self.knights = self.campaign.add("tag", name="Knights", tag_id=self.heroes["id"])
+        self.anna = self.campaign.add("character", name="Anna", tags=[self.knights["id"]])
+        self.bert = self.campaign.add("character", name="Bert")
+
+    def test_follows_entity_tag_writes(self):
+        index = TagIndex.from_client(self.client)
+        index.attach(self.client)
+        self.assertEqual(index.select(all_of=[self.heroes["id"]], nested=True), [self.anna["entity_id"]])
+
+        EntityTag(_client=self.client, entity_id=self.bert["entity_id"], tag_id=self.heroes["id"]).post()
+        self.assertEqual(index.select(all_of=[self.heroes["id"]], type_name="character"), [self.bert["entity_id"]])
+
+        self.client.request_delete(f"{self.campaign.base_url}entities/{self.anna['entity_id']}")
+        self.assertEqual(index.select(all_of=[self.heroes["id"]], nested=True), [self.bert["entity_id"]])
+
+    def test_deleting_a_pre_existing_entity_tag(self):
+        entity_tag, = self.campaign.subentries[(self.anna["entity_id"], "entity_tags")]
+        index = TagIndex.from_client(self.client)
+        index.attach(self.client)
+
+        EntityTag(_client=self.client, id=entity_tag["id"], entity_id=self.anna["entity_id"]).delete()
+
+        self.assertEqual(index.tags_of(self.anna["entity_id"]), set())
+        self.assertEqual(index.select(all_of=[self.knights["id"]]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
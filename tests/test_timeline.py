@@ -0,0 +1,107 @@
+import random
+import unittest
+
+from pykanka.dates import CalendarEngine, CalendarDate, Month
+from pykanka.entity_subentries import EntityEvent
+from pykanka.exceptions import CalendarError
+from pykanka.timeline import EventIndex, IntervalTree
+from library.fake_campaign import FakeCampaignTest
+
+MONTHS = [dict(name=f"Month {number}", length=30, type="standard") for number in range(1, 13)]
+WEEKDAYS = ["One", "Two", "Three", "Four", "Five", "Six"]
+
+
+def event(event_id, date, length=1, periodicity=None, until=None, calendar_id=1, entity_id=None):
+    year, month, day = date
+    return dict(id=event_id, entity_id=entity_id or event_id * 10, calendar_id=calendar_id, year=year, month=month,
+                day=day, length=length, recurring_periodicity=periodicity, recurring_until=until, name=f"Event {event_id}")
+
+
+class TestIntervalTree(unittest.TestCase):
+    def test_matches_a_scan(self):
+        rng = random.Random(7)
+        intervals = [(start, start + rng.randrange(0, 50), number) for number, start in
+                     enumerate(rng.randrange(0, 1000) for _ in range(300))]
+        tree = IntervalTree(intervals)
+
+        for low, high in [(0, 0), (10, 20), (500, 500), (990, 2000), (-5, -1), (0, 1100)]:
+            expected = sorted(number for start, end, number in intervals if start <= high and end >= low)
+            self.assertEqual(sorted(tree.overlapping(low, high)), expected)
+
+    def test_empty(self):
+        self.assertEqual(IntervalTree([]).overlapping(0, 10), [])
+
+
+class TestEventIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = CalendarEngine.from_data(dict(months=MONTHS, weekdays=WEEKDAYS))
+        self.index = EventIndex.from_events({1: self.engine}, [
+            event(1, (100, 1, 5), periodicity="month", until=100),
+            event(2, (100, 2, 28), length=5),
+            event(3, (90, 3, 10), periodicity="year"),
+            event(4, (100, 13, 1)),                 # not a date of this calendar
+            event(5, (100, 3, 2), calendar_id=2),   # unknown calendar
+        ])
+
+    def dates(self, occurrences):
+        return [(occurrence.event_id, str(occurrence.date)) for occurrence in occurrences]
+
+    def test_recurring_until_the_year_it_starts_in(self):
+        self.assertEqual(self.dates(self.index.between(1, CalendarDate(100, 3, 1), CalendarDate(100, 3, 30))),
+                         [(2, "100-2-28"), (1, "100-3-5"), (3, "100-3-10")])
+        self.assertEqual(self.dates(self.index.between(1, "100-12-1", "101-2-30")), [(1, "100-12-5")])
+
+    def test_yearly_events_without_end(self):
+        self.assertEqual(self.dates(self.index.on(1, "5000-3-10")), [(3, "5000-3-10")])
+        self.assertEqual(self.index.on(1, "89-3-10"), [])
+
+    def test_multi_day_events(self):
+        occurrence, = self.index.on(1, "100-3-2")
+
+        self.assertEqual((occurrence.event_id, occurrence.end - occurrence.start), (2, 4))
+        self.assertFalse(occurrence.recurring)
+        self.assertEqual(self.index.on(1, "100-3-3"), [])
+
+    def test_this_week(self):
+        self.assertEqual(self.dates(self.index.this_week(1, "100-3-6")), [(2, "100-2-28"), (1, "100-3-5")])
+        self.assertEqual(self.dates(self.index.this_week(1, "100-3-9")), [(3, "100-3-10")])
+
+    def test_updates(self):
+        self.index.add(event(1, (100, 1, 6), periodicity="month", until=101))
+        self.index.remove(2)
+
+        self.assertEqual(self.dates(self.index.between(1, "101-12-1", "102-1-30")), [(1, "101-12-6")])
+        self.assertEqual(self.index.on(1, "100-3-2"), [])
+        self.assertEqual(self.index.of_entity(10), [1])
+        self.assertEqual(len(self.index), 2)
+        with self.assertRaises(CalendarError):
+            self.index.between(2, 0, 10)
+
+    def test_changing_the_calendar_converts_events_again(self):
+        self.index.set_calendar(1, CalendarEngine([Month("Long", 200), Month("Longer", 200)]))
+
+        self.assertEqual(self.dates(self.index.between(1, "100-1-1", "100-2-200")),
+                         [(1, "100-1-5"), (1, "100-2-5"), (2, "100-2-28")])
+        self.assertEqual(self.index.on(1, "5000-1-10"), [])        # the third month is gone
+
+
+class TestEventIndexClient(FakeCampaignTest):
+    def test_loads_and_follows_writes(self):
+        calendar = self.campaign.add("calendar", name="Reckoning", months=MONTHS, weekdays=WEEKDAYS)
+        hero = self.campaign.add("character", name="Hero")
+        self.campaign.add_subentry(hero["entity_id"], "entity_events", calendar_id=calendar["id"], name="Birthday",
+                                   year=100, month=4, day=1, length=1, recurring_periodicity="year")
+        index = EventIndex.from_client(self.client)
+        index.attach(self.client)
+        self.assertEqual([occurrence.entity_id for occurrence in index.on(calendar["id"], "120-4-1")], [hero["entity_id"]])
+
+        response = EntityEvent(_client=self.client, entity_id=hero["entity_id"], calendar_id=calendar["id"],
+                               year=120, month=4, day=1, length=1).post(name="Duel")
+        self.assertEqual(len(index.on(calendar["id"], "120-4-1")), 2)
+
+        EntityEvent(_client=self.client, id=response.json()["data"]["id"], entity_id=hero["entity_id"]).delete()
+        self.assertEqual(len(index.on(calendar["id"], "120-4-1")), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from pykanka import KankaClient
+from library.fake_campaign import FakeCampaign, FakeCampaignTest
+
+
+class TestCopyCampaign(FakeCampaignTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.target = FakeCampaign(campaign_id=2)
+        for _ in range(5):                                  # so that ids in the target differ from the source ones
+            self.target.add("note", name="Existing")
+        patcher = self.campaign.patch(self.target)
+        patcher.__enter__()
+        self.addCleanup(patcher.__exit__, None, None, None)
+        self.target_client = KankaClient("token", 2, cache_duration=0)
+
+    def copy(self, types, subentries=True):
+        result = self.client.copy_to(self.target_client, types=types, subentries=subentries)
+        self.assertTrue(result.ok, [op.response.text for op in result.failures])
+        return result
+
+    def copied(self, result, type_name, source_child):
+        return self.target.child(type_name, result.child_id(type_name, source_child["id"]))
+
+    def test_child_references_are_translated(self):
+        country = self.campaign.add("location", name="Country")
+        city = self.campaign.add("location", name="City", parent_location_id=country["id"])
+        crew = self.campaign.add("tag", name="Crew")
+        guard = self.campaign.add("character", name="Guard", location_id=city["id"], tags=[crew["id"]])
+
+        result = self.copy(["character", "location", "tag"])
+
+        new_city = self.copied(result, "location", city)
+        new_guard = self.copied(result, "character", guard)
+        self.assertEqual(new_city["parent_location_id"], result.child_id("location", country["id"]))
+        self.assertEqual(new_guard["location_id"], new_city["id"])
+        self.assertEqual(new_guard["tags"], [result.child_id("tag", crew["id"])])
+        self.assertEqual(result.entities[guard["entity_id"]], new_guard["entity_id"])
+
+    def test_tags_are_created_once(self):
+        crew = self.campaign.add("tag", name="Crew")
+        guard = self.campaign.add("character", name="Guard", tags=[crew["id"]])
+
+        result = self.copy(["character", "tag"])
+
+        new_guard = self.copied(result, "character", guard)
+        self.assertEqual(len(self.target.subentries[(new_guard["entity_id"], "entity_tags")]), 1)
+        self.assertEqual(new_guard["tags"], [result.child_id("tag", crew["id"])])
+
+    def test_cycles_are_patched_in_a_second_pass(self):
+        north = self.campaign.add("location", name="North")
+        south = self.campaign.add("location", name="South", parent_location_id=north["id"])
+        self.campaign.update(north["entity_id"], parent_location_id=south["id"])
+
+        result = self.copy(["location"])
+
+        self.assertEqual(self.copied(result, "location", north)["parent_location_id"], result.child_id("location", south["id"]))
+        self.assertEqual(self.copied(result, "location", south)["parent_location_id"], result.child_id("location", north["id"]))
+
+    def test_references_to_entities_not_copied_are_dropped(self):
+        harbour = self.campaign.add("location", name="Harbour")
+        guard = self.campaign.add("character", name="Guard", location_id=harbour["id"])
+
+        result = self.copy(["character"])
+
+        self.assertIsNone(self.copied(result, "character", guard).get("location_id"))
+
+    def test_mentions_are_translated(self):
+        harbour = self.campaign.add("location", name="Harbour")
+        guard = self.campaign.add("character", name="Guard")
+        thief = self.campaign.add("character", name="Thief")
+        lost = self.campaign.add("item", name="Sword")
+        self.campaign.update(guard["entity_id"], entry=f"<p>[location:{harbour['entity_id']}|The harbour] is watched by "
+                                                       f"[character:{thief['entity_id']}] for [item:{lost['entity_id']}|a sword]</p>")
+        self.campaign.add_subentry(guard["entity_id"], "entity_notes", name="Note", visibility="all",
+                                   entry=f"Owes [character:{thief['entity_id']}|the thief]")
+
+        result = self.copy(["character", "location"])
+
+        new_guard = self.copied(result, "character", guard)
+        self.assertEqual(new_guard["entry"], f"<p>[location:{result.entities[harbour['entity_id']]}|The harbour] is watched by "
+                                             f"[character:{result.entities[thief['entity_id']]}] for a sword</p>")
+        note = self.target.subentries[(new_guard["entity_id"], "entity_notes")][0]
+        self.assertEqual(note["entry"], f"Owes [character:{result.entities[thief['entity_id']]}|the thief]")
+
+    def test_subentry_references_are_translated(self):
+        guard = self.campaign.add("character", name="Guard")
+        thief = self.campaign.add("character", name="Thief")
+        sword = self.campaign.add("item", name="Sword")
+        world = self.campaign.add("map", name="World", image_full="https://example.com/world.png")
+        self.campaign.add_subentry(guard["entity_id"], "relations", relation="rival", target_id=thief["entity_id"], visibility="all")
+        self.campaign.add_subentry(guard["entity_id"], "inventory", item_id=sword["id"], amount=1)
+        self.campaign.add_subentry(guard["entity_id"], "attributes", name="HP", value="12")
+        self.campaign.add_map_marker(world["id"], name="Guard post", latitude=1, longitude=2, entity_id=guard["entity_id"])
+
+        result = self.copy(["character", "item", "map"])
+
+        new_guard = result.entities[guard["entity_id"]]
+        relation = self.target.subentries[(new_guard, "relations")][0]
+        self.assertEqual(relation["target_id"], result.entities[thief["entity_id"]])
+        self.assertEqual(self.target.subentries[(new_guard, "inventory")][0]["item_id"], result.child_id("item", sword["id"]))
+        self.assertEqual(self.target.subentries[(new_guard, "attributes")][0]["value"], "12")
+        self.assertEqual(self.target.map_markers[result.child_id("map", world["id"])][0]["entity_id"], new_guard)
+        self.assertEqual(result.subentries, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()